@@ -0,0 +1,232 @@
+"""
+Agent Worker - long-lived DroidRun process for select/edit jobs
+Keeps droidrun, phoenix and the tracer warm between executions instead of
+paying for a cold `uv run python agents_functions.py` on every job.
+
+Protocol (one JSON object per line):
+    server -> worker (stdin):  {"job_id": "...", "mode": "select" | "edit", "session_id": "..."}
+    worker -> server (stdout): log lines and "[EVENT] {...}" step events, then "[JOB_END] {...}"
+
+The plan for an edit job is read from the session-scoped executions/<session_id>/plan.json,
+so concurrent sessions never share files.
+"""
+
+import asyncio
+import json
+import os
+import sys
+import time
+from typing import Awaitable, Callable, Optional
+
+# Printed by the worker once imports are done and it can accept jobs
+WORKER_READY_MARKER = "[WORKER_READY]"
+# Printed by agents_functions right before the DroidAgent starts running
+AGENT_READY_MARKER = "[READY]"
+# Printed by the worker after every job, followed by a JSON status payload
+JOB_END_MARKER = "[JOB_END]"
+# Prefix for structured step events (step_start / step_end / step_error), followed by JSON
+EVENT_MARKER = "[EVENT]"
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+EXECUTIONS_DIR = os.path.join(BACKEND_DIR, "executions")
+
+# Two workers on one device would interleave their gestures on the same InShot project
+MAX_WORKERS_PER_DEVICE = 1
+
+
+def session_dir(session_id: str) -> str:
+    """Per-execution directory holding the plan and any other job files"""
+    path = os.path.join(EXECUTIONS_DIR, session_id)
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def parse_event(line: str) -> Optional[dict]:
+    """Return the structured event carried by a worker output line, if any"""
+    if not line.startswith(EVENT_MARKER):
+        return None
+    try:
+        return json.loads(line[len(EVENT_MARKER):].strip())
+    except json.JSONDecodeError:
+        return None
+
+
+def agent_env() -> dict:
+    """Environment for agent subprocesses (UTF-8 output, unbuffered streaming)"""
+    env = os.environ.copy()
+    # Set PYTHONIOENCODING=utf-8 to support emoji output on Windows
+    env["PYTHONIOENCODING"] = "utf-8"
+    env["PYTHONUNBUFFERED"] = "1"
+    return env
+
+
+class AgentWorker:
+    """Server-side handle for a single warm worker process"""
+
+    def __init__(self, worker_id: int):
+        self.worker_id = worker_id
+        self.process: Optional[asyncio.subprocess.Process] = None
+        self.import_ms: Optional[float] = None
+        # Background pre-warm started by the pool, awaited before the first job
+        self.warming: Optional[asyncio.Task] = None
+
+    def is_alive(self) -> bool:
+        return self.process is not None and self.process.returncode is None
+
+    async def start(self):
+        """Spawn the worker and wait until its imports are warm"""
+        started = time.perf_counter()
+        self.process = await asyncio.create_subprocess_exec(
+            "uv", "run", "python", "agent_worker.py",
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.STDOUT,
+            cwd=BACKEND_DIR,
+            env=agent_env()
+        )
+
+        while True:
+            line = await self.process.stdout.readline()
+            if not line:
+                raise RuntimeError(f"Agent worker {self.worker_id} exited during startup")
+            decoded_line = line.decode(errors="replace").strip()
+            if decoded_line.startswith(WORKER_READY_MARKER):
+                break
+            if decoded_line:
+                print(f"[WORKER {self.worker_id}] {decoded_line}")
+
+        self.import_ms = (time.perf_counter() - started) * 1000
+        print(f"[WORKER {self.worker_id}] Warm after {self.import_ms:.0f} ms")
+
+    async def ensure_started(self):
+        """Wait for a pre-warm in progress, and (re)spawn the worker if it isn't running"""
+        if self.warming is not None:
+            warming, self.warming = self.warming, None
+            try:
+                await warming
+            except Exception as e:
+                print(f"[WORKER {self.worker_id}] Failed to pre-warm: {e}")
+        if not self.is_alive():
+            await self.start()
+
+    async def kill(self):
+        if self.is_alive():
+            self.process.kill()
+            await self.process.wait()
+
+    async def run_job(self, job: dict, on_line: Callable[[str], Awaitable[None]]) -> int:
+        """Send a job and stream its output lines to on_line. Returns the job exit code."""
+        self.process.stdin.write((json.dumps(job) + "\n").encode())
+        await self.process.stdin.drain()
+
+        while True:
+            line = await self.process.stdout.readline()
+            if not line:
+                raise RuntimeError(f"Agent worker {self.worker_id} died while running job {job.get('job_id')}")
+
+            decoded_line = line.decode(errors="replace").strip()
+            if decoded_line.startswith(JOB_END_MARKER):
+                status = json.loads(decoded_line[len(JOB_END_MARKER):].strip() or "{}")
+                return status.get("returncode", 1)
+            if decoded_line:
+                await on_line(decoded_line)
+
+    async def stop(self):
+        if self.warming is not None:
+            self.warming.cancel()
+            self.warming = None
+        if not self.is_alive():
+            return
+        self.process.stdin.close()
+        try:
+            await asyncio.wait_for(self.process.wait(), timeout=5.0)
+        except asyncio.TimeoutError:
+            self.process.kill()
+            await self.process.wait()
+
+
+class AgentWorkerPool:
+    """
+    Fixed-size pool of warm agent workers.
+    Each worker runs one job at a time; dead workers are respawned on next use.
+    Jobs drive the connected device (AdbTools() without a serial) and share its timeline,
+    gesture and Redis state, so the pool runs at most MAX_WORKERS_PER_DEVICE workers.
+    """
+
+    def __init__(self, size: int = 1):
+        if size > MAX_WORKERS_PER_DEVICE:
+            print(f"[WORKER] Pool size {size} clamped to {MAX_WORKERS_PER_DEVICE}: "
+                  f"workers would interleave gestures on the same device")
+        self.size = max(1, min(size, MAX_WORKERS_PER_DEVICE))
+        self.workers: list[AgentWorker] = []
+        self._idle: Optional[asyncio.Queue] = None
+
+    async def start(self):
+        """
+        Start pre-warming every worker in the background (called from the server lifespan).
+        Returns right away; run_job waits for its worker to be ready.
+        """
+        if self._idle is not None:
+            return
+        self._idle = asyncio.Queue()
+        for worker_id in range(self.size):
+            worker = AgentWorker(worker_id)
+            worker.warming = asyncio.create_task(worker.start())
+            self.workers.append(worker)
+            self._idle.put_nowait(worker)
+
+    async def run_job(self, job: dict, on_line: Callable[[str], Awaitable[None]]) -> int:
+        await self.start()
+        worker = await self._idle.get()
+        try:
+            await worker.ensure_started()
+            return await worker.run_job(job, on_line)
+        except BaseException:
+            # Failed or cancelled (e.g. the client cancelled the execution): never hand a
+            # worker with a half-consumed job back to the pool, it is respawned on next use
+            await asyncio.shield(worker.kill())
+            raise
+        finally:
+            self._idle.put_nowait(worker)
+
+    async def shutdown(self):
+        for worker in self.workers:
+            await worker.stop()
+
+
+async def serve():
+    """Worker main loop: import once, then run jobs from stdin until EOF"""
+    started = time.perf_counter()
+    import agents_functions
+    import droidrun  # noqa: F401  (agents_functions imports it lazily; the worker wants it warm)
+    agents_functions.init_runtime()
+    import_ms = (time.perf_counter() - started) * 1000
+    print(f"{WORKER_READY_MARKER} imports and tracer ready in {import_ms:.0f} ms", flush=True)
+
+    loop = asyncio.get_running_loop()
+    while True:
+        line = await loop.run_in_executor(None, sys.stdin.readline)
+        if not line:
+            break
+        if not line.strip():
+            continue
+
+        job = json.loads(line)
+        returncode = 0
+        job_started = time.perf_counter()
+        try:
+            await agents_functions.run_mode(job["mode"], job.get("session_id"))
+        except Exception as e:
+            print(f"[ERROR] Job {job.get('job_id')} failed: {e}")
+            returncode = 1
+
+        status = {
+            "job_id": job.get("job_id"),
+            "returncode": returncode,
+            "elapsed_ms": round((time.perf_counter() - job_started) * 1000),
+        }
+        print(f"{JOB_END_MARKER} {json.dumps(status)}", flush=True)
+
+
+if __name__ == "__main__":
+    asyncio.run(serve())
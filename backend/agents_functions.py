@@ -1,16 +1,157 @@
+from __future__ import annotations
+
 import asyncio
+import functools
 import os
+import time
 import shutil
 import subprocess
-from PIL import Image
-from droidrun import DroidAgent, DroidrunConfig, LLMProfile, LoggingConfig, AgentConfig, TracingConfig, CodeActConfig, ManagerConfig, ExecutorConfig, Tools
-from dotenv import load_dotenv
-from phoenix.otel import register
+from typing import TYPE_CHECKING
 from inshot_tools import InshotTools
-from pydantic import BaseModel, Field
+from agent_worker import AGENT_READY_MARKER, EVENT_MARKER, session_dir
+from draft_snapshots import ensure_editor, restore_checkpoint, save_applied_plan, save_checkpoint
+from redis_state import global_state
+from timeline_model import timeline
+from gesture_timing import gesture_timing
+from plan_diff import applied_all
+import step_timings
+
+# droidrun, phoenix and dotenv are imported on first use so the server can import
+# the ADB helpers below without paying for the agent stack
+if TYPE_CHECKING:
+    from droidrun import Tools
 
 # Constants for file transfer
 REMOTE_ALBUM_PATH = "/sdcard/Pictures/droidrun"
+ALBUM_NAME = os.path.basename(REMOTE_ALBUM_PATH)
+INSHOT_PACKAGE = "com.camerasideas.instashot"
+
+# Extra attempts per tool call after a rollback (0 disables step-level recovery)
+STEP_RETRY_BUDGET = int(os.getenv("STEP_RETRY_BUDGET", "1"))
+
+# Registered once per process so warm workers don't stack tracer providers
+_tracer_provider = None
+
+def init_runtime():
+    """Load .env and register the Phoenix tracer once per process."""
+    global _tracer_provider
+    if _tracer_provider is None:
+        from dotenv import load_dotenv
+        from phoenix.otel import register
+
+        load_dotenv()
+        _tracer_provider = register(
+            project_name="droidrun-video-editor", 
+            endpoint="http://127.0.0.1:6006/v1/traces",
+            auto_instrument=True
+        )
+    return _tracer_provider
+
+def emit_event(event_type, **data):
+    """Write a structured event to stdout for the server to forward."""
+    payload = {"type": event_type, **data}
+    print(f"{EVENT_MARKER} {json.dumps(payload, default=str)}", flush=True)
+
+async def capture_stall_snapshot(tools, tool_name, step, attempt):
+    """Save a screenshot and the UI tree of a stalled step for diagnosis. Returns the file prefix."""
+    stall_dir = os.path.join(session_dir(global_state.session_id), "stalls")
+    os.makedirs(stall_dir, exist_ok=True)
+    prefix = os.path.join(stall_dir, f"step{step}_{tool_name}_attempt{attempt}")
+
+    try:
+        # Off the event loop: the adb that wedged the step may wedge the screencap too
+        returncode, png = await InshotTools.adb("exec-out", "screencap", "-p", timeout=10)
+        if returncode == 0 and png:
+            with open(prefix + ".png", "wb") as f:
+                f.write(png)
+    except Exception as e:
+        print(f"[WATCHDOG] Screenshot failed: {e}")
+
+    try:
+        ui_state = (await asyncio.wait_for(tools.get_state(), timeout=10))[2]
+        with open(prefix + ".json", "w") as f:
+            json.dump(ui_state, f, indent=4)
+    except Exception as e:
+        print(f"[WATCHDOG] UI state capture failed: {e}")
+
+    return os.path.relpath(prefix, session_dir(global_state.session_id))
+
+def _is_error_result(result):
+    return isinstance(result, str) and result.startswith(("[ERROR]", "Error"))
+
+# Time spent inside tools during the current job (the rest of an edit job is agent overhead)
+_tool_time = {"ms": 0}
+# Tool calls of the current job that ended in step_end / step_error
+_job_steps = {"done": [], "errors": 0}
+
+def with_step_events(tool_name, function):
+    """
+    Wrap a custom tool so each call reports step_start / step_end / step_error.
+    Every attempt runs under a watchdog deadline (step_timings.deadline_for); a stalled
+    attempt is cancelled, snapshotted and reported as step_stall.
+    A failed attempt is rolled back (InshotTools.ROLLBACK) and retried up to
+    STEP_RETRY_BUDGET times, reported as step_retry, before the error reaches the agent.
+    """
+    counter = {"step": 0}
+
+    @functools.wraps(function)
+    async def wrapper(*args, **kwargs):
+        counter["step"] += 1
+        step = counter["step"]
+        tool_args = {k: v for k, v in kwargs.items() if k not in ("tools", "shared_state")}
+        emit_event("step_start", tool=tool_name, step=step, args=tool_args)
+        started = time.perf_counter()
+
+        tools = kwargs.get("tools")
+        deadline_s = step_timings.deadline_for(tool_name, tool_args)
+        attempt = 0
+        while True:
+            snapshot = InshotTools.snapshot_state()
+            attempt_started = time.perf_counter()
+            error = None
+            try:
+                result = await asyncio.wait_for(function(*args, **kwargs), timeout=deadline_s)
+                if _is_error_result(result):
+                    error = result
+            except asyncio.TimeoutError:
+                error = f"[ERROR] {tool_name} stalled: no result after {deadline_s:.0f}s"
+                result = error
+                snapshot_path = None
+                if tools is not None:
+                    snapshot_path = await capture_stall_snapshot(tools, tool_name, step, attempt + 1)
+                emit_event("step_stall", tool=tool_name, step=step, attempt=attempt + 1,
+                           deadline_s=round(deadline_s), snapshot=snapshot_path)
+            except Exception as e:
+                result = None
+                error = e
+
+            attempt_ms = round((time.perf_counter() - attempt_started) * 1000)
+            _tool_time["ms"] += attempt_ms
+            step_timings.record(tool_name, tool_args, attempt_ms, error is None)
+            elapsed_ms = round((time.perf_counter() - started) * 1000)
+            if error is None:
+                emit_event("step_end", tool=tool_name, step=step, result=result, elapsed_ms=elapsed_ms, attempts=attempt + 1)
+                _job_steps["done"].append({"tool": tool_name, "args": tool_args})
+                return result
+
+            if attempt < STEP_RETRY_BUDGET and tools is not None:
+                try:
+                    recovered = await InshotTools.rollback(tool_name, tools, snapshot)
+                except Exception as e:
+                    print(f"[ROLLBACK] {tool_name} failed: {e}")
+                    recovered = False
+                if recovered:
+                    attempt += 1
+                    emit_event("step_retry", tool=tool_name, step=step, attempt=attempt, error=str(error), elapsed_ms=elapsed_ms)
+                    continue
+
+            emit_event("step_error", tool=tool_name, step=step, error=str(error), elapsed_ms=elapsed_ms, attempts=attempt + 1)
+            _job_steps["errors"] += 1
+            if isinstance(error, Exception):
+                raise error
+            return result
+
+    return wrapper
 
 def run_adb_command(cmd_list):
     """Run system ADB commands safely."""
@@ -105,15 +246,21 @@ def process_files(local_files, status_callback=None):
     return True
 
 
-async def select_images_tool(tools: Tools, **kwargs):
-    ui_state = (await tools.get_state())[2]
+GALLERY_ID = "com.camerasideas.instashot:id/wallRecyclerView"
 
+def _gallery_tiles(ui_state):
+    """
+    Bounds of the gallery RecyclerView and the image tiles currently inside it.
+    Tiles are the unlabelled elements that follow wallRecyclerView in the tree.
+    """
     id = -1
     start = False
+    gallery_bounds = None
     elems = []
     for elem in ui_state:
-        if elem.get("resourceId", "") == "com.camerasideas.instashot:id/wallRecyclerView":
+        if elem.get("resourceId", "") == GALLERY_ID:
             id = elem.get("index", "")
+            gallery_bounds = [int(x) for x in elem.get("bounds", "0,0,0,0").split(',')]
             start = True
             continue
 
@@ -126,31 +273,260 @@ async def select_images_tool(tools: Tools, **kwargs):
             else:
                 start = False
 
-    print(elems)
-    print(len(elems))
-    
+    tiles = []
     for elem in elems:
         try:
-            bounds_str = elem.get("bounds", "0,0,0,0")
-            bounds = [int(x) for x in bounds_str.split(',')]
+            tiles.append([int(x) for x in elem.get("bounds", "0,0,0,0").split(',')])
+        except ValueError as e:
+            print(f"Failed to read tile bounds: {e}")
+    tiles.sort(key=lambda b: (b[1], b[0]))
+    return gallery_bounds, tiles
+
+def _row_pitch(tiles):
+    """Vertical distance between consecutive gallery rows (falls back to tile height)."""
+    tops = sorted({b[1] for b in tiles})
+    gaps = [b - a for a, b in zip(tops, tops[1:]) if b - a > 10]
+    if gaps:
+        return min(gaps)
+    return max((b[3] - b[1] for b in tiles), default=0)
+
+async def _scroll_gallery(tools, gallery_bounds, distance, pitch, tiles, tile_height):
+    """
+    Swipe the gallery up by `distance` px (slow, no fling) and return the distance it
+    actually moved, corrected with the grid phase before and after. None if the layout
+    did not change.
+    """
+    gallery_top, gallery_bottom = gallery_bounds[1], gallery_bounds[3]
+    swipe_x = (gallery_bounds[0] + gallery_bounds[2]) // 2
+    swipe_from = gallery_bottom - pitch // 2
+    await tools.swipe(swipe_x, swipe_from, swipe_x, swipe_from - distance, duration_ms=1200)
+    await asyncio.sleep(0.5)
+
+    _, new_tiles = _gallery_tiles((await tools.get_state())[2])
+    if new_tiles == tiles:
+        return None
+
+    full_before = [b for b in tiles if b[1] > gallery_top and b[3] - b[1] >= tile_height * 0.9]
+    full_after = [b for b in new_tiles if b[1] > gallery_top and b[3] - b[1] >= tile_height * 0.9]
+    if not full_before or not full_after:
+        return distance
+
+    error = (full_before[0][1] - full_after[0][1] - distance) % pitch
+    if error > pitch / 2:
+        error -= pitch
+    return distance + error
+
+async def select_images_tool(tools: Tools, expected_images=None, **kwargs):
+    """
+    Select every pushed image in the gallery, paging through the RecyclerView.
+    Tiles are tracked by absolute grid position (row, column), so each image is
+    tapped exactly once and in content order, however many pages it takes.
+    Once the list stops scrolling, the last not-yet-selected images are the
+    last tiles on screen, which keeps the final page correct even when the
+    last scroll is cut short.
+    """
+    if expected_images is None:
+        expected_images = len(get_album_media_uris()) or None
+
+    MAX_PAGES = 50
+    selected = set()
+    scrolled_px = 0
+    origin = None
+    pitch = 0
+    at_end = False
+
+    for page in range(MAX_PAGES):
+        ui_state = (await tools.get_state())[2]
+        gallery_bounds, tiles = _gallery_tiles(ui_state)
+        if not tiles:
+            break
+
+        tile_height = max(b[3] - b[1] for b in tiles)
+        if not gallery_bounds:
+            gallery_bounds = [0, min(b[1] for b in tiles), 1080, max(b[3] for b in tiles)]
+        gallery_top, gallery_bottom = gallery_bounds[1], gallery_bounds[3]
+
+        # Only fully visible tiles are tapped; clipped ones come back on the next page
+        visible = [
+            b for b in tiles
+            if b[1] >= gallery_top and b[3] <= gallery_bottom and (b[3] - b[1]) >= tile_height * 0.9
+        ]
+        if not visible:
+            break
+        if origin is None:
+            pitch = _row_pitch(tiles)
+            origin = visible[0][1]
+
+        if at_end and expected_images:
+            # Everything selected so far is a prefix in content order
+            to_tap = visible[-(expected_images - len(selected)):]
+            keys = [("end", i) for i in range(len(to_tap))]
+        else:
+            to_tap, keys = [], []
+            for bounds in visible:
+                row = round((bounds[1] + scrolled_px - origin) / pitch) if pitch else 0
+                key = (row, bounds[0] // 10)
+                if key not in selected:
+                    to_tap.append(bounds)
+                    keys.append(key)
+
+        for bounds, key in zip(to_tap, keys):
+            if expected_images and len(selected) >= expected_images:
+                break
             center_x = (bounds[0] + bounds[2]) // 2
             center_y = (bounds[1] + bounds[3]) // 2
-            
-            print(f"Tapping Image at ({center_x}, {center_y})")
-            InshotTools._adb_tap(center_x, center_y)
-            
-        except Exception as e:
-            print(f"Failed to tap element: {e}")
+            print(f"Tapping Image {len(selected) + 1} at ({center_x}, {center_y})")
+            await InshotTools._adb_tap(center_x, center_y)
+            selected.add(key)
+
+        if at_end or not pitch or (expected_images and len(selected) >= expected_images):
+            break
+
+        # Measured scroll: move everything but the last full row up
+        distance = max(pitch, ((gallery_bottom - gallery_top) // pitch - 1) * pitch)
+        print(f"[PAGE {page + 1}] Selected {len(selected)} so far. Scrolling gallery by {distance}px")
+        moved = await _scroll_gallery(tools, gallery_bounds, distance, pitch, tiles, tile_height)
+        if moved is None:
+            # Same layout: either the end of the list or a scroll of exactly whole rows
+            probe = await _scroll_gallery(tools, gallery_bounds, pitch // 3, pitch, tiles, tile_height)
+            if probe is None:
+                break
+            moved = distance + probe
+        scrolled_px += moved
+
+        # A fully visible bottom tile may mean the scroll hit the end of the list and
+        # stopped short; probe with a small swipe before trusting the grid position
+        _, new_tiles = _gallery_tiles((await tools.get_state())[2])
+        if new_tiles and new_tiles[-1][3] < gallery_bottom and new_tiles[-1][3] - new_tiles[-1][1] >= tile_height * 0.9:
+            probe = await _scroll_gallery(tools, gallery_bounds, pitch // 3, pitch, new_tiles, tile_height)
+            if probe is None:
+                at_end = True
+            else:
+                scrolled_px += probe
+
+    if expected_images and len(selected) < expected_images:
+        print(f"[WARN] Selected {len(selected)} of {expected_images} images")
+    print(f"Selected {len(selected)} images")
 
     add_el = await InshotTools._find_node_by_id(tools, "com.camerasideas.instashot:id/applySelectVideo", True)
     bounds = [int(x) for x in add_el.get("bounds", "0,0,0,0").split(',')]
 
-    InshotTools._adb_tap((bounds[0] + bounds[2]) / 2, (bounds[1] + bounds[3]) / 2)
+    await InshotTools._adb_tap((bounds[0] + bounds[2]) / 2, (bounds[1] + bounds[3]) / 2)
 
     print("Selection Complete")
+    return len(selected)
+
+def get_album_media_uris():
+    """
+    Content URIs of the pushed images as indexed by the media scan, in push order.
+    Empty until the MediaStore has picked the files up.
+    """
+    success, output = run_adb_command([
+        "shell", "content", "query",
+        "--uri", "content://media/external/images/media",
+        "--projection", "_id:_data",
+        "--where", f"\"_data LIKE '{REMOTE_ALBUM_PATH}/%'\""
+    ])
+    if not success:
+        return []
+
+    # Rows look like: "Row: 0 _id=1234, _data=/sdcard/Pictures/droidrun/image_1.jpg"
+    rows = []
+    for line in output.splitlines():
+        if "_id=" not in line or "_data=" not in line:
+            continue
+        media_id = line.split("_id=")[1].split(",")[0].strip()
+        data = line.split("_data=")[1].strip()
+        name = os.path.splitext(os.path.basename(data))[0]
+        order = int(name.split("_")[-1]) if name.split("_")[-1].isdigit() else 0
+        rows.append((order, f"content://media/external/images/media/{media_id}"))
+
+    return [uri for _, uri in sorted(rows)]
+
+def launch_inshot():
+    """Force-stop and relaunch InShot so automation starts from its home screen."""
+    run_adb_command(["shell", "am", "force-stop", INSHOT_PACKAGE])
+    success, err = run_adb_command([
+        "shell", "monkey", "-p", INSHOT_PACKAGE,
+        "-c", "android.intent.category.LAUNCHER", "1"
+    ])
+    if not success:
+        print(f"[INSHOT] Failed to launch InShot: {err}")
+    return success
+
+async def import_images_scripted(expected_images=None):
+    """
+    Deterministic, LLM-free import: relaunch InShot, Video -> New, open the
+    droidrun folder and select every pushed image. Returns True on success.
+    """
+    from droidrun import AdbTools
+
+    # Wait for the media scan so the gallery shows every pushed image
+    uris = []
+    for _ in range(10):
+        uris = get_album_media_uris()
+        if uris and (expected_images is None or len(uris) >= expected_images):
+            break
+        await asyncio.sleep(0.5)
+    print(f"[IMPORT] Media scan reports {len(uris)} images in {REMOTE_ALBUM_PATH}")
+    if not uris:
+        return False
+
+    # Fresh, deterministic start on the InShot home screen
+    if not launch_inshot():
+        return False
+
+    tools = AdbTools()
+    print(f"{AGENT_READY_MARKER} Scripted import started", flush=True)
+
+    if not await InshotTools._tap_text(tools, ["Video"], attempts=10):
+        print("[IMPORT] 'Video' entry not found on InShot home screen")
+        return False
+    if not await InshotTools._tap_text(tools, ["New"]):
+        print("[IMPORT] 'New' button not found")
+        return False
+    if not await InshotTools._tap_text(tools, ["Recent", "Recents"]):
+        print("[IMPORT] Folder dropdown not found")
+        return False
+
+    # The folder list flings easily: tiny swipes only
+    folder_found = False
+    for _ in range(15):
+        if await InshotTools._tap_text(tools, [ALBUM_NAME], attempts=1, delay=0):
+            folder_found = True
+            break
+        await tools.swipe(540, 1500, 540, 1100, duration_ms=600)
+        await asyncio.sleep(0.5)
+
+    if not folder_found:
+        print(f"[IMPORT] Folder '{ALBUM_NAME}' not found in dropdown")
+        return False
+
+    await asyncio.sleep(1.0)
+    selected = await select_images_tool(tools, expected_images=len(uris))
+    if selected < len(uris):
+        print(f"[IMPORT] Only {selected} of {len(uris)} images were selected")
+        return False
+    print("[IMPORT] Scripted import complete")
+    return True
+
+async def open_draft_checkpoint(draft_key, resume=False):
+    """
+    Reopen the InShot draft saved for this image set instead of importing again.
+    resume=True reopens the last edited copy (incremental re-execution).
+    """
+    from droidrun import AdbTools
+
+    if not launch_inshot():
+        return False
+    tools = AdbTools()
+    print(f"{AGENT_READY_MARKER} Reopening draft checkpoint {draft_key}", flush=True)
+    return await restore_checkpoint(tools, draft_key, resume=resume)
 
 def getProfile():
     """Get default agent specific LLM profiles."""
+    from droidrun import LLMProfile
+
     return {
         "manager": LLMProfile(
             provider="GoogleGenAI",
@@ -197,6 +573,8 @@ def getProfile():
     }
 
 def getAgentConfig(reasoning = False, vision=False):
+    from droidrun import AgentConfig, CodeActConfig, ManagerConfig, ExecutorConfig
+
     return AgentConfig(
         reasoning=reasoning,
         codeact=CodeActConfig(vision=vision, execution_timeout=500000),
@@ -204,7 +582,21 @@ def getAgentConfig(reasoning = False, vision=False):
         executor=ExecutorConfig(vision=vision)
     )
 
-async def select_images():
+async def select_images(expected_images=None):
+    """Import the pushed images into a new InShot project: scripted first, agent as fallback."""
+    try:
+        if await import_images_scripted(expected_images):
+            return True
+    except Exception as e:
+        print(f"[IMPORT] Scripted import failed: {e}")
+
+    print("[IMPORT] Falling back to the DroidRun agent for image selection")
+    run_adb_command(["shell", "am", "force-stop", INSHOT_PACKAGE])
+    return await select_images_with_agent()
+
+async def select_images_with_agent():
+    from droidrun import DroidAgent, DroidrunConfig, LoggingConfig, TracingConfig
+
     goal = """
             Open inshot app and select all the images from the droidrun folder and go the video editor screen and your job is done.
             After opening the inshot app select the video icon (looks like a film) in the left center
@@ -230,12 +622,7 @@ async def select_images():
         }
     }
     
-    load_dotenv()
-    tracer_provider = register(
-        project_name="droidrun-video-editor", 
-        endpoint="http://127.0.0.1:6006/v1/traces",
-        auto_instrument=True
-    )
+    init_runtime()
     
     config = DroidrunConfig(
         agent=getAgentConfig(reasoning=False, vision=False),
@@ -250,6 +637,7 @@ async def select_images():
         custom_tools=custom_tools
     )
 
+    print(f"{AGENT_READY_MARKER} Selection agent initialised", flush=True)
     result = await agent.run()
 
     return result.success
@@ -258,13 +646,29 @@ async def select_images():
 
 import json
 
-async def edit_image(num_images, plan):
-    load_dotenv()
-    tracer_provider = register(
-        project_name="droidrun-video-editor", 
-        endpoint="http://127.0.0.1:6006/v1/traces",
-        auto_instrument=True 
-    )
+async def edit_image(num_images, plan, draft_key=None, restored=False):
+    from droidrun import AdbTools, DroidAgent, DroidrunConfig, LoggingConfig, TracingConfig
+
+    init_runtime()
+
+    # Calibrate up front (no LLM needed) unless a restored draft already carries the profile,
+    # then checkpoint the project so the next run on these photos can skip straight here
+    if draft_key is None or not restored:
+        started = time.perf_counter()
+        tools = AdbTools()
+        await InshotTools.calibrate(num_images, tools=tools)
+        if draft_key:
+            try:
+                saved = await save_checkpoint(tools, draft_key)
+            except Exception as e:
+                print(f"[DRAFT] Failed to save checkpoint: {e}")
+                saved = False
+            # The checkpoint leaves the editor first; never run the plan on the drafts list
+            if not saved and not await ensure_editor(tools, draft_key):
+                raise RuntimeError("Editor not open after a failed draft checkpoint, stopping before the plan runs")
+        calibrate_ms = round((time.perf_counter() - started) * 1000)
+        _tool_time["ms"] += calibrate_ms
+        step_timings.record("calibrate", {"num_images": num_images}, calibrate_ms, timeline().is_calibrated())
     
     config = DroidrunConfig(
         agent=getAgentConfig(reasoning=False, vision=False),
@@ -278,12 +682,14 @@ async def edit_image(num_images, plan):
     plan_str = json.dumps(plan, indent=4)
 
     goal = f"""
-        Phase 1: Setup & Physics
-        - Call 'calibrate(num_images={num_images})' to map the timeline.
+        The project has {num_images} clips and the timeline is already calibrated.
+        Only call 'calibrate(num_images={num_images})' if a tool answers "Run calibration first".
 
-        Phase 2: Execution
         Follow this execution plan strictly. Convert the JSON below into tool calls. 
         Try to call multiple tools in one go (parallel execution) where possible for speed.
+        Merge all 'change_duration' steps into a single 'set_durations' call.
+        Merge all 'apply_effect' steps into a single 'apply_effects_batch' call.
+        Merge all 'apply_animation' steps into a single 'apply_animations_batch' call.
 
         EXECUTION PLAN:
         {plan_str}
@@ -292,7 +698,7 @@ async def edit_image(num_images, plan):
     custom_tools = {
         "calibrate": {
             "arguments": ["num_images"],
-            "description": "CRITICAL FIRST STEP. Measures the timeline scale (pixels per second). usage: calibrate(num_images=4)",
+            "description": "Re-measures the timeline scale (pixels per second). Already done before you start; only needed if a tool says 'Run calibration first'. usage: calibrate(num_images=4)",
             "function": InshotTools.calibrate
         },
         "seek_timeline": {
@@ -310,16 +716,31 @@ async def edit_image(num_images, plan):
             "description": "Changes the duration of a specific clip. image_idx is 1-based. duration is in seconds.",
             "function": InshotTools.change_duration
         },
+        "set_durations": {
+            "arguments": ["durations"],
+            "description": "Sets ALL clip durations in one go. durations is a list in clip order (durations[0] is clip 1), e.g. [2.5, 2.5, 3.0]; use null to keep a clip unchanged. Preferred over repeated change_duration calls.",
+            "function": InshotTools.set_durations
+        },
         "apply_effect": {
             "arguments": ["image_idx", "effects_list"],
             "description": "Applies a list of visual effects to a specific clip. image_idx is 1-based. effects_list is a list of strings (e.g. ['Slow Zoom', 'Darken']). Max 2 effects.",
             "function": InshotTools.apply_effect
         },
+        "apply_effects_batch": {
+            "arguments": ["effects_map"],
+            "description": "Applies effects to MANY clips in one go. effects_map maps 1-based image_idx to a list of effects (e.g. {1: ['Slow Zoom'], 3: ['Glitch', 'Darken']}). Preferred over repeated apply_effect calls.",
+            "function": InshotTools.apply_effects_batch
+        },
         "apply_animation": {
             "arguments": ["image_idx", "animation_name", "animation_type"],
             "description": "Applies a particular animation of argument 'animation_name' of type 'animation_type' to an image of idx 'image_idx'",
             "function": InshotTools.apply_animation
         },
+        "apply_animations_batch": {
+            "arguments": ["animations_list"],
+            "description": "Applies animations to MANY clips in one go. animations_list is a list of {'image_idx': int, 'animation_name': str, 'animation_type': 'IN'|'OUT'|'COMBO'}. Preferred over repeated apply_animation calls.",
+            "function": InshotTools.apply_animations_batch
+        },
         "add_music_effects": {
             "arguments": ["start_time", "music_name"],
             "description": "Applies a music effect to a particular image segment",
@@ -332,41 +753,119 @@ async def edit_image(num_images, plan):
         }
     }
 
+    for tool_name, tool in custom_tools.items():
+        tool["function"] = with_step_events(tool_name, tool["function"])
+
     agent = DroidAgent(
         goal=goal,
         config=config,
         custom_tools=custom_tools
     )
 
+    print(f"{AGENT_READY_MARKER} Editing agent initialised", flush=True)
     result = await agent.run()
 
     return result
 
-if __name__ == "__main__":
-    import sys
-    
-    if len(sys.argv) < 2:
-        print("Usage: python agents_functions.py <select|edit>")
-        sys.exit(1)
-    
-    mode = sys.argv[1]
-    
+def report_gestures(before):
+    """Emit the gestures sent (and total swipe time) since `before`, and persist learned timings."""
+    after = InshotTools._gesture_snapshot()
+    report = {key: after[key] - before[key] for key in ("taps", "swipes", "swipe_ms")}
+    report["job_s"] = round(after["time"] - before["time"], 1)
+    print(f"[GESTURES] {report['taps']} taps, {report['swipes']} swipes, {report['swipe_ms'] / 1000:.1f}s swiping")
+    emit_event("gesture_report", **report)
+    gesture_timing().save()
+
+async def run_mode(mode, session_id=None):
+    """
+    Run a single select/edit job (shared by the CLI and the warm agent worker).
+    With a session_id the plan comes from executions/<session_id>/plan.json and
+    timeline state is namespaced to that session; without one, ./plan.json is used.
+    executions/<session_id>/session.json (written by the server) carries the image
+    set key used for draft checkpoints and the draft mode ("none", "checkpoint" or "resume").
+    A select job that reopened the draft adds "draft_restored" (the key) to it, so the edit
+    job knows even when it runs in another process and Redis is down.
+    """
+    plan_path = "plan.json"
+    session_info = {}
+    if session_id:
+        plan_path = os.path.join(session_dir(session_id), "plan.json")
+        global_state.session_id = session_id
+        info_path = os.path.join(session_dir(session_id), "session.json")
+        if os.path.exists(info_path):
+            with open(info_path, "r") as f:
+                session_info = json.load(f)
+    draft_key = session_info.get("image_set_key")
+
     if mode == "select":
-        print("[SELECT] Starting image selection mode...")
-        asyncio.run(select_images())
-        print("[DONE] Image selection complete!")
+        draft_mode = session_info.get("draft", "none")
+        started = time.perf_counter()
+        if draft_mode in ("checkpoint", "resume"):
+            print(f"[SELECT] Reopening draft ({draft_mode}) for image set {draft_key}...")
+            ok = await open_draft_checkpoint(draft_key, resume=draft_mode == "resume")
+        else:
+            print("[SELECT] Starting image selection mode...")
+            ok = await select_images(session_info.get("num_images"))
+        step_timings.record("phase:select", {"draft": draft_mode}, round((time.perf_counter() - started) * 1000), ok)
+
+        if not ok:
+            raise RuntimeError("Draft checkpoint could not be reopened" if draft_mode != "none" else "Image selection failed")
+        print("[DONE] Draft checkpoint reopened, setup skipped!" if draft_mode != "none" else "[DONE] Image selection complete!")
+        if session_id and draft_mode != "none":
+            session_info["draft_restored"] = draft_key
+            with open(info_path, "w") as f:
+                json.dump(session_info, f, indent=4)
         
     elif mode == "edit":
-        with open("plan.json", "r") as f:
+        with open(plan_path, "r") as f:
             plan_data = json.load(f)
         
         num_images = plan_data.get("num_images", 2)
         plan = plan_data.get("plan", [])
         
         print(f"[PLAN] Loaded plan with {len(plan)} steps for {num_images} images")
-        asyncio.run(edit_image(num_images, plan))
+        started = time.perf_counter()
+        _tool_time["ms"] = 0
+        _job_steps.update(done=[], errors=0)
+        gestures_before = InshotTools._gesture_snapshot()
+        # The select job's record in session.json survives a Redis outage between processes
+        restored = draft_key is not None and draft_key in (session_info.get("draft_restored"), global_state.get("draft_restored"))
+        try:
+            result = await edit_image(num_images, plan, draft_key, restored)
+        finally:
+            report_gestures(gestures_before)
+        timeline().save()
+        overhead_ms = round((time.perf_counter() - started) * 1000) - _tool_time["ms"]
+        step_timings.record("phase:agent_overhead", {"steps": len(plan)}, overhead_ms, getattr(result, "success", False))
+
+        # Remember what the working copy now contains so the next run can diff against it.
+        # The agent can report success after skipping or failing a step, so the plan only
+        # counts as applied when every step of it ran without a step_error.
+        applied = _job_steps["errors"] == 0 and applied_all(_job_steps["done"], plan)
+        # A checkpoint saved by this job also leaves the working copy open (see save_checkpoint)
+        restored = restored or global_state.get("draft_restored") == draft_key
+        if draft_key and getattr(result, "success", False) and restored:
+            if applied:
+                save_applied_plan(draft_key, plan_data.get("full_plan", plan))
+            else:
+                print(f"[PLAN] Not every step was applied ({_job_steps['errors']} failed), next run starts from scratch")
         print("[DONE] Editing complete!")
         
     else:
+        raise ValueError(f"Unknown mode: {mode}. Use 'select' or 'edit'")
+
+if __name__ == "__main__":
+    import sys
+    
+    if len(sys.argv) < 2:
+        print("Usage: python agents_functions.py <select|edit> [session_id]")
+        sys.exit(1)
+    
+    mode = sys.argv[1]
+    session_id = sys.argv[2] if len(sys.argv) > 2 else None
+    
+    if mode not in ("select", "edit"):
         print(f"Unknown mode: {mode}. Use 'select' or 'edit'")
         sys.exit(1)
+    
+    asyncio.run(run_mode(mode, session_id))
@@ -0,0 +1,309 @@
+"""
+Audio Analysis - local tempo, beat and energy analysis of candidate tracks
+Candidate tracks are decoded to mono PCM with ffmpeg and analysed with NumPy, so the
+music infusion stage doesn't have to upload whole MP3s for Gemini to "listen" to:
+
+    analysis = analyze_track(path)                    # tempo, beats, onsets, energy
+    offsets = score_offsets(analysis, cuts, total_s)  # start offsets, best first
+    summary = track_summary(analysis, offsets)        # compact, JSON-serializable
+
+- onset strength: positive spectral flux of the log-magnitude STFT
+- tempo: autocorrelation of the onset envelope, weighted towards ~120 BPM
+- beats: dynamic-programming beat tracker (Ellis 2007) on the onset envelope
+- energy: frame RMS, smoothed over ~1 s; peaks are its local maxima, drops its sharpest rises
+
+A start offset is scored on how well onsets and beats land on the video's cut points
+(sync), how energetic the section the video covers is (energy) and whether a drop lands
+on a cut (drop).
+"""
+
+import json
+import subprocess
+
+import numpy as np
+
+SAMPLE_RATE = 22050
+N_FFT = 2048
+HOP = 512
+FPS = SAMPLE_RATE / HOP
+# Only the first minutes of a track are considered as start offsets
+MAX_ANALYSIS_S = 600
+
+MIN_BPM, MAX_BPM = 60, 200
+# Beats more than this far from a cut don't count as on it
+BEAT_TOLERANCE_S = 0.07
+ENERGY_SEGMENTS = 16
+
+SCORE_WEIGHTS = {"sync": 0.5, "energy": 0.3, "drop": 0.2}
+
+
+def decode_pcm(path: str, sample_rate: int = SAMPLE_RATE) -> np.ndarray:
+    """Mono float32 samples of an audio file (ffmpeg does the decoding and resampling)"""
+    result = subprocess.run(
+        [
+            'ffmpeg', '-nostdin', '-v', 'error',
+            '-i', path,
+            '-t', str(MAX_ANALYSIS_S),
+            '-ac', '1', '-ar', str(sample_rate),
+            '-f', 'f32le', '-'
+        ],
+        capture_output=True,
+        check=True
+    )
+    return np.frombuffer(result.stdout, dtype=np.float32)
+
+
+def _frame_features(y: np.ndarray):
+    """Onset strength and RMS per STFT frame, computed in blocks to bound memory"""
+    y = np.pad(y, (N_FFT // 2, N_FFT // 2))
+    frames = np.lib.stride_tricks.sliding_window_view(y, N_FFT)[::HOP]
+    window = np.hanning(N_FFT).astype(np.float32)
+
+    flux, rms = [], []
+    previous = None
+    for start in range(0, len(frames), 1024):
+        block = frames[start:start + 1024]
+        rms.append(np.sqrt(np.mean(block ** 2, axis=1)))
+        log_spec = np.log1p(100 * np.abs(np.fft.rfft(block * window, axis=1)))
+        if previous is not None:
+            log_spec_prev = np.vstack([previous, log_spec[:-1]])
+        else:
+            log_spec_prev = np.vstack([log_spec[:1], log_spec[:-1]])
+        flux.append(np.maximum(0.0, log_spec - log_spec_prev).mean(axis=1))
+        previous = log_spec[-1:]
+
+    onset = np.concatenate(flux)
+    # Remove the slowly varying part so sustained loud passages don't read as onsets
+    onset = np.maximum(0.0, onset - _smooth(onset, int(FPS)))
+    return onset / (onset.max() or 1.0), np.concatenate(rms)
+
+
+def _smooth(values: np.ndarray, width: int) -> np.ndarray:
+    """Moving average; the edges are averaged over the samples that exist"""
+    kernel = np.ones(max(1, width))
+    return np.convolve(values, kernel, mode="same") / np.convolve(np.ones(len(values)), kernel, mode="same")
+
+
+def estimate_tempo(onset: np.ndarray):
+    """(bpm, confidence) from the autocorrelation of the onset envelope"""
+    env = onset - onset.mean()
+    n = len(env)
+    if n < 4 * FPS:
+        return 120.0, 0.0
+    spectrum = np.fft.rfft(env, 2 * n)
+    autocorr = np.fft.irfft(spectrum * np.conj(spectrum))[:n]
+    autocorr /= autocorr[0] or 1.0
+
+    lags = np.arange(int(FPS * 60 / MAX_BPM), int(FPS * 60 / MIN_BPM) + 1)
+    bpms = FPS * 60 / lags
+    # Log-normal prior around 120 BPM (one octave wide) to settle half/double tempo ambiguity
+    prior = np.exp(-0.5 * np.log2(bpms / 120.0) ** 2)
+    weighted = autocorr[lags] * prior
+    best = int(np.argmax(weighted))
+
+    # Parabolic interpolation between neighbouring lags
+    lag = float(lags[best])
+    if 0 < best < len(lags) - 1:
+        a, b, c = autocorr[lags[best - 1]], autocorr[lags[best]], autocorr[lags[best + 1]]
+        denominator = a - 2 * b + c
+        if denominator:
+            lag += 0.5 * (a - c) / denominator
+    return FPS * 60 / lag, float(max(0.0, autocorr[lags[best]]))
+
+
+def track_beats(onset: np.ndarray, bpm: float, tightness: float = 100.0) -> np.ndarray:
+    """Beat times (seconds): the onset peaks best matching a steady beat period"""
+    period = FPS * 60 / bpm
+    # Onset strength smoothed over a fraction of a beat
+    kernel = np.exp(-0.5 * (np.arange(-int(period), int(period) + 1) * 32 / period) ** 2)
+    local = np.convolve(onset / (onset.std() or 1.0), kernel, mode="same")
+
+    n = len(local)
+    score = local.copy()
+    backlink = np.full(n, -1)
+    window = np.arange(-int(round(2 * period)), -int(round(period / 2)) + 1)
+    penalty = -tightness * np.log(-window / period) ** 2
+
+    for i in range(n):
+        candidates = i + window
+        valid = candidates >= 0
+        if not valid.any():
+            continue
+        scores = penalty[valid] + score[candidates[valid]]
+        best = int(np.argmax(scores))
+        if scores[best] > 0:
+            score[i] = local[i] + scores[best]
+            backlink[i] = candidates[valid][best]
+
+    # Last beat: the best-scoring frame within the final beat period
+    tail = max(0, n - int(round(period)))
+    beat = tail + int(np.argmax(score[tail:]))
+    beats = []
+    while beat >= 0:
+        beats.append(beat)
+        beat = backlink[beat]
+    beats = np.array(beats[::-1])
+
+    # The chain runs to both ends of the track; drop leading / trailing beats without onsets
+    strength = local[beats]
+    strong = np.flatnonzero(strength >= 0.5 * np.sqrt(np.mean(strength ** 2)))
+    if len(strong):
+        beats = beats[strong[0]:strong[-1] + 1]
+    return beats / FPS
+
+
+def _energy_features(rms: np.ndarray):
+    """Smoothed energy (0-1), its peaks and its sharpest rises (drops), in seconds"""
+    energy = _smooth(rms, int(FPS))
+    energy = energy / (energy.max() or 1.0)
+
+    # Peaks: loudest point within +-4 s, in the top quarter of the track's energy
+    radius = int(4 * FPS)
+    threshold = np.percentile(energy, 75)
+    peaks = [
+        i for i in range(radius, len(energy) - radius, int(FPS / 4))
+        if energy[i] >= threshold and energy[i] == energy[i - radius:i + radius + 1].max()
+    ]
+
+    # Drops: the biggest energy rises over 2 s (centred on the rise), at least 8 s apart
+    lag = int(FPS)
+    rise = np.zeros_like(energy)
+    rise[lag:-lag] = energy[2 * lag:] - energy[:-2 * lag]
+    drops = []
+    min_rise = max(0.25, 0.5 * rise.max())
+    for i in np.argsort(rise)[::-1]:
+        if rise[i] < min_rise or len(drops) == 4:
+            break
+        if all(abs(i - d) > 8 * FPS for d in drops):
+            drops.append(int(i))
+
+    return energy, np.array(peaks) / FPS, np.array(sorted(drops)) / FPS
+
+
+def analyze_track(path: str) -> dict:
+    """Tempo, beat grid, onset-strength envelope and energy of one audio file"""
+    y = decode_pcm(path)
+    onset, rms = _frame_features(y)
+    bpm, confidence = estimate_tempo(onset)
+    energy, peaks, drops = _energy_features(rms)
+    return {
+        "path": path,
+        "duration_s": len(y) / SAMPLE_RATE,
+        "bpm": float(bpm),
+        "tempo_confidence": confidence,
+        "beats": track_beats(onset, bpm),
+        "onset": onset,
+        "energy": energy,
+        "peaks": peaks,
+        "drops": drops,
+    }
+
+
+def cut_points(plan: dict, num_clips: int) -> list[float]:
+    """
+    Times (seconds into the video) at which one clip gives way to the next. Clips default
+    to 5 s; a transition overlaps its two clips by 1 s and the cut sits in its middle.
+    Steps whose args don't parse (a non-numeric index or duration) are skipped.
+    """
+    durations = {i: 5.0 for i in range(1, num_clips + 1)}
+    transitions = set()
+    for step in plan.get("plan", []):
+        try:
+            args = step.get("args") or {}
+            if step.get("tool") == "change_duration":
+                image_idx = int(args["image_idx"])
+                if image_idx in durations:
+                    durations[image_idx] = float(args.get("duration", 5.0))
+            elif step.get("tool") == "add_transition":
+                if args.get("all_apply", False):
+                    transitions.update(range(1, num_clips))
+                elif args.get("image1_idx"):
+                    transitions.add(int(args["image1_idx"]))
+        except (KeyError, TypeError, ValueError, AttributeError):
+            print(f"[ANALYSIS] Skipping unreadable plan step: {step!r}")
+
+    cuts, elapsed = [], 0.0
+    for i in range(1, num_clips):
+        elapsed += durations[i]
+        overlap = 1.0 if i in transitions else 0.0
+        cuts.append(round(elapsed - overlap / 2, 3))
+        elapsed -= overlap
+    return cuts
+
+
+def score_offsets(analysis: dict, cuts: list[float], total_duration: float, top: int = 5) -> list[dict]:
+    """
+    Best start offsets (on the beat grid) for a video of total_duration with the given cuts,
+    each scored 0-1 on sync, energy and drop. Offsets at least 2 s apart, best first.
+    """
+    beats, onset, energy = analysis["beats"], analysis["onset"], analysis["energy"]
+    latest_start = analysis["duration_s"] - total_duration
+    starts = beats[beats <= latest_start] if len(beats) else np.array([])
+    if latest_start <= 0 or not len(starts):
+        starts = np.array([0.0])
+
+    # Cut times (and the video's first frame) in track time, for every candidate start
+    moments = starts[:, None] + np.array([0.0] + list(cuts))[None, :]
+    frames = np.clip(np.round(moments * FPS).astype(int), 0, len(onset) - 1)
+    # Strongest onset within +-2 frames of each moment
+    neighbourhood = np.stack([np.clip(frames + d, 0, len(onset) - 1) for d in range(-2, 3)])
+    onset_hit = onset[neighbourhood].max(axis=0)
+    if len(beats):
+        nearest = np.abs(moments[..., None] - beats[None, None, :]).min(axis=-1)
+        beat_hit = np.exp(-0.5 * (nearest / BEAT_TOLERANCE_S) ** 2)
+    else:
+        beat_hit = np.zeros_like(onset_hit)
+    sync = (0.5 * onset_hit + 0.5 * beat_hit).mean(axis=1)
+
+    cumulative = np.concatenate([[0.0], np.cumsum(energy)])
+    first = np.clip((starts * FPS).astype(int), 0, len(energy) - 1)
+    last = np.clip(((starts + total_duration) * FPS).astype(int), first + 1, len(energy))
+    section_energy = (cumulative[last] - cumulative[first]) / (last - first)
+
+    drops = analysis["drops"]
+    if len(drops):
+        to_cut = np.abs(moments[..., None] - drops[None, None, :]).min(axis=1)
+        drop_hit = np.exp(-0.5 * (to_cut / 0.15) ** 2).max(axis=1)
+    else:
+        drop_hit = np.zeros(len(starts))
+
+    total = (SCORE_WEIGHTS["sync"] * sync + SCORE_WEIGHTS["energy"] * section_energy
+             + SCORE_WEIGHTS["drop"] * drop_hit)
+
+    offsets = []
+    for i in np.argsort(total)[::-1]:
+        if all(abs(starts[i] - o["start_s"]) >= 2.0 for o in offsets):
+            offsets.append({
+                "start_s": round(float(starts[i]), 2),
+                "score": round(float(total[i]), 3),
+                "sync": round(float(sync[i]), 3),
+                "energy": round(float(section_energy[i]), 3),
+                "drop": round(float(drop_hit[i]), 3),
+            })
+        if len(offsets) == top:
+            break
+    return offsets
+
+
+def track_summary(analysis: dict, offsets: list[dict]) -> dict:
+    """Compact numeric description of a track (a few hundred bytes) for the Director prompt"""
+    energy = analysis["energy"]
+    segments = np.array_split(energy, ENERGY_SEGMENTS) if len(energy) >= ENERGY_SEGMENTS else [energy]
+    return {
+        "duration_s": round(analysis["duration_s"], 2),
+        "bpm": round(analysis["bpm"], 1),
+        "beat_period_s": round(60 / analysis["bpm"], 3),
+        "tempo_confidence": round(analysis["tempo_confidence"], 2),
+        "energy_profile": [int(round(9 * s.mean())) if len(s) else 0 for s in segments],
+        "energy_peaks_s": [round(float(t), 1) for t in analysis["peaks"]][:8],
+        "drops_s": [round(float(t), 1) for t in analysis["drops"]],
+        "best_offsets": offsets,
+    }
+
+
+if __name__ == "__main__":
+    import sys
+
+    for track in sys.argv[1:]:
+        result = analyze_track(track)
+        print(track, json.dumps(track_summary(result, score_offsets(result, [], 15.0)), indent=2))
@@ -0,0 +1,254 @@
+"""
+Budget - Director model tiering, thinking budgets and per-session cost ceiling
+A policy picks the model and thinking budget of each Director stage. Before a stage
+runs, BudgetGovernor estimates its cost; when the session's ceiling would be exceeded
+it moves the stage down DOWNGRADE_CHAIN, and stops (BudgetExceeded) when even the
+cheapest model doesn't fit; a re-run of a failed stage is checked again first. Every
+attempt is charged from its own usage metadata with tier-aware pricing (prompts over
+200k tokens are billed at the higher tier), and the context cache's storage counts
+towards the ceiling for as long as the cache lives.
+
+Every finished planning session is appended to executions/director_runs.jsonl so the
+latency and cost of each policy can be compared (policy_summary()).
+"""
+
+import json
+import os
+import time
+
+from agent_worker import EXECUTIONS_DIR
+
+RUNS_PATH = os.path.join(EXECUTIONS_DIR, "director_runs.jsonl")
+
+# Paid tier, USD per 1M tokens. Long-context tier applies when a prompt exceeds tier_tokens.
+MODEL_PRICING = {
+    "gemini-2.5-pro": {
+        "tier_tokens": 200_000,
+        "input": (1.25, 2.50),
+        "output": (10.00, 15.00),  # includes thinking
+        "cached_input": (0.125, 0.25),
+        "cache_storage_hour": 4.50,
+    },
+    "gemini-2.5-flash": {
+        "tier_tokens": None,
+        "input": (0.30, 0.30),
+        "output": (2.50, 2.50),
+        "cached_input": (0.03, 0.03),
+        "cache_storage_hour": 1.00,
+    },
+    "gemini-2.5-flash-lite": {
+        "tier_tokens": None,
+        "input": (0.10, 0.10),
+        "output": (0.40, 0.40),
+        "cached_input": (0.01, 0.01),
+        "cache_storage_hour": 1.00,
+    },
+}
+
+# Cheaper models a stage may fall back to, most capable first
+DOWNGRADE_CHAIN = ["gemini-2.5-pro", "gemini-2.5-flash", "gemini-2.5-flash-lite"]
+
+# Thinking budget range per model (-1 = dynamic, 0 = off where allowed)
+THINKING_LIMITS = {
+    "gemini-2.5-pro": (128, 32768),
+    "gemini-2.5-flash": (0, 24576),
+    "gemini-2.5-flash-lite": (0, 24576),
+}
+
+# stage -> (model, thinking budget)
+POLICIES = {
+    # Previous behaviour: Pro everywhere, dynamic thinking
+    "quality": {
+        "visual_plan": ("gemini-2.5-pro", -1),
+        "music_plan": ("gemini-2.5-pro", -1),
+        "full_plan": ("gemini-2.5-pro", -1),
+    },
+    # Pro where the edit is decided, Flash for track suggestions
+    "balanced": {
+        "visual_plan": ("gemini-2.5-pro", 8192),
+        "music_plan": ("gemini-2.5-flash", 1024),
+        "full_plan": ("gemini-2.5-pro", 4096),
+    },
+    "economy": {
+        "visual_plan": ("gemini-2.5-flash", 4096),
+        "music_plan": ("gemini-2.5-flash-lite", 0),
+        "full_plan": ("gemini-2.5-flash", 2048),
+    },
+}
+DEFAULT_POLICY = os.getenv("DIRECTOR_BUDGET_POLICY", "quality")
+# Per-session cost ceiling in USD (0 = no ceiling)
+DEFAULT_MAX_COST_USD = float(os.getenv("DIRECTOR_MAX_COST_USD", "0"))
+
+# Output tokens expected per stage (besides thinking), and thinking assumed for dynamic budgets
+EXPECTED_OUTPUT_TOKENS = {"visual_plan": 2500, "music_plan": 600, "full_plan": 400}
+DYNAMIC_THINKING_TOKENS = 8192
+
+
+class BudgetExceeded(Exception):
+    pass
+
+
+def _rates(model: str, prompt_tokens: int) -> tuple:
+    pricing = MODEL_PRICING.get(model, MODEL_PRICING["gemini-2.5-pro"])
+    tier = 1 if pricing["tier_tokens"] and prompt_tokens > pricing["tier_tokens"] else 0
+    return pricing["input"][tier], pricing["output"][tier], pricing["cached_input"][tier]
+
+
+def call_costs(usage: dict) -> dict:
+    """
+    USD input / output cost of one call from its usage metadata (model in usage["model"]).
+    Usage summed over several attempts carries the per-attempt costs in usage["costs"].
+    """
+    if not usage or usage.get("memo_hit"):
+        return {"input": 0.0, "output": 0.0, "input_uncached": 0.0}
+    if "costs" in usage:
+        return usage["costs"]
+    prompt = usage.get("prompt_tokens", 0)
+    cached = usage.get("cached_tokens", 0)
+    output = usage.get("candidates_tokens", 0) + usage.get("thinking_tokens", 0)
+    input_rate, output_rate, cached_rate = _rates(usage.get("model", "gemini-2.5-pro"), prompt)
+    return {
+        "input": ((prompt - cached) * input_rate + cached * cached_rate) / 1_000_000,
+        "output": output * output_rate / 1_000_000,
+        # What the input would have cost without the context cache
+        "input_uncached": prompt * input_rate / 1_000_000,
+    }
+
+
+def usage_cost(usage: dict) -> float:
+    costs = call_costs(usage)
+    return costs["input"] + costs["output"]
+
+
+def cache_storage_cost(cache_info: dict) -> float:
+    """Storage cost of a context cache for the time it has existed so far"""
+    if not cache_info:
+        return 0.0
+    pricing = MODEL_PRICING.get(cache_info.get("model"), MODEL_PRICING["gemini-2.5-pro"])
+    hours = max(0.0, time.time() - cache_info.get("created_at", time.time())) / 3600
+    return cache_info.get("tokens", 0) / 1_000_000 * hours * pricing["cache_storage_hour"]
+
+
+def clamp_thinking(model: str, thinking_budget: int) -> int:
+    if thinking_budget is None or thinking_budget == -1:
+        return thinking_budget
+    low, high = THINKING_LIMITS.get(model, (0, 24576))
+    return max(low, min(high, thinking_budget))
+
+
+def estimate_cost(model: str, stage: str, input_tokens: int, thinking_budget: int) -> float:
+    thinking = DYNAMIC_THINKING_TOKENS if thinking_budget in (None, -1) else thinking_budget
+    output = EXPECTED_OUTPUT_TOKENS.get(stage, 1000) + thinking
+    input_rate, output_rate, _ = _rates(model, input_tokens)
+    return (input_tokens * input_rate + output * output_rate) / 1_000_000
+
+
+class BudgetGovernor:
+    """Model / thinking selection and spend tracking for one planning session"""
+
+    def __init__(self, policy: str = None, max_cost_usd: float = None):
+        self.policy = policy if policy in POLICIES else DEFAULT_POLICY
+        self.max_cost_usd = DEFAULT_MAX_COST_USD if max_cost_usd is None else max_cost_usd
+        self.spent_usd = 0.0
+        self.stages = {}
+        # Context cache storage: settled when the cache is deleted, accruing while it is open
+        self.cache_storage_usd = 0.0
+        self.cache_info = None
+
+    def spent(self) -> float:
+        """Calls charged so far plus the context cache's storage"""
+        return self.spent_usd + self.cache_storage_usd + cache_storage_cost(self.cache_info)
+
+    def close_cache(self):
+        """Settle the storage cost of the context cache once it is deleted"""
+        self.cache_storage_usd += cache_storage_cost(self.cache_info)
+        self.cache_info = None
+
+    def select(self, stage: str, input_tokens: int):
+        """(model, thinking_budget) for a stage, downgraded to fit the remaining budget"""
+        planned_model, thinking = POLICIES[self.policy][stage]
+        chain = DOWNGRADE_CHAIN[DOWNGRADE_CHAIN.index(planned_model):]
+        for model in chain:
+            budget = clamp_thinking(model, thinking)
+            estimate = estimate_cost(model, stage, input_tokens, budget)
+            if not self.max_cost_usd or self.spent() + estimate <= self.max_cost_usd:
+                if model != planned_model:
+                    print(f"[BUDGET] {stage}: {planned_model} -> {model} to stay under ${self.max_cost_usd:.4f}")
+                self.stages[stage] = {
+                    "planned_model": planned_model,
+                    "model": model,
+                    "thinking_budget": budget,
+                    "est_cost_usd": round(estimate, 6),
+                }
+                return model, budget
+        raise BudgetExceeded(
+            f"Budget of ${self.max_cost_usd:.4f} reached (${self.spent():.4f} spent), "
+            f"no model can run '{stage}' within it"
+        )
+
+    def check(self, stage: str):
+        """Raise BudgetExceeded when another attempt of a selected stage no longer fits"""
+        estimate = self.stages.get(stage, {}).get("est_cost_usd", 0.0)
+        if self.max_cost_usd and self.spent() + estimate > self.max_cost_usd:
+            raise BudgetExceeded(
+                f"Budget of ${self.max_cost_usd:.4f} reached (${self.spent():.4f} spent), "
+                f"no room to re-run '{stage}'"
+            )
+
+    def charge(self, stage: str, usage: dict) -> float:
+        """Record the actual cost of one finished attempt of a stage (attempts add up)"""
+        cost = usage_cost(usage)
+        self.spent_usd += cost
+        entry = self.stages.setdefault(stage, {})
+        entry["cost_usd"] = round(entry.get("cost_usd", 0.0) + cost, 6)
+        entry["latency_ms"] = (entry.get("latency_ms") or 0) + ((usage or {}).get("latency_ms") or 0)
+        entry["memo_hit"] = bool((usage or {}).get("memo_hit"))
+        return cost
+
+    def report(self) -> dict:
+        return {
+            "policy": self.policy,
+            "max_cost_usd": self.max_cost_usd or None,
+            "spent_usd": round(self.spent(), 6),
+            "cache_storage_usd": round(self.cache_storage_usd + cache_storage_cost(self.cache_info), 6),
+            "stages": self.stages,
+        }
+
+
+def record_run(report: dict, total_cost_usd: float, total_latency_ms: int):
+    """Append a finished planning session (for per-policy comparisons)"""
+    entry = {**report, "total_cost_usd": round(total_cost_usd, 6), "total_latency_ms": total_latency_ms, "at": time.time()}
+    try:
+        os.makedirs(EXECUTIONS_DIR, exist_ok=True)
+        with open(RUNS_PATH, "a") as f:
+            f.write(json.dumps(entry) + "\n")
+    except OSError as e:
+        print(f"[BUDGET] Could not record run: {e}")
+
+
+def policy_summary() -> dict:
+    """Median cost and latency of recorded planning sessions, per policy"""
+    runs = {}
+    try:
+        with open(RUNS_PATH, "r") as f:
+            for line in f:
+                try:
+                    run = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                runs.setdefault(run.get("policy"), []).append(run)
+    except OSError:
+        return {}
+
+    def median(values):
+        values = sorted(v for v in values if v is not None)
+        return values[len(values) // 2] if values else None
+
+    return {
+        policy: {
+            "runs": len(entries),
+            "median_cost_usd": median(e.get("total_cost_usd") for e in entries),
+            "median_latency_ms": median(e.get("total_latency_ms") for e in entries),
+        }
+        for policy, entries in runs.items()
+    }
@@ -3,13 +3,34 @@ VideoDirector - AI Video Editing Director
 Uses Gemini to generate visual plans, music selections, and final edit decisions.
 """
 
-from google import genai
+import asyncio
+import hashlib
 import json
-from dotenv import load_dotenv
 import shutil
 import os
-import yt_dlp
 import subprocess
+import time
+
+import memo_cache
+from budget import BudgetGovernor, call_costs
+from image_prep import LONG_EDGE, estimate_image_tokens, media_resolution, prepare_images
+from json_stream import JsonStreamParser, repair_json
+from upload_cache import file_hash, upload_files
+
+# google-genai, python-dotenv and yt_dlp are imported on first use to keep server startup cheap
+
+# Gemini requests in flight across all planning sessions (uploads, cache and generate calls)
+GEMINI_MAX_CONCURRENCY = int(os.getenv("GEMINI_MAX_CONCURRENCY", "8"))
+gemini_slots = asyncio.Semaphore(GEMINI_MAX_CONCURRENCY)
+
+# How long the per-session context cache (images) lives if the session never closes it
+CONTEXT_CACHE_TTL_S = int(os.getenv("DIRECTOR_CACHE_TTL_S", "900"))
+
+DIRECTOR_CACHED_SYSTEM_INSTRUCTION = """
+You are part of an AI video editing team working in the InShot app on Android.
+The cached context holds the photos the video is edited from: each photo is one clip, in order (IMAGE 1 is clip 1).
+Answer every request with the JSON format it asks for.
+"""
 
 DIRECTOR_SYSTEM_PROMPT = """
 You are an expert Video Editor AI. Your goal is to translate a high-level user request (e.g., "Make it cinematic", "Make it fast-paced") into a specific list of tool execution commands.
@@ -244,28 +265,467 @@ gets subtracted by 1 second (0.5 from each clip)
 *Note: 'start_time_seconds' is the timestamp in the song file where the edit should begin.*
 """
 
+DIRECTOR_INFUSE_MUSIC_SUMMARY_PROMPT = """
+You are an expert Music Editor and Sound Engineer.
+You have been provided with:
+1. A numeric analysis of each candidate audio track, measured from the audio itself.
+2. A detailed Visual Editing Plan (JSON) that describes the flow, pacing, and transitions of the video.
+3. The calculated Total Duration of the video and the times of its cuts.
+
+### YOUR GOAL
+Select the ONE best track from the candidates and identify the exact **Start Time** timestamp to slice the audio so that it syncs perfectly with the video.
+
+### INPUT DATA
+Total Video Duration: {total_duration} seconds.
+Cut points (seconds from the start of the video): {cut_points}
+Visual Plan:
+{visual_plan}
+Visual Director thoughts about Music
+{music_thoughts}
+
+Track analysis (keyed by filename):
+{track_analysis}
+
+For each track:
+- bpm / beat_period_s: tempo (tempo_confidence 0-1)
+- energy_profile: loudness over the whole track in equal segments, 0 (quiet) to 9 (loudest)
+- energy_peaks_s / drops_s: seconds into the track of the loudest moments and of sudden rises in energy
+- best_offsets: start times scored 0-1 for how well beats and onsets land on the cuts (sync), how loud the covered section is (energy) and whether a drop lands on a cut (drop)
+
+### ANALYSIS INSTRUCTIONS
+1. Match each track's tempo and energy to the pacing and mood of the Visual Plan.
+2. Prefer one of the best_offsets; only move away from them with a clear reason (e.g. to land a drop on a key moment).
+3. start_time_seconds + the total video duration must not exceed the track's duration_s.
+
+### OUTPUT FORMAT (Strict JSON)
+{{
+    "thought_process": "Explain why you chose this track and why this specific start time aligns with the video edits.",
+    "selected_track_filename": "The exact filename of the track you chose",
+    "start_time_seconds": 45.5,
+    "end_time_seconds": 50.0
+}}
+
+*Note: 'start_time_seconds' is the timestamp in the song file where the edit should begin.*
+"""
+
+# How the music infusion stage hears the candidates:
+#   audio   - upload the MP3s, Gemini listens to them
+#   summary - send Gemini a numeric analysis of each track (audio_analysis.py) instead
+#   fast    - pick the best scored track and offset locally, no Gemini call
+MUSIC_MODES = ("audio", "summary", "fast")
+MUSIC_MODE = os.getenv("DIRECTOR_MUSIC_MODE", "summary")
+
+# Response schemas (JSON Schema) each stage's output is constrained to. Property order
+# matches the prompts so thought_process streams first.
+VISUAL_PLAN_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "thought_process": {"type": "string"},
+        "music_thoughts": {"type": "string"},
+        "plan": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "tool": {
+                        "type": "string",
+                        "enum": ["change_duration", "apply_effect", "apply_animation", "add_transition"],
+                    },
+                    "args": {"type": "object"},
+                },
+                "required": ["tool", "args"],
+            },
+        },
+    },
+    "required": ["thought_process", "music_thoughts", "plan"],
+}
+
+MUSIC_PLAN_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "thought_process": {"type": "string"},
+        "tracks": {
+            "type": "array",
+            "maxItems": 2,
+            "items": {
+                "type": "object",
+                "properties": {
+                    "track_name": {"type": "string"},
+                    "artist_name": {"type": "string"},
+                    "vibe": {"type": "string"},
+                    "reasoning": {"type": "string"},
+                },
+                "required": ["track_name", "artist_name"],
+            },
+        },
+    },
+    "required": ["thought_process", "tracks"],
+}
+
+MUSIC_INFUSION_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "thought_process": {"type": "string"},
+        "selected_track_filename": {"type": "string"},
+        "start_time_seconds": {"type": "number"},
+        "end_time_seconds": {"type": "number"},
+    },
+    "required": ["thought_process", "selected_track_filename", "start_time_seconds", "end_time_seconds"],
+}
+
+# Arguments every plan step needs before it can be executed (or timed by
+# calculate_total_duration); a plan with a step missing one is not usable
+PLAN_TOOL_ARGS = {
+    "change_duration": ["image_idx", "duration"],
+    "add_transition": ["image1_idx", "image2_idx", "transition_type"],
+    "apply_effect": ["image_idx", "effects_list"],
+    "apply_animation": ["image_idx", "animation_name", "animation_type"],
+}
+
+# A stage whose output can't be parsed or repaired is re-run on its own up to this many times
+STAGE_ATTEMPTS = int(os.getenv("DIRECTOR_STAGE_ATTEMPTS", "2"))
+
+# Memoized stage outputs are invalidated whenever a prompt template or schema changes
+PROMPT_TEMPLATE_VERSION = hashlib.sha256("".join([
+    DIRECTOR_CACHED_SYSTEM_INSTRUCTION,
+    DIRECTOR_SYSTEM_PROMPT,
+    DIRECTOR_MUSIC_PROMPT,
+    DIRECTOR_INFUSE_MUSIC_PROMPT,
+    DIRECTOR_INFUSE_MUSIC_SUMMARY_PROMPT,
+    json.dumps([VISUAL_PLAN_SCHEMA, MUSIC_PLAN_SCHEMA, MUSIC_INFUSION_SCHEMA], sort_keys=True),
+]).encode()).hexdigest()[:12]
+
 
 class VideoDirector:
-    def __init__(self, clips_path: list[str]):
+    def __init__(self, clips_path: list[str], output_dir: str = ".", reuse: bool = False,
+                 policy: str = None, max_cost_usd: float = None, music_mode: str = None):
+        from dotenv import load_dotenv
+        from google import genai
+
         load_dotenv()
         self.client = genai.Client()
-        self.model = "gemini-2.5-pro"
+        # Model / thinking budget per stage and the session's cost ceiling (see budget.py)
+        self.budget = BudgetGovernor(policy, max_cost_usd)
         self.clips_path = clips_path
+        # Stage outputs (plan.json, plan_music.json, final_plan.json) are written here
+        self.output_dir = output_dir
+        os.makedirs(self.output_dir, exist_ok=True)
+        # Look up stage outputs of identical earlier requests (see memo_cache.py)
+        self.reuse = reuse
+        self.image_hashes = None
+        # Images are uploaded (and cached) on first use, so memoized stages never upload
         self.uploaded_files = None
-        self._upload_files()
+        self.prep_report = None
+        # Explicit context cache holding the images, shared by all three stages
+        self.cache = None
+        self.cache_model = None
+        self.cache_info = None
+        self.music_mode = music_mode if music_mode in MUSIC_MODES else MUSIC_MODE
+        # Local analysis of the candidate tracks (summary / fast music modes)
+        self.music_analysis = None
     
-    def _upload_files(self):
+    async def _hash_images(self):
+        if self.image_hashes is None:
+            self.image_hashes = await asyncio.to_thread(lambda: [file_hash(path) for path in self.clips_path])
+
+    async def _ensure_context(self, model: str):
+        """Upload the images and create the context cache (for `model`), once per session"""
+        if self.uploaded_files is None:
+            await self._upload_files()
+            await self._create_cache(model)
+    
+    async def _upload_files(self):
         if self.uploaded_files is not None:
             return
         
-        files = []
-        for i, path in enumerate(self.clips_path):
-            files.append(self.client.files.upload(file=path, config={
-                "display_name": f"image{i}"
-            }))
-        
-        self.uploaded_files = files
+        # Downscaled copies go to Gemini; the originals are what gets pushed to the device
+        prepared_paths, self.prep_report = await prepare_images(self.clips_path, os.path.join(self.output_dir, "prepared"))
+        self.uploaded_files = await upload_files(
+            self.client,
+            prepared_paths,
+            [f"image{i}" for i in range(len(self.clips_path))],
+            gemini_slots
+        )
     
+    async def _create_cache(self, model: str):
+        """
+        Cache the images (and the shared system instruction) once for this session so each
+        stage only sends its own prompt. A cache belongs to one model: stages that the budget
+        policy runs on another model get the images inline. Falls back to inline images when caching isn't
+        possible, e.g. when the images are below the model's minimum cacheable token count.
+        """
+        from google.genai import types
+
+        contents = ["Here is the visual context for the video clips, in order:"]
+        for i, file_obj in enumerate(self.uploaded_files):
+            contents.append(f"\n--- IMAGE {i+1} ---")
+            contents.append(file_obj)
+
+        started = time.perf_counter()
+        try:
+            async with gemini_slots:
+                self.cache = await self.client.aio.caches.create(
+                    model=model,
+                    config=types.CreateCachedContentConfig(
+                        display_name=f"director-{os.path.basename(os.path.abspath(self.output_dir))}",
+                        system_instruction=DIRECTOR_CACHED_SYSTEM_INSTRUCTION,
+                        contents=contents,
+                        ttl=f"{CONTEXT_CACHE_TTL_S}s",
+                    ),
+                )
+        except Exception as e:
+            print(f"Context cache unavailable, sending images inline: {e}")
+            return
+
+        tokens = self.cache.usage_metadata.total_token_count if self.cache.usage_metadata else 0
+        self.cache_model = model
+        self.cache_info = {
+            "name": self.cache.name,
+            "model": model,
+            "tokens": tokens or 0,
+            "ttl_s": CONTEXT_CACHE_TTL_S,
+            "created_at": time.time(),
+            "create_ms": int((time.perf_counter() - started) * 1000),
+        }
+        # Storage is billed for as long as the cache lives, so it counts against the budget too
+        self.budget.cache_info = self.cache_info
+        if self.prep_report is not None:
+            # The cached images are tokenized at default resolution, not the prep one
+            self.prep_report["cached_image_tokens"] = tokens or 0
+        print(f"Context cache created: {self.cache_info}")
+
+    async def close(self):
+        """Delete the context cache (it would otherwise be billed for storage until its TTL)"""
+        if self.cache is None:
+            return
+        try:
+            async with gemini_slots:
+                await self.client.aio.caches.delete(name=self.cache.name)
+        except Exception as e:
+            print(f"Failed to delete context cache: {e}")
+        self.budget.close_cache()
+        self.cache = None
+
+    def _uses_cache(self, model: str) -> bool:
+        return self.cache is not None and model == self.cache_model
+
+    def _estimate_input_tokens(self, prompt: str, audio_paths: list[str] = ()) -> int:
+        """
+        Rough prompt size of a stage before it is sent (for the budget check). Images in the
+        context cache are tokenized at the model's default resolution (a cache takes no
+        media_resolution); only inline images get the prep resolution.
+        """
+        if self.cache_info:
+            image_tokens = self.cache_info["tokens"]
+        elif self.uploaded_files is None:
+            # First stage: the cache about to be created holds the images at default resolution
+            image_tokens = estimate_image_tokens(LONG_EDGE, LONG_EDGE) * len(self.clips_path)
+        else:
+            image_tokens = estimate_image_tokens(LONG_EDGE, LONG_EDGE, media_resolution()) * len(self.clips_path)
+        # Gemini counts 32 tokens per second of audio; candidates are 192 kbps MP3s
+        audio_seconds = sum(os.path.getsize(path) for path in audio_paths if os.path.exists(path)) / 24_000
+        return len(prompt) // 4 + image_tokens + int(audio_seconds * 32)
+
+    def _add_images(self, contents: list, label: str, model: str):
+        """Append the images to a stage's contents, or point at them when they're cached"""
+        if self._uses_cache(model):
+            contents.append("The images on which the edit is to be performed are the cached clips above, in order.")
+            return
+        contents.append(label)
+        for i, file_obj in enumerate(self.uploaded_files):
+            contents.append(f"\n--- IMAGE {i+1} ---")
+            contents.append(file_obj)
+
+    def _memo_key(self, stage: str, model: str, thinking_budget: int, **inputs) -> str:
+        return memo_cache.memo_key(
+            stage=stage,
+            model=model,
+            thinking_budget=thinking_budget,
+            templates=PROMPT_TEMPLATE_VERSION,
+            images=self.image_hashes,
+            long_edge=LONG_EDGE,
+            media_resolution=media_resolution(),
+            **inputs,
+        )
+
+    async def _memo_lookup(self, key: str, output_name: str, stage: str):
+        """Stored output of an identical earlier stage when reuse is on, else None"""
+        if not self.reuse:
+            return None
+        # sqlite (and its lock) stay off the event loop
+        plan_data = await asyncio.to_thread(memo_cache.get, key)
+        if plan_data is None:
+            return None
+        plan_data["_usage"] = {
+            "prompt_tokens": 0,
+            "candidates_tokens": 0,
+            "thinking_tokens": 0,
+            "cached_tokens": 0,
+            "total_tokens": 0,
+            "memo_hit": True,
+        }
+        self.budget.charge(stage, plan_data["_usage"])
+        with open(os.path.join(self.output_dir, output_name), "w") as f:
+            json.dump(plan_data, f, indent=4)
+        print(f"Reusing memoized {output_name}")
+        return plan_data
+
+    @staticmethod
+    def _usage(um) -> dict:
+        if not um:
+            return None
+        return {
+            "prompt_tokens": um.prompt_token_count or 0,
+            "candidates_tokens": um.candidates_token_count or 0,
+            "thinking_tokens": um.thoughts_token_count or 0,
+            "cached_tokens": um.cached_content_token_count or 0,
+            "total_tokens": um.total_token_count or 0,
+        }
+
+    async def _request(self, contents: list, schema: dict, model: str, thinking_budget: int, on_event=None):
+        """One schema-constrained Gemini call, returns (text, usage)"""
+        from google.genai import types
+
+        output_config = {"response_mime_type": "application/json", "response_json_schema": schema}
+        if thinking_budget is not None:
+            output_config["thinking_config"] = types.ThinkingConfig(thinking_budget=thinking_budget)
+        if self._uses_cache(model):
+            config = types.GenerateContentConfig(cached_content=self.cache.name, **output_config)
+        else:
+            # Cached images were tokenized when the cache was created; inline ones use the prep resolution
+            resolution = (self.prep_report or {}).get("media_resolution", "high")
+            config = types.GenerateContentConfig(media_resolution=f"MEDIA_RESOLUTION_{resolution.upper()}", **output_config)
+        async with gemini_slots:
+            started = time.perf_counter()
+            first_token_ms = None
+            if on_event is None:
+                response = await self.client.aio.models.generate_content(model=model, contents=contents, config=config)
+                text, usage_data = response.text or "", self._usage(response.usage_metadata)
+                first_token_ms = int((time.perf_counter() - started) * 1000)
+            else:
+                parser = JsonStreamParser()
+                parts, usage_data = [], None
+                stream = await self.client.aio.models.generate_content_stream(model=model, contents=contents, config=config)
+                async for chunk in stream:
+                    if chunk.usage_metadata:
+                        usage_data = self._usage(chunk.usage_metadata)
+                    if not chunk.text:
+                        continue
+                    if first_token_ms is None:
+                        first_token_ms = int((time.perf_counter() - started) * 1000)
+                    parts.append(chunk.text)
+                    for event in parser.feed(chunk.text):
+                        try:
+                            on_event(event)
+                        except Exception as e:
+                            print(f"Stream event handler failed: {e}")
+                text = "".join(parts)
+        if usage_data is not None:
+            usage_data["model"] = model
+            usage_data["thinking_budget"] = thinking_budget
+            # Without streaming the whole response has to arrive before the first token is seen
+            usage_data["ttft_ms"] = first_token_ms
+            usage_data["latency_ms"] = int((time.perf_counter() - started) * 1000)
+        return text, usage_data
+
+    @staticmethod
+    def _conform(data, schema: dict):
+        """
+        Check a (possibly repaired) answer against its schema's required fields. Array
+        elements missing required fields (a truncated last step) are dropped; a missing
+        top-level field, or a plan step missing one of its tool's PLAN_TOOL_ARGS, makes
+        the answer unusable (None).
+        """
+        if not isinstance(data, dict):
+            return None
+        for field in schema.get("required", []):
+            if field not in data:
+                return None
+        for field, spec in schema.get("properties", {}).items():
+            item_required = spec.get("items", {}).get("required", [])
+            if spec.get("type") == "array" and isinstance(data.get(field), list) and item_required:
+                data[field] = [
+                    item for item in data[field]
+                    if isinstance(item, dict) and all(key in item for key in item_required)
+                ]
+        if schema is VISUAL_PLAN_SCHEMA:
+            for step in data["plan"]:
+                args = step["args"] if isinstance(step["args"], dict) else {}
+                missing = [key for key in PLAN_TOOL_ARGS.get(step["tool"], []) if key not in args]
+                if missing:
+                    print(f"Plan step {step['tool']} is missing {missing}")
+                    return None
+        return data
+
+    @staticmethod
+    def _add_usage(total: dict, usage: dict) -> dict:
+        if usage is None:
+            return total
+        if total is None:
+            return dict(usage)
+        for key in ("prompt_tokens", "candidates_tokens", "thinking_tokens", "cached_tokens", "total_tokens", "latency_ms"):
+            total[key] = (total.get(key) or 0) + (usage.get(key) or 0)
+        total["ttft_ms"] = usage.get("ttft_ms")
+        total["model"] = usage.get("model")
+        return total
+
+    async def _generate(self, contents: list, output_name: str, schema: dict, stage: str, model: str,
+                        thinking_budget: int, on_event=None, memo_key: str = None):
+        """
+        Run one Director stage and parse its JSON answer (saved to output_dir/output_name).
+        With on_event the response is streamed and on_event(event) is called (on the event
+        loop) for every field / array element as soon as it is complete (see json_stream.py),
+        and with {"kind": "reset", "attempt": n} before a re-run streams its answer.
+
+        Output is constrained to `schema`; answers that still don't parse are repaired
+        locally (repair_json) and only this stage is re-run, up to STAGE_ATTEMPTS times,
+        when nothing usable can be recovered. A repaired plan that lost its trailing steps
+        is accepted without a retry (see tests/test_json_stream.py). Returns None after the
+        last attempt.
+        """
+        usage_data = None
+        # Priced per attempt: each one has its own prompt-size tier
+        costs = {"input": 0.0, "output": 0.0, "input_uncached": 0.0}
+        for attempt in range(1, STAGE_ATTEMPTS + 1):
+            if attempt > 1:
+                # Earlier attempts are already charged; the re-run must still fit the ceiling
+                self.budget.check(stage)
+            if on_event is not None and attempt > 1:
+                # Whatever the failed attempt streamed is void; listeners drop it before the re-run streams
+                on_event({"kind": "reset", "attempt": attempt})
+            try:
+                text, usage = await self._request(contents, schema, model, thinking_budget, on_event)
+            except Exception as e:
+                print(f"Director request failed for {output_name} (attempt {attempt}/{STAGE_ATTEMPTS}): {e}")
+                continue
+            usage_data = self._add_usage(usage_data, usage)
+            # Every attempt is paid for, usable or not
+            self.budget.charge(stage, usage)
+            for key, cost in call_costs(usage).items():
+                costs[key] += cost
+
+            plan_data, repaired = repair_json(text)
+            plan_data = self._conform(plan_data, schema)
+            if plan_data is None:
+                print(f"Error parsing Director plan for {output_name} (attempt {attempt}/{STAGE_ATTEMPTS}): {text[:200]!r}")
+                continue
+
+            if repaired:
+                print(f"Repaired malformed Director output for {output_name}")
+            elif memo_key:
+                # Only clean answers are memoized
+                await asyncio.to_thread(memo_cache.put, memo_key, output_name, plan_data)
+            if usage_data is not None:
+                usage_data.update({"memo_hit": False, "attempts": attempt, "repaired": repaired})
+                usage_data["costs"] = {key: round(cost, 6) for key, cost in costs.items()}
+                usage_data["cost_usd"] = round(costs["input"] + costs["output"], 6)
+            print(f"Usage: {usage_data}")
+            plan_data["_usage"] = usage_data
+            with open(os.path.join(self.output_dir, output_name), "w") as f:
+                json.dump(plan_data, f, indent=4)
+            return plan_data
+        return None
+
     @staticmethod
     def send_audio_to_phone(local_file_path, destination_folder="/sdcard/Music/"):
         """
@@ -328,10 +788,22 @@ class VideoDirector:
             return False
     
     @staticmethod
-    def download_audio(idx: int, track_name: str, track_artist: str, output_dir: str = "downloads") -> str:
+    def download_audio(idx: int, track_name: str, track_artist: str, output_dir: str = "downloads",
+                       deadline: float = None) -> str:
+        """
+        Download the first search hit for a track as audio_{idx}.mp3. With a deadline
+        (time.monotonic() value) the download is aborted once it passes, so a slow track
+        frees its thread instead of running on after its caller gave up.
+        """
+        import yt_dlp
+
         if not os.path.exists(output_dir):
             os.makedirs(output_dir)
 
+        def check_deadline(_status):
+            if deadline is not None and time.monotonic() > deadline:
+                raise yt_dlp.utils.DownloadCancelled(f"deadline passed for '{track_name}'")
+
         query = f"{track_name} by {track_artist} audio"
         print(f"🎧 Searching and downloading: '{query}'...")
 
@@ -348,8 +820,10 @@ class VideoDirector:
             'http_headers': {
                 'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
             },
-            'socket_timeout': 30,
+            'socket_timeout': 30 if deadline is None else max(1, min(30, deadline - time.monotonic())),
             'retries': 3,
+            'progress_hooks': [check_deadline],
+            'postprocessor_hooks': [check_deadline],
             'postprocessors': [{
                 'key': 'FFmpegExtractAudio',
                 'preferredcodec': 'mp3',
@@ -398,7 +872,9 @@ class VideoDirector:
         
         return total_duration
         
-    def generate_initial_plan(self, user_prompt: str):
+    async def generate_initial_plan(self, user_prompt: str, on_event=None):
+        await self._hash_images()
+
         num_clips = len(self.clips_path)
         system_instruction = DIRECTOR_SYSTEM_PROMPT.format(num_clips=num_clips)
         
@@ -408,47 +884,26 @@ class VideoDirector:
         USER REQUEST: "{user_prompt}"
         """
 
-        contents = [full_prompt]
-        contents.append("Here is the visual context for the video clips, in order:")
-
-        for i, file_obj in enumerate(self.uploaded_files):
-            contents.append(f"\n--- IMAGE {i+1} ---")
-            contents.append(file_obj)
-        
-        print(f"🎨 Director thinking about: '{user_prompt}'...")
-        response = self.client.models.generate_content(model=self.model, 
-                                                       contents=contents
-                                                       )
+        model, thinking_budget = self.budget.select("visual_plan", self._estimate_input_tokens(full_prompt))
+        memo_key = self._memo_key("visual_plan", model, thinking_budget, user_prompt=user_prompt)
+        memoized = await self._memo_lookup(memo_key, "plan.json", "visual_plan")
+        if memoized is not None:
+            return memoized
+        await self._ensure_context(model)
 
-        # Extract usage metadata
-        usage_data = None
-        if response.usage_metadata:
-            um = response.usage_metadata
-            usage_data = {
-                "prompt_tokens": um.prompt_token_count or 0,
-                "candidates_tokens": um.candidates_token_count or 0,
-                "thinking_tokens": um.thoughts_token_count or 0,
-                "cached_tokens": um.cached_content_token_count or 0,
-                "total_tokens": um.total_token_count or 0,
-            }
-        print(f"Usage: {usage_data}")
+        contents = [full_prompt]
+        self._add_images(contents, "Here is the visual context for the video clips, in order:", model)
         
-        try:
-            clean_text = response.text.replace("```json", "").replace("```", "").strip()
-            plan_data = json.loads(clean_text)
-            plan_data["_usage"] = usage_data
-            with open("plan.json", "w") as f:
-                json.dump(plan_data, f, indent=4)
-            return plan_data
-        except Exception as e:
-            print(f"Error parsing Director plan: {e}")
-            return None
+        print(f"🎨 Director thinking about: '{user_prompt}' ({model})...")
+        return await self._generate(contents, "plan.json", VISUAL_PLAN_SCHEMA, "visual_plan", model, thinking_budget, on_event, memo_key)
     
-    def generate_music_content(self, user_prompt: str, initial_plan: dict[str]):
+    async def generate_music_content(self, user_prompt: str, initial_plan: dict[str], on_event=None):
+        await self._hash_images()
+
         music_instruction = DIRECTOR_MUSIC_PROMPT.format(
             plan=json.dumps(initial_plan["plan"]), 
             music_thoughts=initial_plan["music_thoughts"],
-            total_duration=VideoDirector.calculate_total_duration(initial_plan, len(self.uploaded_files)))
+            total_duration=VideoDirector.calculate_total_duration(initial_plan, len(self.clips_path)))
         
         full_prompt = f"""
         {music_instruction}
@@ -456,121 +911,181 @@ class VideoDirector:
         USER REQUEST: "{user_prompt}
         """
 
-        contents = [full_prompt]
-        contents.append("Here is the visual context for the video clips, in order:")
-
-        for i, file_obj in enumerate(self.uploaded_files):
-            contents.append(f"\n--- IMAGE {i+1} ---")
-            contents.append(file_obj)
-        
-        print(f"🎥 Director thinking about music plan: '{user_prompt}'...")
-        response = self.client.models.generate_content(model=self.model, 
-                                                       contents=contents
-                                                       )
+        model, thinking_budget = self.budget.select("music_plan", self._estimate_input_tokens(full_prompt))
+        memo_key = self._memo_key(
+            "music_plan",
+            model,
+            thinking_budget,
+            user_prompt=user_prompt,
+            plan=initial_plan["plan"],
+            music_thoughts=initial_plan["music_thoughts"],
+        )
+        memoized = await self._memo_lookup(memo_key, "plan_music.json", "music_plan")
+        if memoized is not None:
+            return memoized
+        await self._ensure_context(model)
 
-        # Extract usage metadata
-        usage_data = None
-        if response.usage_metadata:
-            um = response.usage_metadata
-            usage_data = {
-                "prompt_tokens": um.prompt_token_count or 0,
-                "candidates_tokens": um.candidates_token_count or 0,
-                "thinking_tokens": um.thoughts_token_count or 0,
-                "cached_tokens": um.cached_content_token_count or 0,
-                "total_tokens": um.total_token_count or 0,
-            }
-        print(f"Usage: {usage_data}")
+        contents = [full_prompt]
+        self._add_images(contents, "Here is the visual context for the video clips, in order:", model)
         
-        try:
-            clean_text = response.text.replace("```json", "").replace("```", "").strip()
-            plan_data = json.loads(clean_text)
-            plan_data["_usage"] = usage_data
-            with open("plan_music.json", "w") as f:
-                json.dump(plan_data, f, indent=4)
-            return plan_data
-        except Exception as e:
-            print(f"Error parsing Director plan: {e}")
-            return None
+        print(f"🎥 Director thinking about music plan: '{user_prompt}' ({model})...")
+        return await self._generate(contents, "plan_music.json", MUSIC_PLAN_SCHEMA, "music_plan", model, thinking_budget, on_event, memo_key)
     
-    def decide_music_infusion(self, visual_plan: dict, audio_paths: list[str], music_thoughts: str):
+    async def _analyze_tracks(self, audio_paths: list[str], cuts: list[float], total_duration: float) -> dict:
+        """Summary per filename of every track that could be analysed (empty when none could)"""
+        try:
+            import audio_analysis
+        except ImportError as e:
+            print(f"[MUSIC] Local analysis unavailable ({e})")
+            return {}
+
+        def analyze(path):
+            try:
+                analysis = audio_analysis.analyze_track(path)
+                offsets = audio_analysis.score_offsets(analysis, cuts, total_duration)
+                return audio_analysis.track_summary(analysis, offsets)
+            except Exception as e:
+                print(f"[MUSIC] Could not analyse {path}: {e}")
+                return None
+
+        started = time.perf_counter()
+        summaries = await asyncio.gather(*(asyncio.to_thread(analyze, path) for path in audio_paths))
+        tracks = {os.path.basename(path): summary for path, summary in zip(audio_paths, summaries) if summary}
+        self.music_analysis = {
+            "mode": self.music_mode,
+            "cut_points": cuts,
+            "analysis_ms": int((time.perf_counter() - started) * 1000),
+            "tracks": tracks,
+        }
+        print(f"[MUSIC] Analysed {len(tracks)}/{len(audio_paths)} tracks in {self.music_analysis['analysis_ms']} ms")
+        return tracks
+
+    def _choose_offline(self, tracks: dict, total_duration: float) -> dict:
+        """Fast mode: the best scored offset over all tracks, without asking Gemini"""
+        filename, summary = max(tracks.items(), key=lambda item: item[1]["best_offsets"][0]["score"])
+        best = summary["best_offsets"][0]
+        plan_data = {
+            "thought_process": (
+                f"Chosen locally: {filename} ({summary['bpm']} BPM) from {best['start_s']}s scored highest "
+                f"(sync {best['sync']}, energy {best['energy']}, drop {best['drop']})."
+            ),
+            "selected_track_filename": filename,
+            "start_time_seconds": best["start_s"],
+            "end_time_seconds": round(best["start_s"] + total_duration, 2),
+        }
+        plan_data["_usage"] = {
+            "prompt_tokens": 0,
+            "candidates_tokens": 0,
+            "thinking_tokens": 0,
+            "cached_tokens": 0,
+            "total_tokens": 0,
+            "latency_ms": self.music_analysis["analysis_ms"],
+            "memo_hit": False,
+            "offline": True,
+        }
+        self.budget.charge("full_plan", plan_data["_usage"])
+        with open(os.path.join(self.output_dir, "final_plan.json"), "w") as f:
+            json.dump(plan_data, f, indent=4)
+        print(f"🎧 Picked {filename} from {best['start_s']}s locally (fast mode)")
+        return plan_data
+
+    async def decide_music_infusion(self, visual_plan: dict, audio_paths: list[str], music_thoughts: str, on_event=None):
+        await self._hash_images()
+        audio_hashes = await asyncio.to_thread(lambda: [file_hash(path) for path in audio_paths])
+
         total_duration = self.calculate_total_duration(visual_plan, len(self.clips_path))
-        
-        prompt = DIRECTOR_INFUSE_MUSIC_PROMPT.format(
-            total_duration=total_duration,
-            visual_plan=json.dumps(visual_plan["plan"], indent=2),
-            music_thoughts=music_thoughts
-        )
 
-        audio_files = []
-        for i, path in enumerate(audio_paths):
-            audio_files.append(self.client.files.upload(file=path, config={
-                "display_name": f"audio_{i+1}"
-            }))
+        tracks = {}
+        if self.music_mode in ("summary", "fast"):
+            from audio_analysis import cut_points
+
+            cuts = cut_points(visual_plan, len(self.clips_path))
+            tracks = await self._analyze_tracks(audio_paths, cuts, total_duration)
+            if not tracks:
+                print("[MUSIC] No track could be analysed, uploading the audio instead")
+            elif self.music_mode == "fast":
+                return self._choose_offline(tracks, total_duration)
+
+        if tracks:
+            prompt = DIRECTOR_INFUSE_MUSIC_SUMMARY_PROMPT.format(
+                total_duration=total_duration,
+                cut_points=json.dumps(self.music_analysis["cut_points"]),
+                visual_plan=json.dumps(visual_plan["plan"], indent=2),
+                music_thoughts=music_thoughts,
+                track_analysis=json.dumps(tracks, indent=1)
+            )
+            listened_paths = []
+        else:
+            prompt = DIRECTOR_INFUSE_MUSIC_PROMPT.format(
+                total_duration=total_duration,
+                visual_plan=json.dumps(visual_plan["plan"], indent=2),
+                music_thoughts=music_thoughts
+            )
+            listened_paths = audio_paths
+
+        model, thinking_budget = self.budget.select("full_plan", self._estimate_input_tokens(prompt, listened_paths))
+        memo_key = self._memo_key(
+            "full_plan",
+            model,
+            thinking_budget,
+            plan=visual_plan["plan"],
+            music_thoughts=music_thoughts,
+            audio=audio_hashes,
+            audio_names=[os.path.basename(path) for path in audio_paths],
+            music_input="summary" if tracks else "audio",
+        )
+        memoized = await self._memo_lookup(memo_key, "final_plan.json", "full_plan")
+        if memoized is not None:
+            return memoized
+        await self._ensure_context(model)
 
         contents = [prompt]
-        contents.append(f"Here are the {len(audio_paths)} candidate tracks in order:")
+        if listened_paths:
+            audio_files = await upload_files(
+                self.client,
+                listened_paths,
+                [f"audio_{i+1}" for i in range(len(listened_paths))],
+                gemini_slots
+            )
+            contents.append(f"Here are the {len(listened_paths)} candidate tracks in order:")
 
-        for i, audio_obj in enumerate(audio_files):
-            contents.append(f"\n ---- AUDIO {i+1} ---")
-            contents.append(audio_obj)
+            for i, audio_obj in enumerate(audio_files):
+                contents.append(f"\n ---- AUDIO {i+1} ---")
+                contents.append(audio_obj)
         
-        contents.append(f"Here are also raw images on which the edit is to be perfomed:")
-
-        for i, file_obj in enumerate(self.uploaded_files):
-            contents.append(f"\n--- IMAGE {i+1} ---")
-            contents.append(file_obj)
+        self._add_images(contents, "Here are also raw images on which the edit is to be perfomed:", model)
 
 
         # 4. Generate Decision
-        print(f"\n🎧 Director listening to tracks to find the perfect {total_duration}s cut...")
-        response = self.client.models.generate_content(
-            model=self.model,
-            contents=contents,
-        )
-
-        # Extract usage metadata
-        usage_data = None
-        if response.usage_metadata:
-            um = response.usage_metadata
-            usage_data = {
-                "prompt_tokens": um.prompt_token_count or 0,
-                "candidates_tokens": um.candidates_token_count or 0,
-                "thinking_tokens": um.thoughts_token_count or 0,
-                "cached_tokens": um.cached_content_token_count or 0,
-                "total_tokens": um.total_token_count or 0,
-            }
-        print(f"Usage: {usage_data}")
-        
-        try:
-            clean_text = response.text.replace("```json", "").replace("```", "").strip()
-            plan_data = json.loads(clean_text)
-            plan_data["_usage"] = usage_data
-            with open("final_plan.json", "w") as f:
-                json.dump(plan_data, f, indent=4)
-            return plan_data
-        except Exception as e:
-            print(f"Error parsing Director plan: {e}")
-            return None
+        if listened_paths:
+            print(f"\n🎧 Director listening to tracks to find the perfect {total_duration}s cut ({model})...")
+        else:
+            print(f"\n🎧 Director reading the analysis of {len(tracks)} tracks to find the perfect {total_duration}s cut ({model})...")
+        return await self._generate(contents, "final_plan.json", MUSIC_INFUSION_SCHEMA, "full_plan", model, thinking_budget, on_event, memo_key)
 
     
-    def generate_plan(self, user_prompt: str):
-        initial_plan = self.generate_initial_plan(user_prompt)
+    async def generate_plan(self, user_prompt: str):
+        initial_plan = await self.generate_initial_plan(user_prompt)
         print(initial_plan)
-        music_plan = self.generate_music_content(user_prompt, initial_plan)
+        music_plan = await self.generate_music_content(user_prompt, initial_plan)
         print(music_plan)
 
-        if os.path.exists("downloads"):
-            shutil.rmtree("downloads")
-        os.makedirs("downloads")
+        downloads_dir = os.path.join(self.output_dir, "downloads")
+        if os.path.exists(downloads_dir):
+            shutil.rmtree(downloads_dir)
+        os.makedirs(downloads_dir)
 
-        for i, tracks in enumerate(music_plan["tracks"]):
-            VideoDirector.download_audio(i+1, tracks["track_name"], tracks["artist_name"])
+        await asyncio.gather(*(
+            asyncio.to_thread(VideoDirector.download_audio, i+1, tracks["track_name"], tracks["artist_name"], downloads_dir)
+            for i, tracks in enumerate(music_plan["tracks"])
+        ))
         
-        files = os.listdir("downloads")
-        paths = [os.path.join("downloads", file) for file in files]
+        files = os.listdir(downloads_dir)
+        paths = [os.path.join(downloads_dir, file) for file in files]
         print(paths)
-        final_plan = self.decide_music_infusion(initial_plan, paths, initial_plan["music_thoughts"])
+        final_plan = await self.decide_music_infusion(initial_plan, paths, initial_plan["music_thoughts"])
         print(final_plan)
+        await self.close()
 
         return final_plan
 
@@ -579,4 +1094,4 @@ if __name__ == "__main__":
     files = os.listdir("images")
     paths = [os.path.join("images", file) for file in files]
     director = VideoDirector(paths)
-    print(director.generate_plan("Make a intresting catchy and cool edit from these images"))
+    print(asyncio.run(director.generate_plan("Make a intresting catchy and cool edit from these images")))
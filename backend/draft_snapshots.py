@@ -0,0 +1,295 @@
+"""
+Draft Snapshots - reusable InShot checkpoints keyed by image set
+After selection + calibration the project is saved as a named InShot draft
+("droidrun_<key>") together with the calibration profile. A later execution on
+the same photos reopens a copy of that draft and skips upload, import and calibration.
+
+Checkpoints live in executions/drafts/<key>.json so the server (which decides
+whether to upload) and the agent workers see the same store. The plan last applied
+to the newest working copy is kept in executions/drafts/<key>.applied.json so an
+edited plan can be re-run incrementally (see plan_diff.py).
+
+NOTE: the drafts-list resource ids below were taken from a single InShot build;
+every step returns False instead of raising so callers can fall back to a fresh import.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
+import os
+import time
+from typing import TYPE_CHECKING, Optional
+
+from agent_worker import EXECUTIONS_DIR
+from inshot_tools import InshotTools
+from redis_state import global_state
+from step_timings import device_id
+from timeline_model import timeline
+
+if TYPE_CHECKING:
+    from droidrun import Tools
+
+DRAFTS_DIR = os.path.join(EXECUTIONS_DIR, "drafts")
+DRAFT_PREFIX = "droidrun_"
+
+# The "..." button on each entry of the drafts list, and the rename input
+DRAFT_MORE_ID = "com.camerasideas.instashot:id/btn_more"
+RENAME_INPUT_ID = "com.camerasideas.instashot:id/edit_text"
+TIMELINE_ID = "com.camerasideas.instashot:id/current_position"
+
+
+def image_set_key(image_paths, serial: Optional[str] = None) -> str:
+    """
+    Content hash of the images in order, on one device (same photos, same order, same
+    device -> same draft; a draft only exists on the device it was saved on)
+    """
+    digest = hashlib.sha256()
+    digest.update((serial or device_id()).encode() + b"\0")
+    for path in image_paths:
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                digest.update(chunk)
+        digest.update(b"\0")
+    return digest.hexdigest()[:16]
+
+
+def draft_name(key: str) -> str:
+    return f"{DRAFT_PREFIX}{key}"
+
+
+def _checkpoint_path(key: str) -> str:
+    return os.path.join(DRAFTS_DIR, f"{key}.json")
+
+
+def get_checkpoint(key: str) -> Optional[dict]:
+    """Saved checkpoint for an image set, or None"""
+    try:
+        with open(_checkpoint_path(key), "r") as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return None
+
+
+def drop_checkpoint(key: str):
+    """Forget a checkpoint (e.g. the draft was deleted on the device)"""
+    try:
+        os.remove(_checkpoint_path(key))
+    except OSError:
+        pass
+
+
+def _applied_path(key: str) -> str:
+    return os.path.join(DRAFTS_DIR, f"{key}.applied.json")
+
+
+def get_applied_plan(key: str) -> Optional[dict]:
+    """Plan (and resulting calibration state) last applied to this image set's working copy"""
+    try:
+        with open(_applied_path(key), "r") as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return None
+
+
+def save_applied_plan(key: str, plan: list):
+    """Record a successfully applied plan together with the current timeline state"""
+    os.makedirs(DRAFTS_DIR, exist_ok=True)
+    state = timeline().to_state()
+    with open(_applied_path(key), "w") as f:
+        json.dump({"plan": plan, "state": state, "applied_at": time.time()}, f, indent=4)
+
+
+def clear_applied_plan(key: str):
+    """Forget the applied plan (called before an edit starts, so a failed run never resumes)"""
+    try:
+        os.remove(_applied_path(key))
+    except OSError:
+        pass
+
+
+def _center(el):
+    bounds = [int(x) for x in el.get("bounds", "0,0,0,0").split(',')]
+    return (bounds[0] + bounds[2]) / 2, (bounds[1] + bounds[3]) / 2
+
+
+async def _open_draft_menu(tools: Tools, name: Optional[str] = None):
+    """
+    Tap the "..." button of a draft: the one closest to the entry labelled `name`,
+    or the newest (top-left) draft when no name is given.
+    """
+    ui_state = (await tools.get_state())[2]
+    more_buttons = [el for el in ui_state if el.get("resourceId") == DRAFT_MORE_ID]
+    if not more_buttons:
+        print("[DRAFT] Drafts list not found")
+        return False
+
+    if name is None:
+        target = min(more_buttons, key=lambda el: (_center(el)[1], _center(el)[0]))
+    else:
+        label = InshotTools._find_by_text(ui_state, [name])
+        if not label:
+            print(f"[DRAFT] Draft '{name}' not found")
+            return False
+        lx, ly = _center(label)
+        target = min(more_buttons, key=lambda el: abs(_center(el)[0] - lx) + abs(_center(el)[1] - ly))
+
+    await InshotTools._adb_tap(*_center(target))
+    await asyncio.sleep(0.5)
+    return True
+
+
+async def _wait_for_timeline(tools: Tools, attempts=10):
+    for _ in range(attempts):
+        if await InshotTools._find_node_by_id(tools, TIMELINE_ID) != -1:
+            return True
+        await asyncio.sleep(1.0)
+    return False
+
+
+async def open_working_copy(tools: Tools, name: str):
+    """
+    Duplicate the checkpoint draft and open the duplicate, so edits never touch
+    the checkpoint itself. Expects the drafts list to be on screen.
+    """
+    if not await _open_draft_menu(tools, name):
+        return False
+    if not await InshotTools._tap_text(tools, ["Copy", "Duplicate"]):
+        print("[DRAFT] 'Copy' not found in draft menu")
+        return False
+    await asyncio.sleep(1.0)
+
+    # The copy is the newest draft, i.e. the first entry carrying the checkpoint name
+    return await _open_newest(tools, name)
+
+
+async def _open_newest(tools: Tools, name: str):
+    """Open the most recently modified draft whose name contains `name`"""
+    ui_state = (await tools.get_state())[2]
+    drafts = [el for el in ui_state if name in el.get("text", "") and el.get("resourceId") != RENAME_INPUT_ID]
+    if not drafts:
+        print("[DRAFT] Working copy not found in drafts list")
+        return False
+    await InshotTools._adb_tap(*_center(min(drafts, key=lambda el: (_center(el)[1], _center(el)[0]))))
+
+    if not await _wait_for_timeline(tools):
+        print("[DRAFT] Editor did not open for the working copy")
+        return False
+    return True
+
+
+async def _open_newest_any(tools: Tools):
+    """Open the newest draft whatever its name (tap the label next to its "..." button)"""
+    ui_state = (await tools.get_state())[2]
+    more_buttons = [el for el in ui_state if el.get("resourceId") == DRAFT_MORE_ID]
+    labels = [el for el in ui_state if el.get("text", "").strip() and el.get("resourceId") != DRAFT_MORE_ID]
+    if not more_buttons or not labels:
+        return False
+    mx, my = _center(min(more_buttons, key=lambda el: (_center(el)[1], _center(el)[0])))
+    label = min(labels, key=lambda el: abs(_center(el)[0] - mx) + abs(_center(el)[1] - my))
+    await InshotTools._adb_tap(*_center(label))
+    return await _wait_for_timeline(tools)
+
+
+async def ensure_editor(tools: Tools, key: str):
+    """
+    Make sure the project editor is open after a failed save_checkpoint(). The checkpoint
+    left the editor, so the project is reopened from the drafts list: the draft named
+    after the key if the rename went through, else the newest draft. The checkpoint is
+    dropped, since the draft being edited may be the checkpoint itself. Returns False when
+    the editor can't be reached.
+    """
+    if await InshotTools._find_node_by_id(tools, TIMELINE_ID) != -1:
+        return True
+    drop_checkpoint(key)
+
+    # Dismiss a leftover draft menu / rename dialog, without backing out of the drafts list
+    for _ in range(2):
+        ui_state = (await tools.get_state())[2]
+        if any(el.get("resourceId") == RENAME_INPUT_ID for el in ui_state) or \
+                not any(el.get("resourceId") == DRAFT_MORE_ID for el in ui_state):
+            await tools.back()
+            await asyncio.sleep(0.5)
+
+    ui_state = (await tools.get_state())[2]
+    if any(draft_name(key) in el.get("text", "") for el in ui_state):
+        reopened = await _open_newest(tools, draft_name(key))
+    else:
+        reopened = await _open_newest_any(tools)
+    print(f"[DRAFT] {'Reopened the project after a failed checkpoint' if reopened else 'Could not reopen the project'}")
+    return reopened
+
+
+async def save_checkpoint(tools: Tools, key: str):
+    """
+    Save the freshly calibrated project as draft "droidrun_<key>", then continue
+    editing in a copy of it. Call right after calibrate(); returns True on success.
+    On False the editor may be closed: call ensure_editor() before editing further.
+    """
+    if not timeline().is_calibrated():
+        print("[DRAFT] Not calibrated, skipping checkpoint")
+        return False
+
+    name = draft_name(key)
+
+    # Leaving the editor saves the project as the newest draft
+    await tools.back()
+    await asyncio.sleep(1.5)
+
+    if not await _open_draft_menu(tools):
+        return False
+    if not await InshotTools._tap_text(tools, ["Rename"]):
+        print("[DRAFT] 'Rename' not found in draft menu")
+        return False
+
+    input_idx = await InshotTools._find_node_by_id(tools, RENAME_INPUT_ID)
+    if input_idx == -1:
+        print("[DRAFT] Rename input not found")
+        return False
+    await tools.input_text(name, input_idx)
+    if not await InshotTools._tap_text(tools, ["OK", "Done", "Save"]):
+        print("[DRAFT] Rename confirm button not found")
+        return False
+    await asyncio.sleep(0.5)
+
+    os.makedirs(DRAFTS_DIR, exist_ok=True)
+    with open(_checkpoint_path(key), "w") as f:
+        json.dump({"draft_name": name, "state": timeline().to_state(), "created_at": time.time()}, f, indent=4)
+    print(f"[DRAFT] Checkpoint saved as '{name}'")
+
+    if not await open_working_copy(tools, name):
+        return False
+    global_state.set("draft_restored", key)
+    return True
+
+
+async def restore_checkpoint(tools: Tools, key: str, resume: bool = False):
+    """
+    Open a working copy of the checkpoint draft and load its calibration profile.
+    With resume=True the last edited working copy is reopened as-is instead, with
+    the timeline state recorded when its plan was applied.
+    Expects InShot on its home screen; returns True when the editor is ready.
+    """
+    checkpoint = get_checkpoint(key)
+    applied = get_applied_plan(key) if resume else None
+    if not checkpoint or (resume and not applied):
+        return False
+
+    if not await InshotTools._tap_text(tools, ["Video"], attempts=10):
+        print("[DRAFT] 'Video' entry not found on InShot home screen")
+        return False
+    await asyncio.sleep(1.0)
+
+    if resume:
+        opened = await _open_newest(tools, checkpoint["draft_name"])
+    else:
+        opened = await open_working_copy(tools, checkpoint["draft_name"])
+    if not opened:
+        return False
+
+    timeline().restore(applied["state"] if resume else checkpoint["state"])
+    timeline().save()
+    global_state.set("draft_restored", key)
+    print(f"[DRAFT] {'Resumed' if resume else 'Restored'} '{checkpoint['draft_name']}', calibration reused")
+    return True
@@ -0,0 +1,149 @@
+"""
+Gesture Timing - per-device swipe speeds learned from observed overshoot
+The InShot timeline and carousels fling when swiped too fast, so every swipe used to
+run at a speed hand-tuned on one phone. Here each gesture type has a speed (px/ms) per
+device that is tightened while swipes land where they were aimed and backed off when
+one overshoots (fling). Undershoots (end of a list) are ignored.
+
+Profiles are stored in executions/gesture_timing.json:
+    {device: {gesture: {"speed": px/ms, "unsafe_speed": px/ms | null, "clean": n, "flings": n}}}
+"""
+
+import json
+import os
+
+from agent_worker import EXECUTIONS_DIR
+from step_timings import device_id
+
+PROFILE_PATH = os.path.join(EXECUTIONS_DIR, "gesture_timing.json")
+
+# Starting speeds reproduce the old hard-coded timings
+#   seek:     timeline scrub, 2 px/ms clamped to 300-2000 ms
+#   carousel: 700 px effect/transition carousel swipe in 600 ms
+#   list:     500 px vertical list scroll in 600 ms
+#   drag:     effect handle drag, 2000 ms (not observed: handles don't fling)
+DEFAULTS = {
+    "seek": {"speed": 2.0, "min_ms": 300, "max_ms": 2000},
+    "carousel": {"speed": 700 / 600, "min_ms": 200, "max_ms": 1500},
+    "list": {"speed": 500 / 600, "min_ms": 200, "max_ms": 1500},
+    "drag": {"speed": None, "min_ms": 2000, "max_ms": 2000},
+}
+
+# A swipe is clean if it moved the content within this fraction of the distance swiped
+OVERSHOOT_TOLERANCE = 0.15
+TIGHTEN = 1.15
+BACK_OFF = 0.7
+# Never tighten past this fraction of the slowest speed that ever flung
+UNSAFE_MARGIN = 0.9
+# Settle time after a swipe, before and after the gesture has a clean track record
+SETTLE_S = {"default": 1.0, "trusted": 0.4}
+TRUSTED_AFTER = 3
+
+
+class GestureTiming:
+    def __init__(self, device: str, profile: dict = None):
+        self.device = device
+        self.profile = profile or {}
+        self.dirty = False
+
+    def _entry(self, gesture: str) -> dict:
+        if gesture not in self.profile:
+            self.profile[gesture] = {"speed": DEFAULTS[gesture]["speed"], "unsafe_speed": None, "clean": 0, "flings": 0}
+        return self.profile[gesture]
+
+    def duration_ms(self, gesture: str, distance_px: float) -> int:
+        """Shortest duration currently known to move distance_px without a fling"""
+        limits = DEFAULTS[gesture]
+        speed = self._entry(gesture)["speed"]
+        if not speed:
+            return limits["max_ms"]
+        return int(max(limits["min_ms"], min(limits["max_ms"], abs(distance_px) / speed)))
+
+    def settle_s(self, gesture: str) -> float:
+        """How long to wait for the UI after a swipe"""
+        entry = self._entry(gesture)
+        trusted = entry["clean"] >= TRUSTED_AFTER and entry["flings"] == 0
+        return SETTLE_S["trusted" if trusted else "default"]
+
+    def observe(self, gesture: str, expected_px: float, actual_px: float, duration_ms: int):
+        """Feed back how far the content actually moved for a swipe of expected_px"""
+        if not expected_px or DEFAULTS[gesture]["speed"] is None:
+            return
+        entry = self._entry(gesture)
+        ratio = abs(actual_px) / abs(expected_px)
+        used_speed = abs(expected_px) / max(1, duration_ms)
+
+        if ratio > 1 + OVERSHOOT_TOLERANCE:
+            # Fling: remember the speed and slow down
+            entry["flings"] += 1
+            entry["clean"] = 0
+            entry["unsafe_speed"] = min(used_speed, entry["unsafe_speed"] or used_speed)
+            entry["speed"] = used_speed * BACK_OFF
+            print(f"[GESTURE] {gesture}: moved {ratio:.2f}x the swipe at {used_speed:.2f} px/ms, slowing to {entry['speed']:.2f} px/ms")
+        elif ratio >= 1 - OVERSHOOT_TOLERANCE:
+            entry["clean"] += 1
+            # Only tighten from speeds actually proven clean (short swipes are clamped to min_ms)
+            faster = min(entry["speed"], used_speed) * TIGHTEN
+            if entry["unsafe_speed"]:
+                faster = min(faster, entry["unsafe_speed"] * UNSAFE_MARGIN)
+            entry["speed"] = max(entry["speed"], faster)
+        else:
+            # Moved less than swiped: end of the list or a clamped scroll, says nothing about speed
+            return
+        self.dirty = True
+
+    def save(self):
+        if not self.dirty:
+            return
+        profiles = _load_profiles()
+        profiles[self.device] = self.profile
+        os.makedirs(EXECUTIONS_DIR, exist_ok=True)
+        with open(PROFILE_PATH, "w") as f:
+            json.dump(profiles, f, indent=4)
+        self.dirty = False
+
+
+def _load_profiles() -> dict:
+    try:
+        with open(PROFILE_PATH, "r") as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return {}
+
+
+def content_shift(before: list, after: list, axis: int) -> float:
+    """
+    How far the content moved between two UI states along axis (0 = x, 1 = y):
+    median displacement of elements with the same text and resource id in both.
+    Elements that didn't move (toolbars, headers) are ignored; None if nothing moved.
+    """
+    def anchors(ui_state):
+        positions = {}
+        for el in ui_state:
+            key = (el.get("text", ""), el.get("resourceId", ""))
+            if not key[0]:
+                continue
+            bounds = [int(x) for x in el.get("bounds", "0,0,0,0").split(',')]
+            # Ambiguous labels can't anchor a measurement
+            positions[key] = None if key in positions else bounds[axis] + bounds[axis + 2]
+        return positions
+
+    old, new = anchors(before), anchors(after)
+    shifts = sorted(
+        (new[k] - old[k]) / 2 for k in old
+        if k in new and old[k] is not None and new[k] is not None and new[k] != old[k]
+    )
+    if not shifts:
+        return None
+    return shifts[len(shifts) // 2]
+
+
+_current = {"timing": None}
+
+
+def gesture_timing() -> GestureTiming:
+    """Gesture profile of the connected device (loaded once per process)"""
+    if _current["timing"] is None:
+        device = device_id()
+        _current["timing"] = GestureTiming(device, _load_profiles().get(device))
+    return _current["timing"]
@@ -0,0 +1,130 @@
+"""
+Image Prep - downscale and re-encode photos before they are sent to Gemini
+The Director only needs enough detail to judge mood, subject and pacing, so phone
+photos are resized to a long edge of DIRECTOR_IMAGE_LONG_EDGE px, EXIF-rotated,
+stripped of metadata and re-encoded as WebP in a process pool before upload.
+The originals are untouched and are still the ones pushed to the device.
+
+    paths, report = await prepare_images(image_paths, out_dir)
+
+Token estimates follow the Gemini 2.5 image accounting: 258 tokens for images up to
+384 px, otherwise 258 per 768x768 tile; with media_resolution low / medium an image
+costs 64 / 256 tokens. media_resolution only applies to images sent inline: a context
+cache can't take one, so cached images are counted with the default tile accounting.
+"""
+
+import asyncio
+import math
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+LONG_EDGE = int(os.getenv("DIRECTOR_IMAGE_LONG_EDGE", "1024"))
+WEBP_QUALITY = int(os.getenv("DIRECTOR_IMAGE_QUALITY", "80"))
+# low | medium | high, or auto (low up to 512 px, medium above)
+MEDIA_RESOLUTION = os.getenv("DIRECTOR_MEDIA_RESOLUTION", "auto")
+
+RESOLUTION_TOKENS = {"low": 64, "medium": 256}
+
+_pool = {"executor": None}
+
+
+def media_resolution(long_edge: int = LONG_EDGE) -> str:
+    if MEDIA_RESOLUTION in ("low", "medium", "high"):
+        return MEDIA_RESOLUTION
+    return "low" if long_edge <= 512 else "medium"
+
+
+def estimate_image_tokens(width: int, height: int, resolution: str = None) -> int:
+    """Prompt tokens one image costs at the given media resolution (None = model default)"""
+    if resolution in RESOLUTION_TOKENS:
+        return RESOLUTION_TOKENS[resolution]
+    if width <= 384 and height <= 384:
+        return 258
+    return 258 * math.ceil(width / 768) * math.ceil(height / 768)
+
+
+def _prepare_one(src: str, dst: str, long_edge: int, quality: int) -> dict:
+    """Runs in a pool process: resize, drop metadata, re-encode. Never raises."""
+    try:
+        from PIL import Image, ImageOps
+
+        with Image.open(src) as img:
+            original_size = img.size
+            # Apply the EXIF orientation before the EXIF block is dropped
+            img = ImageOps.exif_transpose(img)
+            img = img.convert("RGB")
+            img.thumbnail((long_edge, long_edge), Image.Resampling.LANCZOS)
+            # No exif / icc_profile passed: the output carries no metadata
+            img.save(dst, "WEBP", quality=quality, method=4)
+            prepared_size = img.size
+        return {
+            "path": dst,
+            "bytes_before": os.path.getsize(src),
+            "bytes_after": os.path.getsize(dst),
+            "size_before": list(original_size),
+            "size_after": list(prepared_size),
+        }
+    except Exception as e:
+        return {"path": src, "error": str(e)}
+
+
+def _executor() -> ProcessPoolExecutor:
+    # spawn: the server process runs threads, forking it is not safe
+    if _pool["executor"] is None:
+        _pool["executor"] = ProcessPoolExecutor(
+            max_workers=min(4, os.cpu_count() or 1),
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+    return _pool["executor"]
+
+
+def shutdown_pool():
+    if _pool["executor"] is not None:
+        _pool["executor"].shutdown(wait=False, cancel_futures=True)
+        _pool["executor"] = None
+
+
+async def prepare_images(paths: list[str], out_dir: str, long_edge: int = LONG_EDGE, quality: int = WEBP_QUALITY):
+    """
+    Prepared copies of paths (same order) in out_dir, plus a report of bytes and
+    estimated prompt tokens saved per call. Images that fail to convert are sent as-is.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    started = time.perf_counter()
+    targets = [os.path.join(out_dir, f"{os.path.splitext(os.path.basename(p))[0]}.webp") for p in paths]
+    results = await asyncio.gather(*(
+        asyncio.wrap_future(_executor().submit(_prepare_one, src, dst, long_edge, quality))
+        for src, dst in zip(paths, targets)
+    ))
+
+    resolution = media_resolution(long_edge)
+    prepared = [r for r in results if "error" not in r]
+    for r in results:
+        if "error" in r:
+            print(f"[PREP] Sending {r['path']} unprocessed: {r['error']}")
+
+    bytes_before = sum(r["bytes_before"] for r in prepared)
+    bytes_after = sum(r["bytes_after"] for r in prepared)
+    tokens_before = sum(estimate_image_tokens(*r["size_before"]) for r in prepared)
+    tokens_after = sum(estimate_image_tokens(*r["size_after"], resolution) for r in prepared)
+    tokens_default = sum(estimate_image_tokens(*r["size_after"]) for r in prepared)
+    report = {
+        "images": len(paths),
+        "prepared": len(prepared),
+        "long_edge": long_edge,
+        "media_resolution": resolution,
+        "bytes_before": bytes_before,
+        "bytes_after": bytes_after,
+        "bytes_saved": bytes_before - bytes_after,
+        "est_image_tokens_before": tokens_before,
+        "est_image_tokens_after": tokens_after,
+        "est_image_tokens_saved": tokens_before - tokens_after,
+        # What the prepared images cost in a context cache (default resolution)
+        "est_image_tokens_cached": tokens_default,
+        "prep_ms": int((time.perf_counter() - started) * 1000),
+    }
+    print(f"[PREP] {len(prepared)}/{len(paths)} images prepared: {bytes_before / 1e6:.1f} MB -> {bytes_after / 1e6:.1f} MB, "
+          f"~{tokens_before} -> ~{tokens_after} image tokens per call ({resolution})")
+    return [r["path"] for r in results], report
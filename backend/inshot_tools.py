@@ -1,20 +1,108 @@
-from droidrun import DroidAgent, Tools
-from redis_state import global_state
+from __future__ import annotations
+
+from typing import TYPE_CHECKING
+from timeline_model import TimelineModel, timeline
+from gesture_timing import content_shift, gesture_timing
 import asyncio
 import json
-import subprocess
+import os
+import time
+
+if TYPE_CHECKING:
+    from droidrun import Tools
+
+# Hard limit on one adb command (tap, screencap) before its process is killed
+ADB_TIMEOUT_S = float(os.getenv("ADB_TIMEOUT_S", "10"))
 
 class InshotTools:
 
+    # Gestures sent to the device by this process (taps, swipes and the time spent swiping).
+    # "commits" counts taps that confirm an edit, i.e. entries on InShot's undo stack.
+    _gesture_stats = {"taps": 0, "swipes": 0, "swipe_ms": 0, "commits": 0}
+
+    # Timeline model written by calibrate() and kept up to date by the editing tools
+    STATE_KEYS = TimelineModel.STATE_KEYS
+
+    UNDO_ID = "com.camerasideas.instashot:id/ivOpBack"
+    # Present only while an editing panel (or its input dialog) is open
+    PANEL_IDS = {
+        "com.camerasideas.instashot:id/btn_apply",
+        "com.camerasideas.instashot:id/btn_apply_all",
+        "com.camerasideas.instashot:id/btnApply",
+        "com.camerasideas.instashot:id/btnApplyAll",
+        "com.camerasideas.instashot:id/btn_ok",
+        "com.camerasideas.instashot:id/edit_text",
+    }
+
+    # How each tool backs out of a failed attempt (see rollback()):
+    #   "panel"    close whatever panel the attempt left open
+    #   "undo"     undo every edit the attempt committed
+    #   "timeline" restore the timeline model saved before the attempt
+    # Tools not listed here are not retried.
+    ROLLBACK = {
+        "calibrate": ["timeline"],
+        "seek_timeline": ["panel"],
+        "add_transition": ["panel", "undo", "timeline"],
+        "change_duration": ["panel", "undo", "timeline"],
+        "set_durations": ["panel", "undo", "timeline"],
+        "apply_effect": ["panel", "undo", "timeline"],
+        "apply_effects_batch": ["panel", "undo", "timeline"],
+        "apply_animation": ["panel", "undo", "timeline"],
+        "apply_animations_batch": ["panel", "undo", "timeline"],
+        "add_music_effects": ["panel", "undo", "timeline"],
+        "add_background_music": ["panel", "undo", "timeline"],
+    }
+
+    @staticmethod
+    def _gesture_snapshot():
+        return {**InshotTools._gesture_stats, "time": time.perf_counter()}
+
+    @staticmethod
+    async def adb(*args, timeout=ADB_TIMEOUT_S):
+        """
+        Run an adb command without blocking the event loop, so a wedged adb can't freeze the
+        loop and a step watchdog can still fire. The process is killed on timeout or when
+        the calling step is cancelled. Returns (returncode, stdout); raises on timeout.
+        """
+        process = await asyncio.create_subprocess_exec(
+            "adb", *args, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE
+        )
+        try:
+            stdout, stderr = await asyncio.wait_for(process.communicate(), timeout=timeout)
+        except BaseException:
+            if process.returncode is None:
+                process.kill()
+                await process.wait()
+            raise
+        if process.returncode != 0:
+            print(f"ADB Error: adb {' '.join(args)}: {stderr.decode(errors='replace').strip()}")
+        return process.returncode, stdout
+
     @staticmethod
-    def _adb_tap(x, y):
+    async def _adb_tap(x, y, commit=False):
+        InshotTools._gesture_stats["taps"] += 1
+        InshotTools._gesture_stats["commits"] += int(commit)
         try:
-            cmd = f"adb shell input tap {int(x)} {int(y)}"
-            subprocess.run(cmd, shell=True, check=True)
-            print(f"ADB Executed: input tap {int(x)} {int(y)}")
+            returncode, _ = await InshotTools.adb("shell", "input", "tap", str(int(x)), str(int(y)))
+            if returncode == 0:
+                print(f"ADB Executed: input tap {int(x)} {int(y)}")
+        except asyncio.TimeoutError:
+            print(f"ADB Error: input tap {int(x)} {int(y)} timed out after {ADB_TIMEOUT_S}s")
         except Exception as e:
             print(f"ADB Error: {e}")
 
+    @staticmethod
+    async def _tap_index(tools: Tools, index, commit=False):
+        InshotTools._gesture_stats["taps"] += 1
+        InshotTools._gesture_stats["commits"] += int(commit)
+        return await tools.tap_on_index(index)
+
+    @staticmethod
+    async def _swipe(tools: Tools, start_x, start_y, end_x, end_y, duration_ms):
+        InshotTools._gesture_stats["swipes"] += 1
+        InshotTools._gesture_stats["swipe_ms"] += duration_ms
+        return await tools.swipe(start_x, start_y, end_x, end_y, duration_ms=duration_ms)
+
     @staticmethod
     async def _find_node_by_id(tools: Tools, target_id, return_element=False):
         ui_state = (await tools.get_state())[2]
@@ -25,6 +113,75 @@ class InshotTools:
                 return element.get("index")
         return -1
 
+    @staticmethod
+    def _find_by_text(ui_state, texts):
+        """First element whose text matches one of texts (case-insensitive)."""
+        targets = {t.lower() for t in texts}
+        for el in ui_state:
+            if el.get("text", "").strip().lower() in targets:
+                return el
+        return None
+
+    @staticmethod
+    async def _tap_text(tools: Tools, texts, attempts=5, delay=1.0):
+        """Wait for an element with one of the given texts to appear, then tap it."""
+        for _ in range(attempts):
+            el = InshotTools._find_by_text((await tools.get_state())[2], texts)
+            if el:
+                bounds = [int(x) for x in el.get("bounds", "0,0,0,0").split(',')]
+                await InshotTools._adb_tap((bounds[0] + bounds[2]) / 2, (bounds[1] + bounds[3]) / 2)
+                return True
+            await asyncio.sleep(delay)
+        return False
+
+    @staticmethod
+    def snapshot_state():
+        """Timeline model plus the undo depth, taken before a tool attempt (see rollback())"""
+        return {"state": timeline().to_state(), "commits": InshotTools._gesture_stats["commits"]}
+
+    @staticmethod
+    async def _close_panels(tools: Tools, max_presses=4):
+        """Press back until no editing panel is open. Never backs out of the editor itself."""
+        for _ in range(max_presses):
+            ui_state = (await tools.get_state())[2]
+            if not any(el.get("resourceId") in InshotTools.PANEL_IDS for el in ui_state):
+                return True
+            await tools.back()
+            await asyncio.sleep(0.5)
+        return False
+
+    @staticmethod
+    async def rollback(tool_name: str, tools: Tools, snapshot: dict):
+        """
+        Return the project to where it was before a failed attempt of tool_name,
+        as declared in ROLLBACK. Returns False if the tool can't be rolled back.
+        """
+        actions = InshotTools.ROLLBACK.get(tool_name)
+        if actions is None:
+            return False
+
+        if "panel" in actions and not await InshotTools._close_panels(tools):
+            print(f"[ROLLBACK] {tool_name}: could not close the open panel")
+            return False
+
+        undo_count = InshotTools._gesture_stats["commits"] - snapshot["commits"]
+        if "undo" in actions and undo_count > 0:
+            for _ in range(undo_count):
+                undo_idx = await InshotTools._find_node_by_id(tools, InshotTools.UNDO_ID)
+                if undo_idx == -1:
+                    print(f"[ROLLBACK] {tool_name}: undo button not found")
+                    return False
+                await InshotTools._tap_index(tools, undo_idx)
+                await asyncio.sleep(0.3)
+            InshotTools._gesture_stats["commits"] = snapshot["commits"]
+
+        if "timeline" in actions:
+            timeline().restore(snapshot["state"])
+            timeline().save()
+
+        print(f"[ROLLBACK] {tool_name}: closed panels, undid {max(undo_count, 0)} edit(s), restored timeline")
+        return True
+
     @staticmethod
     def _get_current_time(ui_state):
         target_id = "com.camerasideas.instashot:id/current_position"
@@ -38,27 +195,17 @@ class InshotTools:
 
     @staticmethod
     def _get_clip_midpoint(image_idx: int):
-        timeline_map = global_state.get("timeline_map")
-        if not timeline_map:
+        model = timeline()
+        if not model.num_clips:
             print("Error: Timeline map not found (Calibrate first).")
             return None
 
-        # Convert 1-based index to 0-based
-        list_idx = image_idx - 1
-
-        if list_idx < 0 or list_idx >= len(timeline_map):
-            print(f"Error: Index {image_idx} out of bounds (Total clips: {len(timeline_map)}).")
+        if not model.in_bounds(image_idx):
+            print(f"Error: Index {image_idx} out of bounds (Total clips: {model.num_clips}).")
             return None
 
-        # Calculate Start Time (Sum of all previous clips)
-        start_time = sum(timeline_map[:list_idx])
-        
-        # Get Duration of target clip
-        duration = timeline_map[list_idx]
-        
-        # Calculate Midpoint
-        midpoint = start_time + (duration / 2.0)
-        end_time = start_time + duration
+        start_time, end_time = model.clip_range(image_idx)
+        midpoint = model.midpoint(image_idx)
 
         print(f"Clip {image_idx} Range: {start_time:.2f}s - {end_time:.2f}s")
         print(f"Calculated Midpoint: {midpoint:.2f}s")
@@ -77,16 +224,7 @@ class InshotTools:
 
     @staticmethod
     def _get_clip_range(image_idx: int):
-        timeline_map = global_state.get("timeline_map")
-        if not timeline_map: return None, None
-        
-        # Convert 1-based to 0-based
-        idx = image_idx - 1
-        if idx < 0 or idx >= len(timeline_map): return None, None
-        
-        start_time = sum(timeline_map[:idx])
-        duration = timeline_map[idx]
-        return start_time, start_time + duration
+        return timeline().clip_range(image_idx)
 
     @staticmethod
     def _parse_inshot_time(time_str):
@@ -103,10 +241,8 @@ class InshotTools:
         DEFAULT_DURATION = 5.0 
         
         # --- 1. Map Initialization ---
-        timeline_map = [DEFAULT_DURATION] * num_images
-
-        global_state.set("timeline_map", timeline_map)
-        global_state.set("raw_image_duration", timeline_map.copy())
+        model = timeline()
+        model.calibrate(num_images, DEFAULT_DURATION)
         print(f"[MAP] Initialized Timeline Map for {num_images} clips.")
 
         timeline_segments = [
@@ -116,6 +252,7 @@ class InshotTools:
 
         if len(timeline_segments) < 4:
             print(f"Calibration Warning: Found {len(timeline_segments)} segments. Needed at least 4.")
+            model.save()
             return
 
         try:
@@ -131,7 +268,6 @@ class InshotTools:
                 print(f"   - Chunk {i} width: {width}px")
 
             px_per_sec = total_width / DEFAULT_DURATION
-            global_state.set("px/sec", px_per_sec)
 
             # --- 3. Geometry Calculation (Center Point) ---
             # We use the 1st segment (Index 0) to find the playhead line
@@ -143,9 +279,9 @@ class InshotTools:
             # The vertical center of the track
             center_y = (bounds[1] + bounds[3]) // 2
             
-            # Save as a list [x, y] to Redis
-            global_state.set("timeline_center", [center_x, center_y])
-            global_state.set("y_width", bounds[3] - bounds[1])
+            # Checkpoint the calibrated model to Redis
+            model.set_geometry(px_per_sec, [center_x, center_y], bounds[3] - bounds[1])
+            model.save()
             
             print(f"CALIBRATION COMPLETE")
             print(f"   Physics: 1s = {px_per_sec:.2f} px")
@@ -157,8 +293,8 @@ class InshotTools:
     @staticmethod
     async def _drag_gesture(tools, start_x, start_y, start_time, end_time):
         # 1. Get Calibration Data
-        px_per_sec = global_state.get("px/sec")
-        center_coords = global_state.get("timeline_center") # [center_x, center_y]
+        px_per_sec = timeline().px_per_sec
+        center_coords = timeline().center # [center_x, center_y]
         
         if not px_per_sec or not center_coords:
             print("Error: Calibration data missing for drag.")
@@ -171,16 +307,24 @@ class InshotTools:
 
         print(f"Dragging Handle: {start_x} -> {target_x} (Duration: {duration_needed:.2f}s)")
 
-        await tools.swipe(start_x, start_y, target_x, start_y, duration_ms=2000)
+        drag_ms = gesture_timing().duration_ms("drag", pixel_offset)
+        await InshotTools._swipe(tools, start_x, start_y, target_x, start_y, duration_ms=drag_ms)
         await asyncio.sleep(1.0) # Wait for UI to settle
 
     @staticmethod
     async def _seek_and_select_text(tools: Tools, target_text, anchor_text=None, swipe_area="menu"):
         MAX_SWIPES = 5
+        SWIPE_PX = 700
         target_lower = target_text.lower()
+        timing = gesture_timing()
+        last_swipe = None
             
         for attempt in range(MAX_SWIPES):
             ui_state = (await tools.get_state())[2]
+            if last_swipe:
+                shift = content_shift(last_swipe[0], ui_state, axis=0)
+                if shift is not None:
+                    timing.observe("carousel", SWIPE_PX, shift, last_swipe[1])
             for el in ui_state:
                 txt = el.get("text", "")
                 if swipe_area == "content" and not txt.isupper():
@@ -194,26 +338,35 @@ class InshotTools:
                 # Check for Match
                 if txt == target_lower:
                     print(f"Found '{target_text}' at Index {el.get('index')}")
-                    await tools.tap_on_index(el.get("index"))
+                    await InshotTools._tap_index(tools, el.get("index"))
                     return True
             
             # 2. Not found? Swipe.
             print(f"   '{target_text}' not visible. left (Y={swipe_y})...")
             
             # Swipe Left (Right to Left)
-            await tools.swipe(900, swipe_y, 200, swipe_y, duration_ms=600)
-            await asyncio.sleep(1.0)
+            swipe_ms = timing.duration_ms("carousel", SWIPE_PX)
+            await InshotTools._swipe(tools, 900, swipe_y, 900 - SWIPE_PX, swipe_y, duration_ms=swipe_ms)
+            last_swipe = (ui_state, swipe_ms)
+            await asyncio.sleep(timing.settle_s("carousel"))
             
         return False
 
     @staticmethod
     async def _seek_and_select_vertical(tools: Tools, target_text):
         MAX_SCROLLS = 8
+        SCROLL_PX = 500
         target_lower = target_text.lower()
         scroll_x = 500 
+        timing = gesture_timing()
+        last_swipe = None
 
         for attempt in range(MAX_SCROLLS):
             ui_state = (await tools.get_state())[2]
+            if last_swipe:
+                shift = content_shift(last_swipe[0], ui_state, axis=1)
+                if shift is not None:
+                    timing.observe("list", SCROLL_PX, shift, last_swipe[1])
             
             for el in ui_state:
                 txt = el.get("text", "").strip().lower()
@@ -221,11 +374,13 @@ class InshotTools:
                     index = el.get("index")
                     print(f"Found '{target_text}' at Index {index}")
                     bounds = [int(x) for x in el.get("bounds", "0,0,0,0").split(',')]
-                    InshotTools._adb_tap((bounds[0] + bounds[2]) / 2, (bounds[1] + bounds[3]) / 2)
+                    await InshotTools._adb_tap((bounds[0] + bounds[2]) / 2, (bounds[1] + bounds[3]) / 2)
                     return True
 
             print(f"Attempt {attempt + 1}: '{target_text}' not visible. Scrolling down...")
-            await tools.swipe(scroll_x, 800, scroll_x, 300, duration_ms=600)
+            swipe_ms = timing.duration_ms("list", SCROLL_PX)
+            await InshotTools._swipe(tools, scroll_x, 800, scroll_x, 800 - SCROLL_PX, duration_ms=swipe_ms)
+            last_swipe = (ui_state, swipe_ms)
             # await asyncio.sleep(1.0)
             
         return False
@@ -233,8 +388,8 @@ class InshotTools:
     @staticmethod
     async def seek_timeline(time, allowed_error = 0.2, tools: Tools = None, shared_state=None, **kwargs):
         # 1. READ Physics & Geometry
-        px_per_sec = global_state.get("px/sec")
-        center_coords = global_state.get("timeline_center") # Returns [x, y]
+        px_per_sec = timeline().px_per_sec
+        center_coords = timeline().center # Returns [x, y]
         
         if not px_per_sec or not center_coords: 
             return "Error: Physics/Geometry not calibrated. Run 'calibrate' first."
@@ -247,12 +402,17 @@ class InshotTools:
         max_iterations = 10
         
         print(f"Seeking {target_time}s using Origin({start_x}, {start_y})...")
+        timing = gesture_timing()
+        last_swipe = None  # (time before, pixels swiped, duration) of the previous scrub
 
         for i in range(max_iterations):
             
             # A. Measure Reality
             ui_state = (await tools.get_state())[2]
             current_time = InshotTools._get_current_time(ui_state)
+            if last_swipe:
+                moved_px = abs(current_time - last_swipe[0]) * px_per_sec
+                timing.observe("seek", last_swipe[1], moved_px, last_swipe[2])
             
             diff = target_time - current_time
             
@@ -280,17 +440,10 @@ class InshotTools:
             # Note: access controller via tools.agent.controller
             distance_to_move = abs(start_x - end_x)
             
-            # CONSTANT SPEED LOGIC
-            # We want a steady 'drag' speed, roughly 2px per ms
-            # Minimum duration 300ms (to avoid fling), Max 2000ms (to avoid timeout)
-            safe_speed = 2.0 
-            calculated_duration = int(distance_to_move / safe_speed)
-            
-            # Clamp limits
-            actual_duration = max(300, min(2000, calculated_duration))
-            if diff < 0.3:
-                actual_duration = 600
-            await tools.swipe(start_x, start_y, end_x, start_y, duration_ms=actual_duration)
+            # Fastest scrub speed this device has shown not to fling (see gesture_timing.py)
+            actual_duration = timing.duration_ms("seek", distance_to_move)
+            await InshotTools._swipe(tools, start_x, start_y, end_x, start_y, duration_ms=actual_duration)
+            last_swipe = (current_time, distance_to_move, actual_duration)
             await asyncio.sleep(0.2) 
 
         ui_state = (await tools.get_state())[2]
@@ -311,16 +464,16 @@ class InshotTools:
         if image2_idx != image1_idx + 1:
             return "Error: Can only transition adjacent clips."
             
-        timeline_map = global_state.get("timeline_map") 
-        px_per_sec = global_state.get("px/sec")
-        center_coords = global_state.get("timeline_center") # [center_x, center_y]
-        y_width = global_state.get("y_width")
+        model = timeline()
+        px_per_sec = model.px_per_sec
+        center_coords = model.center # [center_x, center_y]
+        y_width = model.y_width
 
-        if not timeline_map or not px_per_sec or not center_coords: 
+        if not model.is_calibrated(): 
             return "Error: Run calibration first."
 
         # 2. Seek to the Junction
-        junction_time = sum(timeline_map[:image1_idx])
+        junction_time = model.junction(image1_idx)
         print(f" Seeking junction at {junction_time}s...")
         
         await InshotTools.seek_timeline(junction_time, allowed_error=3.5, tools=tools)
@@ -343,7 +496,7 @@ class InshotTools:
             
         final_x = tap_x - 5
         final_y = best_y
-        InshotTools._adb_tap(final_x, final_y)
+        await InshotTools._adb_tap(final_x, final_y)
         
         # Wait a moment for the menu to open
         await asyncio.sleep(0.5)
@@ -404,15 +557,15 @@ class InshotTools:
         if index - 1 > len(transition_row_elements):
             print("Not in View")
             swipe_y = reference_top + 50 
-            await tools.swipe(900, swipe_y, 100, swipe_y, duration_ms=600)
+            await InshotTools._swipe(tools, 900, swipe_y, 100, swipe_y, duration_ms=gesture_timing().duration_ms("carousel", 800))
             idx_basic -= index
             idx_basic += index % (len(transition_row_elements)) + 3
             
-        await tools.tap_on_index(idx_basic)
+        await InshotTools._tap_index(tools, idx_basic)
         print(f"Clicked on {idx_basic} base {index}, transition type {transition_type}")
 
         if all_apply:
-            await tools.tap_on_index(idxApplyAll)
+            await InshotTools._tap_index(tools, idxApplyAll)
             ui_state = (await tools.get_state())[2]
             target_element = ""
             for elements in ui_state:
@@ -433,14 +586,16 @@ class InshotTools:
                     click_y = (y1 + y2) // 2
                     
                     print(f"[TAP] Force Tapping 'Apply to All' at ({click_x}, {click_y})")
-                    InshotTools._adb_tap(click_x, click_y)
+                    await InshotTools._adb_tap(click_x, click_y, commit=True)
         else:
-            await tools.tap_on_index(idxApply)
-
-        current_map = global_state.get("timeline_map")
-        current_map[image1_idx-1] -= transition_time / 2
-        current_map[image2_idx-1] -= transition_time / 2
-        global_state.set("timeline_map", current_map)
+            await InshotTools._tap_index(tools, idxApply, commit=True)
+
+        # Replacing a junction's transition doesn't shorten its clips again
+        junction = "all" if all_apply else image1_idx
+        if not model.has_transition(junction):
+            model.adjust_duration(image1_idx, -transition_time / 2)
+            model.adjust_duration(image2_idx, -transition_time / 2)
+        model.add_transition(junction, transition_type)
         return f"ADB Tapped ({final_x}, {final_y}) for junction {image1_idx}-{image2_idx}."
 
     @staticmethod
@@ -483,7 +638,7 @@ class InshotTools:
             
             if current_view_has_toolbar and toolbar_y != -1:
                 print(f"   'CANVAS' not visible. Rewinding menu (Swipe Right)...")
-                await tools.swipe(200, toolbar_y, 900, toolbar_y, duration_ms=600)
+                await InshotTools._swipe(tools, 200, toolbar_y, 900, toolbar_y, duration_ms=gesture_timing().duration_ms("carousel", 700))
                 await asyncio.sleep(1.0)
             else:
                 break
@@ -513,7 +668,7 @@ class InshotTools:
             if toolbar_y != -1:
                 print(f"   Target not visible. Swiping menu LEFT (Row Y={toolbar_y})...")
                 # Swipe Right -> Left (900 to 200) to reveal items on the RIGHT
-                await tools.swipe(900, toolbar_y, 200, toolbar_y, duration_ms=600)
+                await InshotTools._swipe(tools, 900, toolbar_y, 200, toolbar_y, duration_ms=gesture_timing().duration_ms("carousel", 700))
                 await asyncio.sleep(1.0)
             else:
                 return "[ERROR] Error: Toolbar row not visible."
@@ -521,47 +676,11 @@ class InshotTools:
         return f"[ERROR] Error: Tool '{targetTool}' not found after bidirectional search."
 
     @staticmethod
-    async def change_duration(image_idx: int, duration: float, tools: Tools = None, **kwargs):
+    async def _enter_duration(tools: Tools, duration: float):
         """
-        Changes the duration of a specific clip.
-        Logic: Seek to clip center -> Tap clip -> Tap Duration -> Type value.
+        Types a duration into the open Duration panel (pencil -> input -> OK).
+        Returns None on success, else an error string.
         """
-        # 1. Validation & State Retrieval
-        timeline_map = global_state.get("timeline_map") 
-        center_coords = global_state.get("timeline_center") # [center_x, center_y]
-        px_per_sec = global_state.get("px/sec")
-
-        if not timeline_map or not center_coords: 
-            return "Error: Run calibration first."
-
-        if image_idx > len(timeline_map):
-            return f"Error: Image index {image_idx} out of bounds (Max {len(timeline_map)-1})."
-
-        midpoint = InshotTools._get_clip_midpoint(image_idx)
-        await InshotTools.seek_timeline(midpoint, allowed_error=3.5, tools=tools)
-
-        ui_state = (await tools.get_state())[2]
-        current_time = InshotTools._get_current_time(ui_state)
-        
-        diff = current_time - midpoint
-        pixel_offset = int(diff * px_per_sec)
-        
-        playhead_x = center_coords[0]
-        theoretical_x = playhead_x - pixel_offset
-        
-        print(f" Seek Result: {current_time}s (Error: {diff:.2f}s)")
-        print(f" Math Target: {theoretical_x} (Shifted {pixel_offset}px)")
-
-        tap_x = theoretical_x
-        best_y = center_coords[1]
-            
-        final_x = tap_x - 5
-        final_y = best_y
-        InshotTools._adb_tap(final_x, final_y)
-        
-        idx = await InshotTools.seek_toolbar("Duration", tools)
-        await tools.tap_on_index(idx)
-
         ui_state = (await tools.get_state())[2]
 
         target_id = "com.camerasideas.instashot:id/btn_edit_duration"
@@ -576,7 +695,7 @@ class InshotTools:
             return "[ERROR] Error: Pencil edit icon (btn_edit_duration) not found."
         
         print(f"[PENCIL] Tapping Pencil Edit (Index {pencil_idx})")
-        await tools.tap_on_index(pencil_idx)
+        await InshotTools._tap_index(tools, pencil_idx)
         await asyncio.sleep(0.1)
 
         ui_state = (await tools.get_state())[2]
@@ -602,15 +721,38 @@ class InshotTools:
                 break
         
         if confirm_idx != -1:
-            await tools.tap_on_index(confirm_idx)
+            await InshotTools._tap_index(tools, confirm_idx)
         else:
             print("[WARN] Confirm button ID not found, using fallback tap.")
+        return None
+
+    @staticmethod
+    async def change_duration(image_idx: int, duration: float, tools: Tools = None, **kwargs):
+        """
+        Changes the duration of a specific clip.
+        Logic: Seek to clip center -> Tap clip -> Tap Duration -> Type value.
+        """
+        # 1. Validation & State Retrieval
+        model = timeline()
+
+        if not model.is_calibrated(): 
+            return "Error: Run calibration first."
+
+        if image_idx > model.num_clips:
+            return f"Error: Image index {image_idx} out of bounds (Max {model.num_clips})."
 
-        list_idx = image_idx - 1
-        if 0 <= list_idx < len(timeline_map):
-            print(f"[UPDATE] Updating Internal Map: Clip {image_idx} changed from {timeline_map[list_idx]}s to {duration}s")
-            timeline_map[list_idx] = float(duration)
-            global_state.set("timeline_map", timeline_map)
+        await InshotTools._select_clip(tools, image_idx)
+        
+        idx = await InshotTools.seek_toolbar("Duration", tools)
+        await InshotTools._tap_index(tools, idx)
+
+        error = await InshotTools._enter_duration(tools, duration)
+        if error:
+            return error
+
+        if model.in_bounds(image_idx):
+            print(f"[UPDATE] Updating Internal Map: Clip {image_idx} changed from {model.duration(image_idx)}s to {duration}s")
+            model.set_duration(image_idx, float(duration))
         
         await asyncio.sleep(0.5)
         apply_id = "com.camerasideas.instashot:id/btn_apply"
@@ -622,39 +764,95 @@ class InshotTools:
                 confirm_idx = el.get("index")
                 break
         
-        await tools.tap_on_index(confirm_idx)
+        await InshotTools._tap_index(tools, confirm_idx, commit=True)
         await asyncio.sleep(0.5)
         
-        midpoint = InshotTools._get_clip_midpoint(image_idx)
-        await InshotTools.seek_timeline(midpoint, allowed_error=3.5, tools=tools)
-        ui_state = (await tools.get_state())[2]
-        current_time = InshotTools._get_current_time(ui_state)
-        
-        diff = current_time - midpoint
-        pixel_offset = int(diff * px_per_sec)
-        
-        playhead_x = center_coords[0]
-        theoretical_x = playhead_x - pixel_offset
-        tap_x = theoretical_x
-        best_y = center_coords[1]
-            
-        final_x = tap_x - 5
-        final_y = best_y
-        InshotTools._adb_tap(final_x, final_y)
+        # Tap the clip again to deselect it
+        await InshotTools._select_clip(tools, image_idx)
 
         return f"[DONE] Changed clip {image_idx} duration to {duration}s."
 
     @staticmethod
-    async def apply_effect(image_idx: int, effects_list: list[str], tools: Tools = None, **kwargs):
-        timeline_map = global_state.get("timeline_map") 
-        center_coords = global_state.get("timeline_center")
-        px_per_sec = global_state.get("px/sec")
+    async def set_durations(durations: list[float], tools: Tools = None, **kwargs):
+        """
+        Sets the duration of every clip in a single Duration panel visit.
+        durations is the full 1-based-ordered vector (durations[0] is clip 1); None keeps a clip unchanged.
+        Logic: equal values -> set once + Apply to All; otherwise walk clips inside the open panel.
+        """
+        model = timeline()
 
-        if not timeline_map or not center_coords: 
-            return "[ERROR] Error: Run calibration first."
+        if not model.is_calibrated(): 
+            return "Error: Run calibration first."
 
-        if image_idx > len(timeline_map):
-            return f"[ERROR] Error: Image index {image_idx} out of bounds (Max {len(timeline_map)-1})."
+        if len(durations) > model.num_clips:
+            return f"Error: Got {len(durations)} durations for {model.num_clips} clips."
+
+        for value in durations:
+            if value is not None and float(value) < 1.5:
+                return f"Error: Duration {value}s is below the 1.5s minimum."
+
+        # The model is updated clip by clip, so later clips are located with the new durations
+        current = model.durations()
+        targets = [
+            (i + 1, float(value)) for i, value in enumerate(durations)
+            if value is not None and float(value) != current[i]
+        ]
+        if not targets:
+            return "[DONE] All clip durations already match."
+
+        values = {float(v) for v in durations if v is not None}
+        apply_to_all = len(durations) == model.num_clips and None not in durations and len(values) == 1
+
+        first_idx = targets[0][0]
+        await InshotTools._select_clip(tools, first_idx)
+
+        idx = await InshotTools.seek_toolbar("Duration", tools)
+        await InshotTools._tap_index(tools, idx)
+
+        if apply_to_all:
+            duration = values.pop()
+            error = await InshotTools._enter_duration(tools, duration)
+            if error:
+                return error
+
+            await asyncio.sleep(0.5)
+            apply_all_idx = await InshotTools._find_node_by_id(tools, "com.camerasideas.instashot:id/btn_apply_all")
+            if apply_all_idx == -1:
+                return "[ERROR] Error: Duration 'Apply to All' button (btn_apply_all) not found."
+            print(f"[APPLY ALL] Applying {duration}s to all {model.num_clips} clips")
+            await InshotTools._tap_index(tools, apply_all_idx, commit=True)
+            for image_idx in range(1, model.num_clips + 1):
+                model.set_duration(image_idx, duration)
+        else:
+            for n, (image_idx, duration) in enumerate(targets):
+                if n > 0:
+                    # Switch clip from inside the open panel using the durations set so far
+                    await InshotTools._select_clip(tools, image_idx)
+                    await asyncio.sleep(0.3)
+
+                error = await InshotTools._enter_duration(tools, duration)
+                if error:
+                    return f"{error} (clip {image_idx}; clips before it were updated)"
+
+                print(f"[UPDATE] Clip {image_idx}: {model.duration(image_idx)}s -> {duration}s")
+                model.set_duration(image_idx, duration)
+
+            await asyncio.sleep(0.5)
+            apply_idx = await InshotTools._find_node_by_id(tools, "com.camerasideas.instashot:id/btn_apply")
+            await InshotTools._tap_index(tools, apply_idx, commit=True)
+
+        await asyncio.sleep(0.5)
+
+        # Tap the last edited clip again to deselect it
+        await InshotTools._select_clip(tools, targets[-1][0])
+
+        return f"[DONE] Set durations for {model.num_clips if apply_to_all else len(targets)} clips: {model.durations()}"
+
+    @staticmethod
+    async def _select_clip(tools: Tools, image_idx: int):
+        """Seeks to the middle of a clip and taps it on the timeline."""
+        center_coords = timeline().center
+        px_per_sec = timeline().px_per_sec
 
         midpoint = InshotTools._get_clip_midpoint(image_idx)
         await InshotTools.seek_timeline(midpoint, allowed_error=3.5, tools=tools)
@@ -676,212 +874,337 @@ class InshotTools:
             
         final_x = tap_x - 5
         final_y = best_y
-        InshotTools._adb_tap(final_x, final_y)
+        await InshotTools._adb_tap(final_x, final_y)
 
-        with open("effects.json", "r") as f:
-            effects_map = json.load(f)["Effects"]
+    @staticmethod
+    async def _apply_effect_in_panel(tools: Tools, image_idx: int, effect_name: str, effects_map: dict):
+        """
+        Adds one effect at the start of a clip and extends it to the clip end.
+        Expects the Effect panel to be open. Returns None on success, else an error string.
+        """
+        start_time, end_time = InshotTools._get_clip_range(image_idx)
+        print(f"[SEEK] Seeking to Clip Start: {start_time}s")
+        actual_start_time = await InshotTools.seek_timeline(start_time, allowed_error=0.25, tools=tools)
 
-        idx = await InshotTools.seek_toolbar("Effect", tools)
-        await tools.tap_on_index(idx)
+        effect_idx = await InshotTools._find_node_by_id(tools, "com.camerasideas.instashot:id/btn_add_effect")
+        await InshotTools._tap_index(tools, effect_idx)
 
-        for effects in effects_list:
+        target_effect_lower = effect_name.lower()
+        
+        target_group = None
+        real_effect_name = None
+        
+        for k, v in effects_map.items():
+            if k.lower() == target_effect_lower:
+                target_group = v
+                real_effect_name = k
+                break
+        
+        if not target_group:
+            return f"[ERROR] Error: Effect '{effect_name}' not found in effects.json definition."
 
-            start_time, end_time = InshotTools._get_clip_range(image_idx)
-            print(f"[SEEK] Seeking to Clip Start: {start_time}s")
-            actual_start_time = await InshotTools.seek_timeline(start_time, allowed_error=0.25, tools=tools)
+        print(f"[EFFECT] Effect '{real_effect_name}' belongs to Group '{target_group}'")
 
-            effect_idx = await InshotTools._find_node_by_id(tools, "com.camerasideas.instashot:id/btn_add_effect")
-            await tools.tap_on_index(effect_idx)
+        group_anchor = None
+        for k, v in effects_map.items():
+            if v == target_group:
+                group_anchor = k
+                break
 
-            target_effect_lower = effects.lower()
-            
-            target_group = None
-            real_effect_name = None
-            
-            for k, v in effects_map.items():
-                if k.lower() == target_effect_lower:
-                    target_group = v
-                    real_effect_name = k
-                    break
-            
-            if not target_group:
-                return f"[ERROR] Error: Effect '{effects}' not found in effects.json definition."
-
-            print(f"[EFFECT] Effect '{real_effect_name}' belongs to Group '{target_group}'")
-
-            group_anchor = None
-            for k, v in effects_map.items():
-                if v == target_group:
-                    group_anchor = k
-                    break
-
-            print(f"[SEEK] Seeking Group: {target_group}")
-            group_found = await InshotTools._seek_and_select_text(
-                tools=tools, 
-                target_text=target_group, 
-                anchor_text="Basic"
-            )
-            
-            if not group_found:
-                return f"[ERROR] Error: Effect Group '{target_group}' not found in UI."
-                
-            print(f"[SEEK] Seeking Effect: {real_effect_name}")
-            
-            effect_found = await InshotTools._seek_and_select_text(
-                tools=tools, 
-                target_text=real_effect_name, 
-                anchor_text=group_anchor,
-                swipe_area="content"
-            )
+        print(f"[SEEK] Seeking Group: {target_group}")
+        group_found = await InshotTools._seek_and_select_text(
+            tools=tools, 
+            target_text=target_group, 
+            anchor_text="Basic"
+        )
+        
+        if not group_found:
+            return f"[ERROR] Error: Effect Group '{target_group}' not found in UI."
             
-            if not effect_found:
-                return f"[ERROR] Error: Effect '{real_effect_name}' not found inside group '{target_group}'."
+        print(f"[SEEK] Seeking Effect: {real_effect_name}")
+        
+        effect_found = await InshotTools._seek_and_select_text(
+            tools=tools, 
+            target_text=real_effect_name, 
+            anchor_text=group_anchor,
+            swipe_area="content"
+        )
+        
+        if not effect_found:
+            return f"[ERROR] Error: Effect '{real_effect_name}' not found inside group '{target_group}'."
 
-            confirm_idx = await InshotTools._find_node_by_id(tools, "com.camerasideas.instashot:id/btn_apply")
-            await tools.tap_on_index(confirm_idx)
-            ui_state = (await tools.get_state())[2]
-            
-            effect_label_idx = -1
-            for el in ui_state:
-                if el.get("text", "").lower() == real_effect_name.lower():
-                    effect_label_idx = el.get("index")
-                    break
-            
-            if effect_label_idx == -1:
-                return f"[WARN] Warning: Applied effect but could not find label '{real_effect_name}' to extend it."
+        confirm_idx = await InshotTools._find_node_by_id(tools, "com.camerasideas.instashot:id/btn_apply")
+        await InshotTools._tap_index(tools, confirm_idx, commit=True)
+        ui_state = (await tools.get_state())[2]
+        
+        effect_label_idx = -1
+        for el in ui_state:
+            if el.get("text", "").lower() == real_effect_name.lower():
+                effect_label_idx = el.get("index")
+                break
+        
+        if effect_label_idx == -1:
+            return f"[WARN] Warning: Applied effect but could not find label '{real_effect_name}' to extend it."
 
-            parent_idx = effect_label_idx - 2
-            parent_element = None
-            for el in ui_state:
-                if el.get("index") == parent_idx:
-                    parent_element = el
-                    break
+        parent_idx = effect_label_idx - 2
+        parent_element = None
+        for el in ui_state:
+            if el.get("index") == parent_idx:
+                parent_element = el
+                break
+        
+        if parent_element:
+            bounds = [int(x) for x in parent_element.get("bounds", "0,0,0,0").split(',')]
+            right_edge = bounds[2]
+            top = bounds[1]
+            bottom = bounds[3]
             
-            if parent_element:
-                bounds = [int(x) for x in parent_element.get("bounds", "0,0,0,0").split(',')]
-                right_edge = bounds[2]
-                top = bounds[1]
-                bottom = bounds[3]
-                
-                mid_y = (top + bottom) // 2
-                tap_x = right_edge + 5
-                
-                if end_time - start_time > 3.5: 
-                    print(f"[TAP] Tapping Right Handle at ({tap_x}, {mid_y})")
-                    InshotTools._adb_tap(tap_x, mid_y)
-                    ui_state = (await tools.get_state())[2]
-                    clip_end_idx = await InshotTools._find_node_by_id(tools, "com.camerasideas.instashot:id/textClipEnd", return_element=True)
-                    print(f"Tapping on {clip_end_idx.get("index")}")
-                    bounds = [int(x) for x in clip_end_idx.get("bounds", "0,0,0,0").split(',')]
-                    InshotTools._adb_tap((bounds[0] + bounds[2])/2, (bounds[1] + bounds[3])/2)
-                else:
-                    print(f"[DRAG] Short Clip ({end_time - start_time:.1f}s). Using precision drag.")
-                    await InshotTools._drag_gesture(tools, tap_x, mid_y, actual_start_time, end_time)
+            mid_y = (top + bottom) // 2
+            tap_x = right_edge + 5
+            
+            if end_time - start_time > 3.5: 
+                print(f"[TAP] Tapping Right Handle at ({tap_x}, {mid_y})")
+                await InshotTools._adb_tap(tap_x, mid_y)
+                ui_state = (await tools.get_state())[2]
+                clip_end_idx = await InshotTools._find_node_by_id(tools, "com.camerasideas.instashot:id/textClipEnd", return_element=True)
+                print(f"Tapping on {clip_end_idx.get("index")}")
+                bounds = [int(x) for x in clip_end_idx.get("bounds", "0,0,0,0").split(',')]
+                await InshotTools._adb_tap((bounds[0] + bounds[2])/2, (bounds[1] + bounds[3])/2)
             else:
-                print(f"[WARN] Parent element (Index {parent_idx}) not found. Skipping extension.")
+                print(f"[DRAG] Short Clip ({end_time - start_time:.1f}s). Using precision drag.")
+                await InshotTools._drag_gesture(tools, tap_x, mid_y, actual_start_time, end_time)
+        else:
+            print(f"[WARN] Parent element (Index {parent_idx}) not found. Skipping extension.")
+
+        print(f"[DONE] Applied effect '{real_effect_name}' and extended to full clip.")
+        return None
+
+    @staticmethod
+    async def apply_effect(image_idx: int, effects_list: list[str], tools: Tools = None, **kwargs):
+        model = timeline()
 
-            print(f"[DONE] Applied effect '{real_effect_name}' and extended to full clip.")
+        if not model.is_calibrated(): 
+            return "[ERROR] Error: Run calibration first."
+
+        if image_idx > model.num_clips:
+            return f"[ERROR] Error: Image index {image_idx} out of bounds (Max {model.num_clips})."
+
+        await InshotTools._select_clip(tools, image_idx)
+
+        with open("effects.json", "r") as f:
+            effects_map = json.load(f)["Effects"]
+
+        idx = await InshotTools.seek_toolbar("Effect", tools)
+        await InshotTools._tap_index(tools, idx)
+
+        for effects in effects_list:
+            error = await InshotTools._apply_effect_in_panel(tools, image_idx, effects, effects_map)
+            if error:
+                return error
+            model.add_effects(image_idx, [effects])
 
         ui_state = (await tools.get_state())[2]
         final_apply_idx = await InshotTools._find_node_by_id(tools, "com.camerasideas.instashot:id/btn_apply")
-        await tools.tap_on_index(final_apply_idx)
+        await InshotTools._tap_index(tools, final_apply_idx)
 
         return f"Done Applying Effects"
 
     @staticmethod
-    async def apply_animation(image_idx: int, animation_name: str, animation_type: str, tools: Tools = None, **kwargs):
-        timeline_map = global_state.get("timeline_map") 
-        center_coords = global_state.get("timeline_center")
-        px_per_sec = global_state.get("px/sec")
+    async def apply_effects_batch(effects_map: dict, tools: Tools = None, **kwargs):
+        """
+        Applies effects to many clips in a single Effect panel session.
+        effects_map maps a 1-based clip index to its list of effects, e.g. {1: ["Slow Zoom"], 3: ["Glitch", "Darken"]}.
+        Logic: Select first clip -> Open Effect once -> For each clip: seek to its start, add + extend effects -> Apply once.
+        """
+        model = timeline()
 
-        midpoint = InshotTools._get_clip_midpoint(image_idx)
-        await InshotTools.seek_timeline(midpoint, allowed_error=3.5, tools=tools)
+        if not model.is_calibrated(): 
+            return "[ERROR] Error: Run calibration first."
 
-        ui_state = (await tools.get_state())[2]
-        current_time = InshotTools._get_current_time(ui_state)
-        
-        diff = current_time - midpoint
-        pixel_offset = int(diff * px_per_sec)
-        
-        playhead_x = center_coords[0]
-        theoretical_x = playhead_x - pixel_offset
-        
-        print(f"[SEEK] Seek Result: {current_time}s (Error: {diff:.2f}s)")
-        print(f"[MATH] Math Target: {theoretical_x} (Shifted {pixel_offset}px)")
+        # JSON object keys arrive as strings; apply in timeline order
+        bad_keys = [k for k in effects_map if not str(k).strip().isdigit()]
+        if bad_keys:
+            return f"[ERROR] Error: effects_map keys must be 1-based clip numbers, got {bad_keys}. Nothing was applied."
+        clips = sorted((int(k), v) for k, v in effects_map.items() if v)
+        if not clips:
+            return "[DONE] No effects to apply."
 
-        tap_x = theoretical_x
-        best_y = center_coords[1]
-            
-        final_x = tap_x - 5
-        final_y = best_y
-        InshotTools._adb_tap(final_x, final_y)
+        for image_idx, _ in clips:
+            if not model.in_bounds(image_idx):
+                return f"[ERROR] Error: Image index {image_idx} out of bounds (Max {model.num_clips})."
 
-        idx = await InshotTools.seek_toolbar("Animation", tools)
-        await tools.tap_on_index(idx)
+        with open("effects.json", "r") as f:
+            effects_definitions = json.load(f)["Effects"]
+
+        await InshotTools._select_clip(tools, clips[0][0])
+
+        idx = await InshotTools.seek_toolbar("Effect", tools)
+        await InshotTools._tap_index(tools, idx)
+
+        applied = []
+        for image_idx, effects_list in clips:
+            for effects in effects_list:
+                error = await InshotTools._apply_effect_in_panel(tools, image_idx, effects, effects_definitions)
+                if error:
+                    done = ", ".join(applied) or "none"
+                    return f"{error} (clip {image_idx}; already applied: {done})"
+                applied.append(f"{image_idx}:{effects}")
+                model.add_effects(image_idx, [effects])
+
+        final_apply_idx = await InshotTools._find_node_by_id(tools, "com.camerasideas.instashot:id/btn_apply")
+        await InshotTools._tap_index(tools, final_apply_idx)
 
+        return f"[DONE] Applied {len(applied)} effects across {len(clips)} clips in one Effect panel session."
+
+    @staticmethod
+    async def _select_animation_in_panel(tools: Tools, animation_name: str, animation_type: str, animations: dict):
+        """Taps the IN/OUT/COMBO tab of the open Animation panel and picks an animation from its carousel."""
         IN_ID = "com.camerasideas.instashot:id/in_text"
         OUT_ID = "com.camerasideas.instashot:id/out_text"
         COMBO_ID = "com.camerasideas.instashot:id/combo_text"
 
-        EFFECT_ID = "com.camerasideas.instashot:id/name"
+        tab_ids = {"IN": IN_ID, "OUT": OUT_ID, "COMBO": COMBO_ID}
+        animation_type = animation_type.upper()
+        if animation_type not in tab_ids:
+            return False
+
+        if animation_type == "COMBO":
+            print("COMBO")
+        target_id = await InshotTools._find_node_by_id(tools, tab_ids[animation_type], True)
+        bounds = [int(x) for x in target_id.get("bounds", "0,0,0,0").split(',')]
+
+        await InshotTools._adb_tap((bounds[0] + bounds[2]) / 2, (bounds[1] + bounds[3]) / 2)
+
+        return await InshotTools._seek_and_select_text(tools, animation_name, animations[animation_type][0], "content")
+
+    @staticmethod
+    async def apply_animation(image_idx: int, animation_name: str, animation_type: str, tools: Tools = None, **kwargs):
+        await InshotTools._select_clip(tools, image_idx)
+
+        idx = await InshotTools.seek_toolbar("Animation", tools)
+        await InshotTools._tap_index(tools, idx)
 
         with open("animations.json", "r") as f:
             animations = json.load(f)
 
-        if animation_type == "IN":
-            target_id = await InshotTools._find_node_by_id(tools, IN_ID, True)
-            bounds = [int(x) for x in target_id.get("bounds", "0,0,0,0").split(',')]
+        await InshotTools._select_animation_in_panel(tools, animation_name, animation_type, animations)
+
+        confirm_idx = await InshotTools._find_node_by_id(tools, "com.camerasideas.instashot:id/btn_apply")
+        await InshotTools._tap_index(tools, confirm_idx, commit=True)
+        timeline().set_animation(image_idx, animation_type, animation_name)
+
+        # Tap the clip again to deselect it
+        await InshotTools._select_clip(tools, image_idx)
 
-            InshotTools._adb_tap((bounds[0] + bounds[2]) / 2, (bounds[1] + bounds[3]) / 2)
+    @staticmethod
+    async def apply_animations_batch(animations_list: list[dict], tools: Tools = None, **kwargs):
+        """
+        Applies IN/OUT/COMBO animations to many clips in a single Animation panel session.
+        animations_list: [{"image_idx": 1, "animation_name": "Fade", "animation_type": "IN"}, ...]
+        Logic: Select first clip -> Open Animation once -> switch clips inside the panel -> Apply once.
+        Reports gestures and time saved against calling apply_animation per clip.
+        """
+        model = timeline()
 
-        if animation_type == "OUT":
-            target_id = await InshotTools._find_node_by_id(tools, OUT_ID,True)
-            bounds = [int(x) for x in target_id.get("bounds", "0,0,0,0").split(',')]
+        if not model.is_calibrated(): 
+            return "[ERROR] Error: Run calibration first."
 
-            InshotTools._adb_tap((bounds[0] + bounds[2]) / 2, (bounds[1] + bounds[3]) / 2)
+        if not animations_list:
+            return "[DONE] No animations to apply."
+
+        type_order = {"IN": 0, "OUT": 1, "COMBO": 2}
+
+        # Validate every entry before touching the device, like apply_effects_batch
+        entries = []
+        for entry in animations_list:
+            if not isinstance(entry, dict):
+                return f"[ERROR] Error: animations_list entries must be objects, got {entry!r}. Nothing was applied."
+            if not str(entry.get("image_idx", "")).strip().isdigit():
+                return f"[ERROR] Error: image_idx must be a 1-based clip number, got {entry.get('image_idx')!r}. Nothing was applied."
+            image_idx = int(str(entry["image_idx"]).strip())
+            animation_type = str(entry.get("animation_type", "")).upper()
+            if animation_type not in type_order:
+                return f"[ERROR] Error: Unknown animation type '{entry.get('animation_type')}'. Use IN, OUT or COMBO. Nothing was applied."
+            if not entry.get("animation_name"):
+                return f"[ERROR] Error: Missing animation_name for clip {image_idx}. Nothing was applied."
+            if not model.in_bounds(image_idx):
+                return f"[ERROR] Error: Image index {image_idx} out of bounds (Max {model.num_clips})."
+            entries.append({"image_idx": image_idx, "animation_name": entry["animation_name"], "animation_type": animation_type})
+
+        # Timeline order, IN before OUT before COMBO within a clip
+        entries.sort(key=lambda a: (a["image_idx"], type_order[a["animation_type"]]))
 
-        if animation_type == "COMBO":
-            print("COMBO")
-            target_id = await InshotTools._find_node_by_id(tools, COMBO_ID, True)
-            bounds = [int(x) for x in target_id.get("bounds", "0,0,0,0").split(',')]
+        with open("animations.json", "r") as f:
+            animations = json.load(f)
 
-            InshotTools._adb_tap((bounds[0] + bounds[2]) / 2, (bounds[1] + bounds[3]) / 2)
+        batch_start = InshotTools._gesture_snapshot()
 
-            # await tools.tap_on_index(target_id)
-        
-        await InshotTools._seek_and_select_text(tools, animation_name, animations[animation_type.upper()][0], "content")
+        # Fixed overhead the per-clip path pays for every clip: select clip + open the panel
+        current_idx = entries[0]["image_idx"]
+        await InshotTools._select_clip(tools, current_idx)
+        idx = await InshotTools.seek_toolbar("Animation", tools)
+        await InshotTools._tap_index(tools, idx)
+        open_cost = InshotTools._gesture_snapshot()
+
+        applied = []
+        # Distinct clips (several animations on one clip share its selection)
+        clips = {current_idx}
+        # What the batch pays instead: a clip selection (+ settle) on every clip switch
+        switch_gestures, switch_seconds = 0, 0.0
+        for entry in entries:
+            image_idx = entry["image_idx"]
+            if image_idx != current_idx:
+                # Switch the selected clip without leaving the panel
+                switch_start = InshotTools._gesture_snapshot()
+                await InshotTools._select_clip(tools, image_idx)
+                await asyncio.sleep(0.3)
+                switch_end = InshotTools._gesture_snapshot()
+                switch_gestures += (switch_end["taps"] - switch_start["taps"]) + (switch_end["swipes"] - switch_start["swipes"])
+                switch_seconds += switch_end["time"] - switch_start["time"]
+                current_idx = image_idx
+                clips.add(image_idx)
+
+            found = await InshotTools._select_animation_in_panel(
+                tools, entry["animation_name"], entry["animation_type"], animations
+            )
+            if not found:
+                done = ", ".join(applied) or "none"
+                return f"[ERROR] Error: Animation '{entry['animation_name']}' ({entry['animation_type']}) not found for clip {image_idx} (already applied: {done})."
+            applied.append(f"{image_idx}:{entry['animation_type']}:{entry['animation_name']}")
+            model.set_animation(image_idx, entry["animation_type"], entry["animation_name"])
 
         confirm_idx = await InshotTools._find_node_by_id(tools, "com.camerasideas.instashot:id/btn_apply")
-        await tools.tap_on_index(confirm_idx)
+        await InshotTools._tap_index(tools, confirm_idx, commit=True)
 
-        midpoint = InshotTools._get_clip_midpoint(image_idx)
-        await InshotTools.seek_timeline(midpoint, allowed_error=3.5, tools=tools)
-        ui_state = (await tools.get_state())[2]
-        current_time = InshotTools._get_current_time(ui_state)
-        
-        diff = current_time - midpoint
-        pixel_offset = int(diff * px_per_sec)
-        
-        playhead_x = center_coords[0]
-        theoretical_x = playhead_x - pixel_offset
-        tap_x = theoretical_x
-        best_y = center_coords[1]
-            
-        final_x = tap_x - 5
-        final_y = best_y
-        InshotTools._adb_tap(final_x, final_y)
+        # Deselect, which the per-clip path also does after every clip
+        deselect_start = InshotTools._gesture_snapshot()
+        await InshotTools._select_clip(tools, current_idx)
+        batch_end = InshotTools._gesture_snapshot()
+
+        def gestures(a, b):
+            return (b["taps"] - a["taps"]) + (b["swipes"] - a["swipes"])
+
+        # Each extra clip on the per-clip path repeats select + open + apply + deselect;
+        # the batch pays a clip switch for it instead
+        extra_clips = len(clips) - 1
+        saved_gestures = extra_clips * (gestures(batch_start, open_cost) + 1 + gestures(deselect_start, batch_end)) - switch_gestures
+        saved_seconds = extra_clips * ((open_cost["time"] - batch_start["time"]) + (batch_end["time"] - deselect_start["time"])) - switch_seconds
+        batch_gestures = gestures(batch_start, batch_end)
+        batch_seconds = batch_end["time"] - batch_start["time"]
+
+        print(f"[BATCH] Animations: {len(applied)} on {len(clips)} clips | {batch_gestures} gestures in {batch_seconds:.1f}s")
+        print(f"[BATCH] Saved vs per-clip path: ~{saved_gestures} gestures, ~{saved_seconds:.1f}s")
+
+        return (f"[DONE] Applied {len(applied)} animations on {len(clips)} clips in one Animation panel session "
+                f"({batch_gestures} gestures, {batch_seconds:.1f}s; saved ~{saved_gestures} gestures, ~{saved_seconds:.1f}s).")
     
     @staticmethod
     async def add_music_effects(start_time: int, music_name: str, tools: Tools = None, **kwargs):
-        timeline_map = global_state.get("timeline_map") 
-        center_coords = global_state.get("timeline_center")
-        px_per_sec = global_state.get("px/sec")
-
-        if not timeline_map or not center_coords: 
+        if not timeline().is_calibrated(): 
             return "[ERROR] Error: Run calibration first."
         
         idx = await InshotTools.seek_toolbar("Audio", tools)
-        await tools.tap_on_index(idx)
+        await InshotTools._tap_index(tools, idx)
 
         actual_start_time = await InshotTools.seek_timeline(start_time, allowed_error=0.25, tools=tools)
 
@@ -891,7 +1214,7 @@ class InshotTools:
         effect = music_effects.get(music_name.lower())
 
         add_effect_id = await InshotTools._find_node_by_id(tools, "com.camerasideas.instashot:id/btn_add_effect")
-        await tools.tap_on_index(add_effect_id)
+        await InshotTools._tap_index(tools, add_effect_id)
 
         await asyncio.sleep(0.5)
 
@@ -900,20 +1223,20 @@ class InshotTools:
         add_el = await InshotTools._find_node_by_id(tools, "com.camerasideas.instashot:id/effect_use_tv", True)
         bounds = [int(x) for x in add_el.get("bounds", "0,0,0,0").split(',')]
 
-        InshotTools._adb_tap((bounds[0] + bounds[2]) / 2, (bounds[1] + bounds[3]) / 2)
+        await InshotTools._adb_tap((bounds[0] + bounds[2]) / 2, (bounds[1] + bounds[3]) / 2)
 
         confirm_idx = await InshotTools._find_node_by_id(tools, "com.camerasideas.instashot:id/btn_apply")
-        await tools.tap_on_index(confirm_idx)
+        await InshotTools._tap_index(tools, confirm_idx, commit=True)
 
     @staticmethod
     async def add_background_music(audio_name, tools: Tools = None, **kwargs):
         idx = await InshotTools.seek_toolbar("Audio", tools)
-        await tools.tap_on_index(idx)
+        await InshotTools._tap_index(tools, idx)
 
         actual_start_time = await InshotTools.seek_timeline(0, allowed_error=0.25, tools=tools)
 
         add_music_id = await InshotTools._find_node_by_id(tools, "com.camerasideas.instashot:id/btn_add_track")
-        await tools.tap_on_index(add_music_id)
+        await InshotTools._tap_index(tools, add_music_id)
         await asyncio.sleep(0.5)
 
 
@@ -922,7 +1245,7 @@ class InshotTools:
         add_el = await InshotTools._find_node_by_id(tools, "com.camerasideas.instashot:id/music_use_tv", True)
         bounds = [int(x) for x in add_el.get("bounds", "0,0,0,0").split(',')]
 
-        InshotTools._adb_tap((bounds[0] + bounds[2]) / 2, (bounds[1] + bounds[3]) / 2)
+        await InshotTools._adb_tap((bounds[0] + bounds[2]) / 2, (bounds[1] + bounds[3]) / 2)
 
         confirm_idx = await InshotTools._find_node_by_id(tools, "com.camerasideas.instashot:id/btn_apply")
-        await tools.tap_on_index(confirm_idx)
+        await InshotTools._tap_index(tools, confirm_idx, commit=True)
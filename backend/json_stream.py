@@ -0,0 +1,188 @@
+"""
+JSON Stream - incremental parser for streamed Director responses
+The Director answers with one JSON object (optionally inside a ```json fence). Fed the
+response text chunk by chunk, JsonStreamParser reports each top-level field as soon as
+its value is complete, and each element of a top-level array as soon as that element
+is complete, so the UI (and downstream work such as track downloads) doesn't wait for
+the whole response.
+
+    parser = JsonStreamParser()
+    for chunk in stream:
+        for event in parser.feed(chunk.text):
+            ...
+
+Events are plain dicts:
+    {"kind": "item",  "field": "plan", "index": 0, "value": {...}}   # array element
+    {"kind": "field", "field": "thought_process", "value": "..."}     # full top-level value
+
+repair_json() parses a complete response locally even when it is wrapped in prose or
+truncated, so a stage isn't thrown away over a stray fence or a cut-off final element
+(the element itself is dropped, never half-kept).
+"""
+
+import json
+
+
+class JsonStreamParser:
+    def __init__(self):
+        self.buffer = ""
+        self.pos = 0
+        self.stack = []
+        self.in_string = False
+        self.escape = False
+        self.done = False
+        # Start of the current `"key": value` member of the top-level object
+        self.member_start = None
+        # Key and start of the current element while inside a top-level array
+        self.array_field = None
+        self.item_start = None
+        self.item_index = 0
+
+    def feed(self, text: str) -> list[dict]:
+        """Add a chunk of response text, return the events it completed"""
+        if not text or self.done:
+            return []
+        self.buffer += text
+        events = []
+
+        while self.pos < len(self.buffer):
+            i, c = self.pos, self.buffer[self.pos]
+            self.pos += 1
+
+            if not self.stack:
+                # Skip code fences / prose before the object
+                if c == "{":
+                    self.stack.append(c)
+                    self.member_start = i + 1
+                continue
+
+            if self.in_string:
+                if self.escape:
+                    self.escape = False
+                elif c == "\\":
+                    self.escape = True
+                elif c == '"':
+                    self.in_string = False
+                continue
+
+            if c == '"':
+                self.in_string = True
+            elif c in "{[":
+                self.stack.append(c)
+                if c == "[" and len(self.stack) == 2:
+                    self.array_field = self._member_key(self.buffer[self.member_start:i])
+                    self.item_start = i + 1
+                    self.item_index = 0
+            elif c in "}]":
+                if len(self.stack) == 2 and c == "]" and self.array_field is not None:
+                    self._emit_item(i, events)
+                    self.array_field = None
+                self.stack.pop()
+                if not self.stack:
+                    self._emit_member(i, events)
+                    self.done = True
+                    break
+            elif c == ",":
+                if len(self.stack) == 1:
+                    self._emit_member(i, events)
+                    self.member_start = i + 1
+                elif len(self.stack) == 2 and self.array_field is not None:
+                    self._emit_item(i, events)
+                    self.item_start = i + 1
+        return events
+
+    @staticmethod
+    def _member_key(prefix: str):
+        """Key of a member from its text up to the value, e.g. ' "plan": '"""
+        try:
+            return json.loads(prefix.strip().rstrip(":").strip())
+        except (json.JSONDecodeError, ValueError):
+            return None
+
+    def _emit_member(self, end: int, events: list):
+        segment = self.buffer[self.member_start:end]
+        if not segment.strip():
+            return
+        try:
+            member = json.loads("{" + segment + "}")
+        except json.JSONDecodeError:
+            return
+        for field, value in member.items():
+            events.append({"kind": "field", "field": field, "value": value})
+
+    def _emit_item(self, end: int, events: list):
+        segment = self.buffer[self.item_start:end]
+        if not segment.strip():
+            return
+        try:
+            value = json.loads(segment)
+        except json.JSONDecodeError:
+            return
+        events.append({"kind": "item", "field": self.array_field, "index": self.item_index, "value": value})
+        self.item_index += 1
+
+
+def _closing(stack: list) -> str:
+    return "".join("}" if opener == "{" else "]" for opener in reversed(stack))
+
+
+def _cut_point(stack: list) -> bool:
+    """
+    Whether the text can be cut here: between members of the top-level object or between
+    elements of a top-level array. Anywhere deeper would keep a half-written element
+    (e.g. a plan step whose args lost their second half), so those are never cut points.
+    """
+    return len(stack) == 1 or (len(stack) == 2 and stack[1] == "[")
+
+
+def repair_json(text: str):
+    """
+    Best-effort parse of a near-valid JSON object: code fences and text around the object
+    are ignored, and a truncated object is cut back to its last complete top-level member
+    or array element and closed. A truncated string is never closed, an incomplete element
+    is dropped as a whole. Returns (value, repaired) or (None, False) when nothing usable
+    is left.
+    """
+    start = text.find("{")
+    if start == -1:
+        return None, False
+    body = text[start:]
+
+    try:
+        value, end = json.JSONDecoder().raw_decode(body)
+        return value, bool(body[end:].strip().strip("`").strip())
+    except json.JSONDecodeError:
+        pass
+
+    # Cut points: before each separator and after each element that closes at a cut depth
+    stack, in_string, escape = [], False, False
+    cuts = []
+    for i, c in enumerate(body):
+        if in_string:
+            if escape:
+                escape = False
+            elif c == "\\":
+                escape = True
+            elif c == '"':
+                in_string = False
+            continue
+        if c == '"':
+            in_string = True
+        elif c in "{[":
+            stack.append(c)
+        elif c in "}]" and stack:
+            stack.pop()
+            if not stack:
+                break
+            if _cut_point(stack):
+                cuts.append((i + 1, list(stack)))
+        elif c == "," and _cut_point(stack):
+            cuts.append((i, list(stack)))
+
+    for end, cut_stack in reversed(cuts):
+        candidate = body[:end].rstrip().rstrip(",")
+        try:
+            return json.loads(candidate + _closing(cut_stack)), True
+        except json.JSONDecodeError:
+            continue
+    return None, False
@@ -0,0 +1,83 @@
+"""
+Memo Cache - persistent memoization of Director stage outputs
+Identical planning requests (same image contents, prompt, model and prompt templates)
+can reuse the stage outputs of an earlier run instead of calling Gemini again.
+Entries live in executions/director_memo.sqlite, expire after MEMO_TTL_S and the least
+recently used ones are evicted beyond MEMO_MAX_ENTRIES.
+
+Storing is unconditional; lookups only happen for requests that opt in (reuse=True).
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+from agent_worker import EXECUTIONS_DIR
+
+MEMO_PATH = os.path.join(EXECUTIONS_DIR, "director_memo.sqlite")
+MEMO_TTL_S = int(os.getenv("DIRECTOR_MEMO_TTL_S", str(7 * 24 * 3600)))
+MEMO_MAX_ENTRIES = int(os.getenv("DIRECTOR_MEMO_MAX_ENTRIES", "500"))
+
+_lock = threading.Lock()
+
+
+def memo_key(**inputs) -> str:
+    """Stable key for a stage from all of its inputs (JSON-serializable)"""
+    return hashlib.sha256(json.dumps(inputs, sort_keys=True, default=str).encode()).hexdigest()
+
+
+@contextmanager
+def _connect():
+    """One transaction on the memo database (serialized within the process)"""
+    os.makedirs(EXECUTIONS_DIR, exist_ok=True)
+    with _lock:
+        conn = sqlite3.connect(MEMO_PATH, timeout=10)
+        try:
+            with conn:
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS memo ("
+                    " key TEXT PRIMARY KEY, stage TEXT, value TEXT,"
+                    " created_at REAL, last_used REAL, hits INTEGER DEFAULT 0)"
+                )
+                yield conn
+        finally:
+            conn.close()
+
+
+def get(key: str):
+    """Stored output for key, or None when missing or expired (a hit refreshes its LRU position)"""
+    now = time.time()
+    try:
+        with _connect() as conn:
+            row = conn.execute(
+                "SELECT value FROM memo WHERE key = ? AND created_at > ?", (key, now - MEMO_TTL_S)
+            ).fetchone()
+            if row is None:
+                return None
+            conn.execute("UPDATE memo SET last_used = ?, hits = hits + 1 WHERE key = ?", (now, key))
+            return json.loads(row[0])
+    except (sqlite3.Error, json.JSONDecodeError) as e:
+        print(f"[MEMO] Lookup failed: {e}")
+        return None
+
+
+def put(key: str, stage: str, value: dict):
+    """Store a stage output, then drop expired and least recently used entries"""
+    now = time.time()
+    try:
+        with _connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO memo (key, stage, value, created_at, last_used, hits) VALUES (?, ?, ?, ?, ?, 0)",
+                (key, stage, json.dumps(value), now, now),
+            )
+            conn.execute("DELETE FROM memo WHERE created_at <= ?", (now - MEMO_TTL_S,))
+            conn.execute(
+                "DELETE FROM memo WHERE key NOT IN (SELECT key FROM memo ORDER BY last_used DESC LIMIT ?)",
+                (MEMO_MAX_ENTRIES,),
+            )
+    except sqlite3.Error as e:
+        print(f"[MEMO] Store failed: {e}")
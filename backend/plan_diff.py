@@ -0,0 +1,194 @@
+"""
+Plan Diff - incremental re-execution of an edited plan
+Compares the plan last applied to a project with a new one and works out the
+smallest list of tool calls that turns the open project into the new plan.
+
+Each step is broken into "slots" (one clip's duration, one junction's transition,
+one clip's IN/OUT/COMBO animation, one effect placement, ...):
+    - duration / transition / animation slots are *settable*: re-running the tool
+      overwrites the previous value, so changed slots are simply re-applied
+    - effect / music effect / background music slots are *additive*: there is no tool
+      to remove them, so a removed or changed additive slot forces a full rebuild
+    - effects and music effects sit on time-anchored tracks; a duration change on
+      clip N, or a transition added at junction N (it overlaps clips N and N+1), moves
+      every junction after it, so anchored slots from clip N onward are invalidated
+      (and, being additive, force a full rebuild). Changing the type of an existing
+      transition moves nothing.
+
+applied_all() tells whether a run really applied a plan, so only fully applied plans are
+recorded as the base of the next diff.
+"""
+
+import json
+
+SETTABLE = ("duration", "transition", "animation")
+
+
+def _slots(plan: list[dict]) -> dict:
+    """Flatten plan steps into {slot_key: value}"""
+    slots = {}
+    for i, step in enumerate(plan):
+        tool = step.get("tool")
+        args = step.get("args", {}) or {}
+
+        if tool == "change_duration":
+            slots[("duration", int(args["image_idx"]))] = float(args["duration"])
+        elif tool == "set_durations":
+            for idx, duration in enumerate(args.get("durations", []), start=1):
+                if duration is not None:
+                    slots[("duration", idx)] = float(duration)
+        elif tool == "add_transition":
+            junction = "all" if args.get("all_apply") else int(args["image1_idx"])
+            slots[("transition", junction)] = args.get("transition_type")
+        elif tool == "apply_animation":
+            slots[("animation", int(args["image_idx"]), str(args.get("animation_type", "")).upper())] = args.get("animation_name")
+        elif tool == "apply_animations_batch":
+            for item in args.get("animations_list", []):
+                slots[("animation", int(item["image_idx"]), str(item.get("animation_type", "")).upper())] = item.get("animation_name")
+        elif tool == "apply_effect":
+            slots[("effect", int(args["image_idx"]))] = list(args.get("effects_list", []))
+        elif tool == "apply_effects_batch":
+            for idx, effects in args.get("effects_map", {}).items():
+                slots[("effect", int(idx))] = list(effects)
+        elif tool == "add_music_effects":
+            slots[("music_effect", float(args["start_time"]), args.get("music_name"))] = True
+        elif tool == "add_background_music":
+            slots[("background_music",)] = args
+        else:
+            # Unknown tools are treated as opaque additive steps
+            slots[("step", i, tool)] = json.dumps(args, sort_keys=True)
+    return slots
+
+
+def _durations(slots: dict, base_durations: list[float]) -> list[float]:
+    durations = list(base_durations)
+    for key, value in slots.items():
+        if key[0] == "duration" and 1 <= key[1] <= len(durations):
+            durations[key[1] - 1] = value
+    return durations
+
+
+def _slot_to_step(key, value) -> dict:
+    kind = key[0]
+    if kind == "duration":
+        return {"tool": "change_duration", "args": {"image_idx": key[1], "duration": value}}
+    if kind == "transition":
+        if key[1] == "all":
+            return {"tool": "add_transition", "args": {"image1_idx": 1, "image2_idx": 2, "transition_type": value, "all_apply": True}}
+        return {"tool": "add_transition", "args": {"image1_idx": key[1], "image2_idx": key[1] + 1, "transition_type": value, "all_apply": False}}
+    if kind == "animation":
+        return {"tool": "apply_animation", "args": {"image_idx": key[1], "animation_name": value, "animation_type": key[2]}}
+    if kind == "effect":
+        return {"tool": "apply_effect", "args": {"image_idx": key[1], "effects_list": value}}
+    if kind == "music_effect":
+        return {"tool": "add_music_effects", "args": {"start_time": key[1], "music_name": key[2]}}
+    if kind == "background_music":
+        return {"tool": "add_background_music", "args": value}
+    return None
+
+
+def diff_plans(old_plan: list[dict], new_plan: list[dict], base_durations: list[float]) -> dict:
+    """
+    Diff two plans for a project whose clips start at base_durations (the durations
+    straight after import). Returns:
+        {"mode": "noop" | "incremental" | "full", "steps": [...], "reason": str,
+         "added": [...], "removed": [...], "changed": [...], "invalidated": [...]}
+    "steps" is only meaningful for "incremental". A step whose args can't be read (a
+    missing or non-numeric index, duration or start time) makes the diff "full": the
+    whole plan goes to the agent, as it would without a diff.
+    """
+    result = {
+        "mode": "incremental",
+        "steps": [],
+        "reason": "",
+        "added": [],
+        "removed": [],
+        "changed": [],
+        "invalidated": [],
+    }
+
+    try:
+        old_slots = _slots(old_plan)
+        new_slots = _slots(new_plan)
+    except (KeyError, TypeError, ValueError, AttributeError) as e:
+        result["mode"] = "full"
+        result["reason"] = f"Plan step args can't be diffed ({type(e).__name__}: {e})"
+        return result
+
+    added = [k for k in new_slots if k not in old_slots]
+    removed = [k for k in old_slots if k not in new_slots]
+    changed = [k for k in new_slots if k in old_slots and new_slots[k] != old_slots[k]]
+    result["added"] = [list(k) for k in added]
+    result["removed"] = [list(k) for k in removed]
+    result["changed"] = [list(k) for k in changed]
+
+    if not added and not removed and not changed:
+        result["mode"] = "noop"
+        result["reason"] = "Plan unchanged"
+        return result
+
+    old_durations = _durations(old_slots, base_durations)
+    new_durations = _durations(new_slots, base_durations)
+
+    # Earliest clip whose length changed: every anchored slot from its start onward moves.
+    # A new or removed transition shortens the clips on both sides of its junction.
+    shifts = [i + 1 for i, (a, b) in enumerate(zip(old_durations, new_durations)) if a != b]
+    shifts += [1 if k[1] == "all" else k[1] for k in added + removed if k[0] == "transition"]
+    first_shift = min(shifts) if shifts else None
+    if first_shift is not None:
+        shift_time = sum(old_durations[:first_shift - 1])
+        for key in new_slots:
+            if key in added:
+                continue
+            if (key[0] == "effect" and key[1] >= first_shift) or (key[0] == "music_effect" and key[1] >= shift_time):
+                result["invalidated"].append(list(key))
+
+    blocking = [k for k in removed + changed if k[0] not in SETTABLE]
+    if blocking or result["invalidated"]:
+        result["mode"] = "full"
+        what = blocking[0] if blocking else result["invalidated"][0]
+        result["reason"] = f"'{what[0]}' placements can't be removed in place ({list(what)})"
+        return result
+
+    # Removed settable slots revert to their import-time value where one exists
+    revert = {}
+    for key in removed:
+        if key[0] == "duration":
+            revert[key] = base_durations[key[1] - 1] if key[1] <= len(base_durations) else None
+        else:
+            result["mode"] = "full"
+            result["reason"] = f"Removing a {key[0]} is not supported in place ({list(key)})"
+            return result
+
+    # Durations first (they move junctions), then clip-attached slots, then new placements
+    order = {"duration": 0, "transition": 1, "animation": 2}
+    todo = {**{k: new_slots[k] for k in added + changed}, **revert}
+    for key in sorted(todo, key=lambda k: (order.get(k[0], 3), str(k))):
+        step = _slot_to_step(key, todo[key])
+        if step and todo[key] is not None:
+            result["steps"].append(step)
+
+    result["reason"] = f"{len(result['steps'])} step(s) to apply instead of {len(new_plan)}"
+    return result
+
+
+def applied_all(executed: list[dict], planned: list[dict]) -> bool:
+    """
+    Whether the tool calls that actually succeeded set every slot of the planned steps to
+    its planned value (batch calls count for the single steps they cover). A skipped step
+    or one the agent ran with other args means the project doesn't match the plan.
+    """
+    try:
+        done = _slots(executed)
+        todo = _slots(planned)
+    except (KeyError, TypeError, ValueError, AttributeError):
+        return False
+    # Unknown tools are keyed by their position, so match them on tool and args only
+    done_opaque = {(key[2], value) for key, value in done.items() if key[0] == "step"}
+    for key, value in todo.items():
+        if key[0] == "step":
+            if (key[2], value) not in done_opaque:
+                return False
+        elif key not in done or done[key] != value:
+            return False
+    return True
@@ -0,0 +1,74 @@
+"""
+Startup profiler - measures cold-start cost of the server and the agent subprocess.
+
+Runs each target in a fresh interpreter with `python -X importtime`, reports wall time
+and the slowest imports, and writes the results to import_profile.txt.
+
+Usage:
+    uv run python profile_startup.py            # profile and rewrite import_profile.txt
+    uv run python profile_startup.py --top 40   # show more modules per target
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+PROFILE_PATH = os.path.join(BACKEND_DIR, "import_profile.txt")
+
+# What uvicorn pays on every (re)start, and what each agent job pays before the agent runs
+TARGETS = {
+    "server": "import server",
+    "agent_subprocess": "import agents_functions, droidrun; agents_functions.init_runtime()",
+}
+
+
+def profile_target(name: str, code: str, top: int) -> list[str]:
+    started = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        capture_output=True,
+        text=True,
+        cwd=BACKEND_DIR
+    )
+    wall_ms = (time.perf_counter() - started) * 1000
+
+    # importtime lines look like: "import time:       412 |      10536 | google.genai"
+    imports = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        parts = [p.strip() for p in line[len("import time:"):].split("|")]
+        if len(parts) == 3:
+            imports.append((int(parts[1]), int(parts[0]), parts[2]))
+
+    report = [f"== {name}: `{code}`", f"wall time: {wall_ms:.0f} ms (exit code {result.returncode})"]
+    if result.returncode != 0:
+        report.append(result.stderr.strip().splitlines()[-1] if result.stderr.strip() else "no output")
+    report.append(f"{'cumulative ms':>14} {'self ms':>9}  module")
+    for cumulative, self_us, module in sorted(imports, reverse=True)[:top]:
+        report.append(f"{cumulative / 1000:>14.1f} {self_us / 1000:>9.1f}  {module}")
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Profile server and agent startup imports")
+    parser.add_argument("--top", type=int, default=25, help="Modules to list per target")
+    args = parser.parse_args()
+
+    lines = [f"# Import-time profile (python {sys.version.split()[0]}, {sys.platform})", ""]
+    for name, code in TARGETS.items():
+        lines.extend(profile_target(name, code, args.top))
+        lines.append("")
+
+    output = "\n".join(lines)
+    print(output)
+    with open(PROFILE_PATH, "w") as f:
+        f.write(output)
+    print(f"Saved to {PROFILE_PATH}")
+
+
+if __name__ == "__main__":
+    main()
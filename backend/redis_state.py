@@ -1,21 +1,34 @@
-import redis
 import json
 import os
 
 class RedisState:
     def __init__(self, session_id="hackathon_demo", host='localhost', port=6379):
-        # Connect to Redis
-        try:
-            self.r = redis.Redis(host=host, port=port, decode_responses=True)
-            self.r.ping() # Check connection
-            print(f"Connected to Redis Brain! (Session: {session_id})")
-        except redis.ConnectionError as e:
-            print(f"Redis not found! Falling back to local memory (Logic will be brittle). {e}")
-            self.r = None
-            self.local_store = {}
+        # Redis is connected lazily on first access (see the `r` property)
+        self.host = host
+        self.port = port
+        self._r = None
+        self._connected = False
+        # Fallback when Redis is down; keyed like Redis so sessions in one (warm) process stay apart
+        self.local_store = {}
 
         self.session_id = session_id
 
+    @property
+    def r(self):
+        """Redis client, connected on first use. None when falling back to local memory."""
+        if not self._connected:
+            import redis
+
+            self._connected = True
+            try:
+                client = redis.Redis(host=self.host, port=self.port, decode_responses=True)
+                client.ping() # Check connection
+                self._r = client
+                print(f"Connected to Redis Brain! (Session: {self.session_id})")
+            except redis.ConnectionError as e:
+                print(f"Redis not found! Falling back to local memory (Logic will be brittle). {e}")
+        return self._r
+
     def _get_key(self, key):
         return f"droidrun:{self.session_id}:{key}"
 
@@ -32,7 +45,7 @@ class RedisState:
         if self.r:
             self.r.set(full_key, payload)
         else:
-            self.local_store[key] = payload
+            self.local_store[full_key] = payload
 
     def get(self, key, default=None):
         """Retrieves data. Auto-decodes JSON."""
@@ -41,7 +54,7 @@ class RedisState:
         if self.r:
             val = self.r.get(full_key)
         else:
-            val = self.local_store.get(key)
+            val = self.local_store.get(full_key)
             
         if val is None:
             return default
@@ -65,8 +78,10 @@ class RedisState:
             if keys:
                 self.r.delete(*keys)
         else:
-            self.local_store.clear()
+            prefix = self._get_key("")
+            for key in [k for k in self.local_store if k.startswith(prefix)]:
+                del self.local_store[key]
 
 # Create a singleton instance for your app
-# You can import 'global_state' in any file now
-global_state = RedisState()
\ No newline at end of file
+# You can import 'global_state' in any file now (no connection is made until first use)
+global_state = RedisState()
@@ -8,6 +8,7 @@ from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 from fastapi.responses import FileResponse
 import time
+import math
 import asyncio
 import subprocess
 import uuid
@@ -15,10 +16,13 @@ import os
 import json
 import shutil
 from typing import List, Optional
+from concurrent.futures import ThreadPoolExecutor
 from contextlib import asynccontextmanager
 
 # Import VideoDirector (assuming it's in same directory or adjust path)
-from director import VideoDirector
+from director import MUSIC_MODES, VideoDirector
+from image_prep import shutdown_pool as shutdown_prep_pool
+from budget import POLICIES, cache_storage_cost, call_costs, policy_summary, record_run
 
 # Import agent functions for execution
 from agents_functions import (
@@ -29,22 +33,41 @@ from agents_functions import (
     REMOTE_ALBUM_PATH
 )
 
+# Warm DroidRun workers for select/edit jobs (set AGENT_WORKER_MODE=cold for one subprocess per job)
+from draft_snapshots import clear_applied_plan, drop_checkpoint, get_applied_plan, get_checkpoint, image_set_key
+from plan_diff import diff_plans
+from step_timings import CANONICAL_TOOL, estimate_plan, work_units
+from agent_worker import AgentWorkerPool, AGENT_READY_MARKER, BACKEND_DIR, agent_env, parse_event, session_dir
+
+AGENT_WORKER_MODE = os.getenv("AGENT_WORKER_MODE", "warm")
+agent_pool = AgentWorkerPool(size=int(os.getenv("AGENT_WORKER_POOL_SIZE", "1")))
+
+# Music candidates are downloaded concurrently (yt-dlp search + download + mp3 postprocess)
+MUSIC_DOWNLOAD_WORKERS = int(os.getenv("MUSIC_DOWNLOAD_WORKERS", "4"))
+MUSIC_DOWNLOAD_TIMEOUT_S = float(os.getenv("MUSIC_DOWNLOAD_TIMEOUT_S", "120"))
+# Extra wait past a track's own deadline before the server stops waiting for its thread
+MUSIC_DOWNLOAD_GRACE_S = 15
+music_download_pool = ThreadPoolExecutor(max_workers=MUSIC_DOWNLOAD_WORKERS, thread_name_prefix="music-dl")
+
+# Stream Director responses: partial-plan events reach the client (and track downloads
+# start) as soon as each field / step / track is complete. Set to 0 for one-shot responses.
+DIRECTOR_STREAM = os.getenv("DIRECTOR_STREAM", "1") != "0"
+
 # Store active sessions
 sessions: dict = {}
 
-# Gemini 2.5 Pro Pricing (Paid Tier, per 1M tokens in USD)
-# For prompts <= 200k tokens
-GEMINI_PRICING = {
-    "input_per_million": 1.25,    # $1.25 per 1M input tokens
-    "output_per_million": 10.00,  # $10.00 per 1M output tokens (including thinking)
-}
-
-def calculate_pricing(usage_list: list) -> dict:
-    """Calculate estimated cost from usage data"""
+def calculate_pricing(usage_list: list, cache_info: Optional[dict] = None) -> dict:
+    """
+    Calculate cost from usage data (and the Director's context cache, if any). Each call is
+    priced for the model it ran on and its prompt-size tier (see budget.MODEL_PRICING).
+    """
     total_input = 0
     total_output = 0
     total_thinking = 0
     total_cached = 0
+    input_cost = 0.0
+    output_cost = 0.0
+    uncached_input_cost = 0.0
     
     for usage in usage_list:
         if usage:
@@ -53,12 +76,18 @@ def calculate_pricing(usage_list: list) -> dict:
             total_output += usage.get("candidates_tokens", 0)
             total_thinking += usage.get("thinking_tokens", 0)
             total_cached += usage.get("cached_tokens", 0)
+            costs = call_costs(usage)
+            input_cost += costs["input"]
+            output_cost += costs["output"]
+            uncached_input_cost += costs["input_uncached"]
     
     # All output (candidates + thinking) charged at output rate
     total_output_all = total_output + total_thinking
     
-    input_cost = (total_input / 1_000_000) * GEMINI_PRICING["input_per_million"]
-    output_cost = (total_output_all / 1_000_000) * GEMINI_PRICING["output_per_million"]
+    # Storage is billed for as long as the cache lives (the session deletes it when planning ends)
+    storage_cost = cache_storage_cost(cache_info)
+    saved = uncached_input_cost - input_cost
+    total_cost = input_cost + output_cost + storage_cost
     
     return {
         "total_input_tokens": total_input,
@@ -67,12 +96,14 @@ def calculate_pricing(usage_list: list) -> dict:
         "total_cached_tokens": total_cached,
         "total_tokens": total_input + total_output_all,
         "input_cost_usd": round(input_cost, 6),
+        "cache_storage_cost_usd": round(storage_cost, 6),
+        "cache_savings_usd": round(saved - storage_cost, 6),
         "output_cost_usd": round(output_cost, 6),
-        "total_cost_usd": round(input_cost + output_cost, 6),
+        "total_cost_usd": round(total_cost, 6),
     }
 
 # Audio utilities
-def get_audio_duration(file_path: str) -> Optional[float]:
+def get_audio_duration(file_path: str, timeout: float = 30) -> Optional[float]:
     """Get audio duration in seconds using ffprobe"""
     try:
         result = subprocess.run(
@@ -83,7 +114,8 @@ def get_audio_duration(file_path: str) -> Optional[float]:
                 file_path
             ],
             capture_output=True,
-            text=True
+            text=True,
+            timeout=timeout
         )
         return float(result.stdout.strip())
     except Exception as e:
@@ -120,9 +152,15 @@ async def lifespan(app: FastAPI):
     os.makedirs("temp_uploads", exist_ok=True)
     os.makedirs("downloads", exist_ok=True)
     os.makedirs("trimmed_audio", exist_ok=True)
+    if AGENT_WORKER_MODE == "warm":
+        # Workers warm up in the background; the server is ready without waiting for them
+        await agent_pool.start()
     yield
     # Shutdown: temp_uploads preserved for editing phase
     # Files are cleaned up manually or via session cleanup
+    await agent_pool.shutdown()
+    music_download_pool.shutdown(wait=False, cancel_futures=True)
+    shutdown_prep_pool()
 
 app = FastAPI(
     title="DroidRun Studio API",
@@ -147,18 +185,31 @@ app.add_middleware(
 class PlanningSession:
     """Manages a single planning session with WebSocket updates"""
     
-    def __init__(self, session_id: str, image_paths: List[str], prompt: str):
+    def __init__(self, session_id: str, image_paths: List[str], prompt: str, reuse: bool = False,
+                 budget_policy: Optional[str] = None, max_cost_usd: Optional[float] = None,
+                 music_mode: Optional[str] = None):
         self.session_id = session_id
         self.image_paths = image_paths
         self.prompt = prompt
+        # Reuse memoized Director stage outputs of identical earlier requests
+        self.reuse = reuse
+        # Director model tiering / cost ceiling (None = server defaults, see budget.py)
+        self.budget_policy = budget_policy
+        self.max_cost_usd = max_cost_usd
+        self.music_mode = music_mode
         self.websocket: WebSocket = None
         self.director: VideoDirector = None
+        self.output_dir = os.path.join("temp_uploads", session_id)  # Session-specific plan files
         self.downloads_dir = os.path.join("downloads", session_id)  # Session-specific
         self.results = {
             "visual_plan": None,
             "music_plan": None,
             "full_plan": None
         }
+        # Track index (1-based) -> download task, started as tracks stream in
+        self.download_tasks = {}
+        # Bumped when a music stage re-run voids the tracks streamed so far
+        self.download_round = 0
     
     async def send_message(self, msg_type: str, data=None, progress=None, message=None):
         """Send WebSocket message to client"""
@@ -175,22 +226,101 @@ class PlanningSession:
             except Exception as e:
                 print(f"Failed to send WS message: {e}")
     
+    async def download_track(self, idx: int, track: dict):
+        """
+        Download one suggested track and probe its duration on the download pool.
+        Never raises: returns (idx, track, audio_path | None, duration | None, error | None).
+        """
+        loop = asyncio.get_running_loop()
+        # A voided round's download can't be stopped mid-thread, so later rounds write elsewhere
+        output_dir = self.downloads_dir
+        if self.download_round:
+            output_dir = os.path.join(self.downloads_dir, f"retry_{self.download_round}")
+
+        picked_up = loop.create_future()
+
+        def download_and_probe():
+            # The track's time starts now, not while it waited for a worker behind other sessions' tracks
+            loop.call_soon_threadsafe(lambda: picked_up.done() or picked_up.set_result(None))
+            deadline = time.monotonic() + MUSIC_DOWNLOAD_TIMEOUT_S
+            path = VideoDirector.download_audio(idx, track["track_name"], track["artist_name"], output_dir, deadline)
+            if not path or not os.path.exists(path):
+                raise TimeoutError() if time.monotonic() > deadline else RuntimeError("download failed")
+            return path, get_audio_duration(path, timeout=max(1, deadline - time.monotonic()))
+
+        job = loop.run_in_executor(music_download_pool, download_and_probe)
+        try:
+            await asyncio.wait({job, picked_up}, return_when=asyncio.FIRST_COMPLETED)
+            # The thread stops itself at its deadline; this only guards against a stuck postprocessor
+            audio_path, duration = await asyncio.wait_for(job, timeout=MUSIC_DOWNLOAD_TIMEOUT_S + MUSIC_DOWNLOAD_GRACE_S)
+            return idx, track, audio_path, duration, None
+        except asyncio.CancelledError:
+            # Still queued: never start it
+            job.cancel()
+            raise
+        except asyncio.TimeoutError:
+            print(f"Download timed out for track {idx} after {MUSIC_DOWNLOAD_TIMEOUT_S}s")
+            return idx, track, None, None, "timed out"
+        except Exception as e:
+            print(f"Download failed for track {idx}: {e}")
+            return idx, track, None, None, str(e)
+    
+    def start_download(self, idx: int, track: dict) -> asyncio.Task:
+        """Start downloading a track unless it is already under way (must run on the event loop)"""
+        if idx not in self.download_tasks:
+            self.download_tasks[idx] = asyncio.ensure_future(self.download_track(idx, track))
+        return self.download_tasks[idx]
+    
+    def reset_downloads(self):
+        """Cancel the downloads of tracks a failed music stage attempt streamed"""
+        for task in self.download_tasks.values():
+            task.cancel()
+        self.download_tasks.clear()
+        self.download_round += 1
+    
+    def stream_handler(self, stage: str):
+        """
+        on_event callback for a streamed Director stage (called on the event loop): each event
+        is sent as a "plan_partial" message and streamed music tracks start downloading right away.
+        A "reset" event (the stage is being re-run) voids what was streamed and downloaded so far.
+        """
+        if not DIRECTOR_STREAM:
+            return None
+
+        def on_event(event):
+            data = {"stage": stage, **event}
+            asyncio.ensure_future(self.send_message("plan_partial", data=data))
+            if stage == "music_plan" and event["kind"] == "reset":
+                self.reset_downloads()
+            if stage == "music_plan" and event["kind"] == "item" and event["field"] == "tracks":
+                track = event["value"]
+                if isinstance(track, dict) and track.get("track_name") and track.get("artist_name"):
+                    self.start_download(event["index"] + 1, track)
+
+        return on_event
+    
     async def run_planning(self):
         """Execute the full planning pipeline with progress updates"""
         try:
             # Initialize director
             await self.send_message("planning_started", message="Initializing AI Director...")
-            self.director = VideoDirector(self.image_paths)
+            self.director = VideoDirector(
+                self.image_paths,
+                output_dir=self.output_dir,
+                reuse=self.reuse,
+                policy=self.budget_policy,
+                max_cost_usd=self.max_cost_usd,
+                music_mode=self.music_mode
+            )
             
             # Step 1: Generate Visual Plan
             await self.send_message("visual_plan_started", message="Generating visual editing plan...")
             
-            # Run in executor to not block event loop
+            # Director calls are native async (bounded by GEMINI_MAX_CONCURRENCY); ffmpeg work still runs in executors
             loop = asyncio.get_running_loop()
-            visual_plan = await loop.run_in_executor(
-                None, 
-                self.director.generate_initial_plan, 
-                self.prompt
+            visual_plan = await self.director.generate_initial_plan(
+                self.prompt,
+                self.stream_handler("visual_plan")
             )
             
             if visual_plan:
@@ -203,11 +333,15 @@ class PlanningSession:
             # Step 2: Generate Music Plan
             await self.send_message("music_plan_started", message="Finding music tracks...")
             
-            music_plan = await loop.run_in_executor(
-                None,
-                self.director.generate_music_content,
+            # Create session-specific downloads folder (streamed tracks start downloading into it)
+            if os.path.exists(self.downloads_dir):
+                shutil.rmtree(self.downloads_dir)
+            os.makedirs(self.downloads_dir, exist_ok=True)
+            
+            music_plan = await self.director.generate_music_content(
                 self.prompt,
-                visual_plan
+                visual_plan,
+                self.stream_handler("music_plan")
             )
             
             if music_plan:
@@ -220,11 +354,6 @@ class PlanningSession:
             # Step 3: Download Music Tracks
             await self.send_message("downloading_music", progress=0, message="Starting downloads...")
             
-            # Create session-specific downloads folder
-            if os.path.exists(self.downloads_dir):
-                shutil.rmtree(self.downloads_dir)
-            os.makedirs(self.downloads_dir, exist_ok=True)
-            
             # Check if there are tracks to download
             if not music_plan.get("tracks") or len(music_plan["tracks"]) == 0:
                 await self.send_message("error", message="No music tracks found")
@@ -232,35 +361,29 @@ class PlanningSession:
             
             total_tracks = len(music_plan["tracks"])
             track_durations = {}  # Store durations for each track
+            downloaded_paths = []
             
-            for i, track in enumerate(music_plan["tracks"]):
-                progress = int((i / total_tracks) * 100)
+            await self.send_message(
+                "download_progress",
+                progress=0,
+                message=f"Downloading {total_tracks} tracks ({min(total_tracks, MUSIC_DOWNLOAD_WORKERS)} at a time)..."
+            )
+            
+            # Download + probe every candidate concurrently (streamed ones are already
+            # under way), report each as it finishes
+            tasks = [self.start_download(i + 1, track) for i, track in enumerate(music_plan["tracks"])]
+            for done, next_track in enumerate(asyncio.as_completed(tasks), start=1):
+                idx, track, audio_path, duration, error = await next_track
+                if audio_path:
+                    downloaded_paths.append(audio_path)
+                    track_durations[os.path.basename(audio_path)] = duration
                 await self.send_message(
-                    "download_progress", 
-                    progress=progress, 
-                    message=f"Downloading: {track['track_name']} by {track['artist_name']}"
+                    "download_progress",
+                    progress=int((done / total_tracks) * 100),
+                    message=(f"Downloaded: {track['track_name']} by {track['artist_name']}" if audio_path
+                             else f"Skipped: {track['track_name']} by {track['artist_name']} ({error})"),
+                    data={"track": idx, "ok": bool(audio_path), "duration": duration, "error": error}
                 )
-                
-                # Download in executor with session-specific folder
-                try:
-                    await loop.run_in_executor(
-                        None,
-                        VideoDirector.download_audio,
-                        i + 1,
-                        track["track_name"],
-                        track["artist_name"],
-                        self.downloads_dir
-                    )
-                    
-                    # Get duration of downloaded track
-                    audio_path = os.path.join(self.downloads_dir, f"audio_{i+1}.mp3")
-                    if os.path.exists(audio_path):
-                        duration = await loop.run_in_executor(None, get_audio_duration, audio_path)
-                        track_durations[f"audio_{i+1}.mp3"] = duration
-                        
-                except Exception as e:
-                    print(f"Download failed for track {i+1}: {e}")
-                    # Continue with remaining tracks
             
             await self.send_message("download_progress", progress=100, message="Downloads complete!")
             
@@ -271,19 +394,18 @@ class PlanningSession:
             # Step 4: Generate Final Plan with Music Infusion
             await self.send_message("final_plan_started", message="Analyzing tracks and syncing...")
             
-            audio_files = os.listdir(self.downloads_dir) if os.path.exists(self.downloads_dir) else []
-            audio_paths = [os.path.join(self.downloads_dir, f) for f in audio_files if f.endswith('.mp3')]
+            # Only tracks that finished (a timed-out download may still be writing its file)
+            audio_paths = sorted(downloaded_paths)
             
             if not audio_paths:
                 await self.send_message("error", message="No audio files downloaded")
                 return
             
-            full_plan = await loop.run_in_executor(
-                None,
-                self.director.decide_music_infusion,
+            full_plan = await self.director.decide_music_infusion(
                 visual_plan,
                 audio_paths,
-                visual_plan.get("music_thoughts", "")
+                visual_plan.get("music_thoughts", ""),
+                self.stream_handler("full_plan")
             )
             
             if full_plan:
@@ -352,7 +474,24 @@ class PlanningSession:
             
             # Calculate aggregate pricing
             usage_list = [v for v in usage_breakdown.values() if v]
-            pricing = calculate_pricing(usage_list)
+            pricing = calculate_pricing(usage_list, self.director.cache_info)
+            # Model, thinking budget, estimate and actual cost / latency of each stage
+            usage_breakdown["budget"] = self.director.budget.report()
+            record_run(
+                usage_breakdown["budget"],
+                pricing["total_cost_usd"],
+                sum((u or {}).get("latency_ms") or 0 for u in usage_list)
+            )
+            # Stages answered from the memo cache (no Gemini call, no cost)
+            usage_breakdown["memo_hits"] = [
+                stage for stage, usage in usage_breakdown.items() if usage and usage.get("memo_hit")
+            ]
+            # Cache creation (one-off upload of the images into the cache) vs tokens it saved
+            usage_breakdown["context_cache"] = self.director.cache_info
+            # Image downscaling before upload (bytes and estimated image tokens per call saved)
+            usage_breakdown["image_prep"] = self.director.prep_report
+            # Local tempo / beat / energy analysis of the candidate tracks (summary and fast music modes)
+            usage_breakdown["music_analysis"] = self.director.music_analysis
             
             await self.send_message("planning_complete", data={
                 "visual_plan": self.results["visual_plan"],
@@ -366,6 +505,12 @@ class PlanningSession:
         except Exception as e:
             print(f"Planning error: {e}")
             await self.send_message("error", message=str(e))
+        finally:
+            # Downloads started from a stream whose plan then failed
+            for task in self.download_tasks.values():
+                task.cancel()
+            if self.director:
+                await self.director.close()
 
 
 @app.post("/plan")
@@ -383,6 +528,26 @@ async def start_planning(request: Request):
     if not prompt:
         return {"error": "No prompt provided"}
     
+    # Opt-in: answer identical requests from the Director memo cache
+    reuse = str(form.get("reuse", "")).lower() in ("1", "true", "yes")
+    
+    # Optional Director budget: model tiering policy and a cost ceiling for this session
+    budget_policy = form.get("budget_policy") or None
+    if budget_policy and budget_policy not in POLICIES:
+        return {"error": f"Unknown budget_policy '{budget_policy}' (expected one of {list(POLICIES)})"}
+    try:
+        max_cost_usd = float(form["max_cost_usd"]) if form.get("max_cost_usd") else None
+    except ValueError:
+        return {"error": "max_cost_usd must be a number"}
+    # nan would make every ceiling comparison False, a negative ceiling fails every stage
+    if max_cost_usd is not None and not (math.isfinite(max_cost_usd) and max_cost_usd >= 0):
+        return {"error": "max_cost_usd must be a finite number >= 0 (0 = no ceiling)"}
+    
+    # Optional: how the final stage hears the candidate tracks (audio | summary | fast)
+    music_mode = form.get("music_mode") or None
+    if music_mode and music_mode not in MUSIC_MODES:
+        return {"error": f"Unknown music_mode '{music_mode}' (expected one of {list(MUSIC_MODES)})"}
+    
     # Collect all uploaded images dynamically
     uploaded_images = []
     i = 0
@@ -414,7 +579,11 @@ async def start_planning(request: Request):
         image_paths.append(file_path)
     
     # Create session
-    session = PlanningSession(session_id, image_paths, prompt)
+    session = PlanningSession(
+        session_id, image_paths, prompt,
+        reuse=reuse, budget_policy=budget_policy, max_cost_usd=max_cost_usd,
+        music_mode=music_mode
+    )
     sessions[session_id] = session
     
     return {
@@ -481,6 +650,11 @@ class ExecutionSession:
         self.audio_track_name = audio_track_name or "audio_1"
         self.websocket: WebSocket = None
         self.is_running = False  # Lock to prevent duplicate executions
+        self.startup_overhead_ms = {}  # Per-job agent startup overhead (select/edit)
+        self.plan_diff = None  # Diff against the last applied plan, when re-running on the same photos
+        self.estimate = None  # Predicted wall time (see step_timings.estimate_plan), set by prepare()
+        self.prepared = False  # prepare() ran for /execute and its steps are what the next run executes
+        self.step_args = {}  # Args of in-flight tool steps, by step number
     
     async def send_message(self, msg_type: str, data=None, progress=None, message=None):
         """Send WebSocket message to client"""
@@ -497,6 +671,176 @@ class ExecutionSession:
             except Exception as e:
                 print(f"Failed to send WS message: {e}")
     
+    async def run_agent_job(self, mode: str) -> int:
+        """
+        Run a select/edit job on a warm worker (or a cold subprocess) and
+        stream its output to the frontend. Returns the job exit code.
+        """
+        submitted = time.perf_counter()
+        startup = {"ms": None}
+
+        async def on_line(decoded_line: str):
+            if decoded_line.startswith(AGENT_READY_MARKER) and startup["ms"] is None:
+                startup["ms"] = (time.perf_counter() - submitted) * 1000
+                print(f"[TIMING] {mode} job startup overhead ({AGENT_WORKER_MODE}): {startup['ms']:.0f} ms")
+            print(decoded_line)
+            event = parse_event(decoded_line)
+            if event:
+                await self.on_step_event(event)
+                # Forward structured step events as-is (step_start / step_end / step_error)
+                await self.send_message(event.pop("type"), data=event)
+            else:
+                await self.send_message("agent_log", message=decoded_line)
+
+        if AGENT_WORKER_MODE == "warm":
+            job = {"job_id": f"{self.session_id}:{mode}", "mode": mode, "session_id": self.session_id}
+            returncode = await agent_pool.run_job(job, on_line)
+        else:
+            # Run agents_functions.py with the given mode via subprocess
+            process = await asyncio.create_subprocess_exec(
+                "uv", "run", "python", "agents_functions.py", mode, self.session_id,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.STDOUT,
+                cwd=BACKEND_DIR,
+                env=agent_env()
+            )
+            
+            # Stream output to frontend
+            while True:
+                line = await process.stdout.readline()
+                if not line:
+                    break
+                decoded_line = line.decode().strip()
+                if decoded_line:
+                    await on_line(decoded_line)
+            
+            await process.wait()
+            returncode = process.returncode
+
+        self.startup_overhead_ms[mode] = round(startup["ms"]) if startup["ms"] is not None else None
+        return returncode
+    
+    def write_session_info(self, draft_key: str, draft_mode: str):
+        """
+        Job metadata for the agent worker (executions/<session_id>/session.json).
+        draft_mode: "none" (import from scratch), "checkpoint" (copy of the calibrated
+        draft) or "resume" (last edited copy, incremental plan)
+        """
+        info = {
+            "num_images": len(self.image_paths),
+            "image_set_key": draft_key,
+            "draft": draft_mode
+        }
+        with open(os.path.join(session_dir(self.session_id), "session.json"), "w") as f:
+            json.dump(info, f, indent=4)
+    
+    def build_plan(self) -> list:
+        """Visual plan steps plus the background music step (if we have audio)"""
+        steps = list(self.visual_plan.get("plan", []))
+        if self.audio_path:
+            # Extract just the filename from audio_path (e.g., "xxx_trimmed.mp3")
+            audio_filename = os.path.basename(self.audio_path)
+            # Remove .mp3 extension for InShot search
+            track_name = audio_filename.replace('.mp3', '')
+            steps.append({
+                "tool": "add_background_music",
+                "args": {"track_name": track_name}
+            })
+        return steps
+    
+    def prepare(self):
+        """
+        Work out what this execution will actually run (blocking: hashes the images):
+        draft mode, the steps left after diffing against the last applied plan, and
+        the time estimate.
+        """
+        self.draft_key = image_set_key(self.image_paths)
+        self.checkpoint = get_checkpoint(self.draft_key)
+        self.full_plan = self.build_plan()
+        self.steps_to_run = self.full_plan
+        self.draft_mode = "checkpoint" if self.checkpoint else "none"
+        self.plan_diff = None
+
+        applied = get_applied_plan(self.draft_key) if self.checkpoint else None
+        if applied:
+            self.plan_diff = diff_plans(applied["plan"], self.full_plan, self.checkpoint["state"].get("raw_image_duration") or [])
+            if self.plan_diff["mode"] == "noop":
+                self.steps_to_run = []
+            elif self.plan_diff["mode"] == "incremental":
+                self.draft_mode = "resume"
+                self.steps_to_run = self.plan_diff["steps"]
+
+        self.started_at = time.perf_counter()
+        self.prepared = True
+        return self.set_steps(self.steps_to_run, self.draft_mode)
+    
+    def set_steps(self, steps: list, draft_mode: str):
+        """Switch to a (new) list of steps to run and re-estimate it"""
+        self.steps_to_run = steps
+        self.draft_mode = draft_mode
+        self.estimate = estimate_plan(steps, draft_mode) if steps else None
+        self.remaining_units = {}
+        for step in steps:
+            tool = CANONICAL_TOOL.get(step.get("tool"), step.get("tool"))
+            self.remaining_units[tool] = self.remaining_units.get(tool, 0) + work_units(step.get("tool"), step.get("args", {}) or {})
+        self.total_units = sum(self.remaining_units.values())
+        self.setup_done = False
+        return self.estimate
+    
+    def remaining_seconds(self) -> float:
+        """Time left according to the estimate, given the work reported done so far"""
+        if not self.estimate:
+            return 0
+        remaining = sum(max(0, units) * self.estimate["unit_s"].get(tool, 0) for tool, units in self.remaining_units.items())
+        units_left = sum(max(0, units) for units in self.remaining_units.values())
+        if self.total_units:
+            remaining += self.estimate["overhead_s"] * units_left / self.total_units
+        if not self.setup_done:
+            remaining += self.estimate["setup_s"]
+        return round(remaining, 1)
+    
+    async def send_estimate(self):
+        """Live ETA for the execution stream"""
+        if not self.estimate:
+            return
+        elapsed = time.perf_counter() - self.started_at
+        remaining = self.remaining_seconds()
+        await self.send_message("estimate_update", data={
+            "estimated_total_s": self.estimate["total_s"],
+            "elapsed_s": round(elapsed, 1),
+            "remaining_s": remaining,
+            "projected_total_s": round(elapsed + remaining, 1)
+        })
+    
+    async def on_step_event(self, event: dict):
+        """Count finished tool work against the estimate and push an update"""
+        if event.get("type") == "step_start":
+            self.step_args[event.get("step")] = event.get("args", {})
+            return
+        if event.get("type") not in ("step_end", "step_error") or not self.estimate:
+            return
+        tool = event.get("tool")
+        args = self.step_args.pop(event.get("step"), {})
+        canonical = CANONICAL_TOOL.get(tool, tool)
+        if canonical in self.remaining_units:
+            self.remaining_units[canonical] -= work_units(tool, args)
+        await self.send_estimate()
+    
+    async def upload_images(self):
+        """Push the session images to the phone's droidrun album"""
+        await self.send_message("uploading_images", progress=0, message="Uploading images to phone...")
+        
+        loop = asyncio.get_running_loop()
+        
+        # Run process_files in executor (it's synchronous)
+        def sync_process_files():
+            def status_callback(msg, prog, is_error=False, is_success=False, current_image=None):
+                print(f"Upload: {msg} ({prog}%)")
+            process_files(self.image_paths, status_callback)
+        
+        await loop.run_in_executor(None, sync_process_files)
+        await self.send_message("uploading_images", progress=100, message="Images uploaded!")
+    
     async def run_execution(self):
         """Execute the full editing pipeline on connected device"""
         try:
@@ -510,28 +854,44 @@ class ExecutionSession:
             
             await self.send_message("device_connected", message=device_msg)
             
-            # Step 2: Upload images to phone
-            await self.send_message("uploading_images", progress=0, message="Uploading images to phone...")
-            
+            # Step 2: Upload images to phone (skipped when a draft checkpoint exists for these photos)
             loop = asyncio.get_running_loop()
-            
-            # Create a callback for progress updates
-            upload_progress = {"current": 0}
-            async def update_upload_progress(msg, prog, is_error=False, is_success=False, current_image=None):
-                if is_error:
-                    await self.send_message("error", message=msg)
+            # Reuse what /execute prepared, so the estimate the client got describes the steps that run
+            if not self.prepared:
+                await loop.run_in_executor(None, self.prepare)
+            self.prepared = False
+            self.started_at = time.perf_counter()
+            draft_key, checkpoint, diff = self.draft_key, self.checkpoint, self.plan_diff
+            full_plan, steps_to_run, draft_mode = self.full_plan, self.steps_to_run, self.draft_mode
+            await self.send_estimate()
+
+            # Re-run of an edited plan on the same photos: apply only the difference
+            if diff:
+                await self.send_message("plan_diff", data=diff, message=diff["reason"])
+                if diff["mode"] == "noop":
+                    await self.send_message("agent_log", message="✅ Plan unchanged since the last run, nothing to execute")
+                    await self.send_message("execution_complete", data={
+                        "success": True,
+                        "num_images": len(self.image_paths),
+                        "plan_steps": 0,
+                        "audio_added": bool(self.audio_path),
+                        "plan_diff": diff
+                    })
+                    return
+                if diff["mode"] == "incremental":
+                    await self.send_message("agent_log", message=f"♻️ Incremental re-run: {diff['reason']}")
                 else:
-                    upload_progress["current"] = prog
-                    await self.send_message("uploading_images", progress=prog, message=msg)
-            
-            # Run process_files in executor (it's synchronous)
-            def sync_process_files():
-                def status_callback(msg, prog, is_error=False, is_success=False, current_image=None):
-                    print(f"Upload: {msg} ({prog}%)")
-                process_files(self.image_paths, status_callback)
-            
-            await loop.run_in_executor(None, sync_process_files)
-            await self.send_message("uploading_images", progress=100, message="Images uploaded!")
+                    await self.send_message("agent_log", message=f"🔁 Full re-run from checkpoint: {diff['reason']}")
+
+            # A failed run must never be resumed, so the record is rewritten only on success
+            clear_applied_plan(draft_key)
+            self.write_session_info(draft_key, draft_mode)
+
+            if checkpoint:
+                await self.send_message("agent_log", message=f"♻️ Reusing InShot draft checkpoint for this image set ({draft_key})")
+                await self.send_message("uploading_images", progress=100, message="Images already in InShot draft!")
+            else:
+                await self.upload_images()
             
             # Step 3: Upload audio to phone (if available)
             if self.audio_path and os.path.exists(self.audio_path):
@@ -553,36 +913,35 @@ class ExecutionSession:
             await self.send_message("agent_log", message="🚀 Starting DroidRun agent for image selection")
             
             try:
-                # Run agents_functions.py with 'select' mode via subprocess
-                # Set PYTHONIOENCODING=utf-8 to support emoji output on Windows
-                env = os.environ.copy()
-                env["PYTHONIOENCODING"] = "utf-8"
-                
-                process = await asyncio.create_subprocess_exec(
-                    "uv", "run", "python", "agents_functions.py", "select",
-                    stdout=asyncio.subprocess.PIPE,
-                    stderr=asyncio.subprocess.STDOUT,
-                    cwd=os.path.dirname(os.path.abspath(__file__)),
-                    env=env
-                )
+                returncode = await self.run_agent_job("select")
                 
-                # Stream output to frontend
-                while True:
-                    line = await process.stdout.readline()
-                    if not line:
-                        break
-                    decoded_line = line.decode().strip()
-                    if decoded_line:
-                        print(decoded_line)
-                        await self.send_message("agent_log", message=decoded_line)
+                if returncode != 0 and draft_mode == "resume":
+                    # Last edited copy is gone: start over from a copy of the checkpoint
+                    await self.send_message("agent_log", message="⚠️ Edited draft not found, re-running the full plan from the checkpoint")
+                    draft_mode, steps_to_run = "checkpoint", full_plan
+                    self.set_steps(steps_to_run, draft_mode)
+                    await self.send_estimate()
+                    self.write_session_info(draft_key, draft_mode)
+                    returncode = await self.run_agent_job("select")
                 
-                await process.wait()
+                if returncode != 0 and draft_mode == "checkpoint":
+                    # Checkpoint draft is gone or unusable: fall back to a full import
+                    await self.send_message("agent_log", message="⚠️ Draft checkpoint unusable, importing images from scratch")
+                    drop_checkpoint(draft_key)
+                    draft_mode, steps_to_run = "none", full_plan
+                    self.set_steps(steps_to_run, draft_mode)
+                    await self.send_estimate()
+                    self.write_session_info(draft_key, draft_mode)
+                    await self.upload_images()
+                    returncode = await self.run_agent_job("select")
                 
-                if process.returncode == 0:
+                if returncode == 0:
+                    self.setup_done = True
+                    await self.send_estimate()
                     await self.send_message("agent_log", message="✅ Images selected successfully in InShot")
                     await self.send_message("selecting_images_complete", message="Images selected in InShot!")
                 else:
-                    await self.send_message("error", message=f"Failed to select images (exit code: {process.returncode})")
+                    await self.send_message("error", message=f"Failed to select images (exit code: {returncode})")
                     return
                     
             except Exception as e:
@@ -590,77 +949,44 @@ class ExecutionSession:
                 return
             
             # Step 5: Execute editing plan
-            plan_steps = self.visual_plan.get("plan", [])
-            await self.send_message("executing_plan", progress=0, message=f"Executing editing plan ({len(plan_steps)} steps)...")
-            await self.send_message("agent_log", message=f"📋 Plan has {len(plan_steps)} editing steps")
+            await self.send_message("executing_plan", progress=0, message=f"Executing editing plan ({len(steps_to_run)} steps)...")
+            await self.send_message("agent_log", message=f"📋 Plan has {len(steps_to_run)} editing steps")
             
             num_images = len(self.image_paths)
             
-            # Add background music instruction to the plan if we have audio
-            plan_with_music = self.visual_plan.copy()
-            if self.audio_path:
-                # Extract just the filename from audio_path (e.g., "xxx_trimmed.mp3")
-                audio_filename = os.path.basename(self.audio_path)
-                # Remove .mp3 extension for InShot search
-                track_name = audio_filename.replace('.mp3', '')
-                
-                await self.send_message("agent_log", message=f"🎵 Adding background music: {track_name}")
-                
-                # Append music step to the plan
-                plan_with_music["plan"].append({
-                    "tool": "add_background_music",
-                    "args": {"track_name": track_name}
-                })
+            # Background music is part of the plan if we have audio
+            for step in steps_to_run:
+                if step.get("tool") == "add_background_music":
+                    await self.send_message("agent_log", message=f"🎵 Adding background music: {step['args'].get('track_name')}")
             
             # Log each step in the plan
-            for i, step in enumerate(plan_with_music.get("plan", [])):
+            for i, step in enumerate(steps_to_run):
                 tool_name = step.get("tool", "unknown")
                 args = step.get("args", {})
                 await self.send_message("agent_log", message=f"  {i+1}. {tool_name}: {args}")
             
             await self.send_message("agent_log", message="🤖 Starting DroidRun agent for editing...")
             
-            # Save plan to file for subprocess
+            # Save plan to the session-scoped channel for the edit job
             plan_data = {
                 "num_images": num_images,
-                "plan": plan_with_music.get("plan", [])
+                "plan": steps_to_run,
+                "full_plan": full_plan
             }
-            with open("plan.json", "w") as f:
+            plan_path = os.path.join(session_dir(self.session_id), "plan.json")
+            with open(plan_path, "w") as f:
                 json.dump(plan_data, f, indent=4)
             
-            await self.send_message("agent_log", message="📄 Plan saved to plan.json")
+            await self.send_message("agent_log", message=f"📄 Plan saved to {os.path.relpath(plan_path, BACKEND_DIR)}")
             
             try:
-                # Run agents_functions.py with 'edit' mode via subprocess
-                # Set PYTHONIOENCODING=utf-8 to support emoji output on Windows
-                env = os.environ.copy()
-                env["PYTHONIOENCODING"] = "utf-8"
+                returncode = await self.run_agent_job("edit")
                 
-                process = await asyncio.create_subprocess_exec(
-                    "uv", "run", "python", "agents_functions.py", "edit",
-                    stdout=asyncio.subprocess.PIPE,
-                    stderr=asyncio.subprocess.STDOUT,
-                    cwd=os.path.dirname(os.path.abspath(__file__)),
-                    env=env
-                )
-                
-                # Stream output to frontend
-                while True:
-                    line = await process.stdout.readline()
-                    if not line:
-                        break
-                    decoded_line = line.decode().strip()
-                    if decoded_line:
-                        print(decoded_line)
-                        await self.send_message("agent_log", message=decoded_line)
-                
-                await process.wait()
-                
-                if process.returncode == 0:
+                if returncode == 0:
                     await self.send_message("agent_log", message="✅ Editing completed successfully!")
                     await self.send_message("executing_plan", progress=100, message="Editing complete!")
                 else:
-                    await self.send_message("agent_log", message=f"⚠️ Editing completed with exit code: {process.returncode}")
+                    await self.send_message("agent_log", message=f"⚠️ Editing completed with exit code: {returncode}")
                     await self.send_message("warning", message="Editing completed with warnings")
                     
             except Exception as e:
@@ -672,8 +998,12 @@ class ExecutionSession:
             await self.send_message("execution_complete", data={
                 "success": True,
                 "num_images": num_images,
-                "plan_steps": len(self.visual_plan.get("plan", [])),
-                "audio_added": bool(self.audio_path)
+                "plan_steps": len(steps_to_run),
+                "audio_added": bool(self.audio_path),
+                "startup_overhead_ms": self.startup_overhead_ms,
+                "estimate": self.estimate,
+                "actual_s": round(time.perf_counter() - self.started_at, 1),
+                "plan_diff": self.plan_diff
             })
             
         except Exception as e:
@@ -715,7 +1045,8 @@ async def start_execution(request: Request):
             return {
                 "session_id": exec_id,
                 "websocket_url": f"ws://localhost:5000/ws/execute/{exec_id}",
-                "num_images": len(exec_session.image_paths)
+                "num_images": len(exec_session.image_paths),
+                "estimate": exec_session.estimate
             }
     
     if planning_session_id and planning_session_id in sessions:
@@ -756,10 +1087,18 @@ async def start_execution(request: Request):
     exec_session.planning_session_id = planning_session_id
     execution_sessions[exec_session_id] = exec_session
     
+    # Predicted device time, so the queue can show an ETA before anything runs
+    estimate = None
+    try:
+        estimate = await asyncio.get_running_loop().run_in_executor(None, exec_session.prepare)
+    except Exception as e:
+        print(f"[ESTIMATE] Could not estimate execution: {e}")
+    
     return {
         "session_id": exec_session_id,
         "websocket_url": f"ws://localhost:5000/ws/execute/{exec_session_id}",
-        "num_images": len(image_paths)
+        "num_images": len(image_paths),
+        "estimate": estimate
     }
 
 
@@ -838,6 +1177,12 @@ async def health_check():
     return {"status": "healthy", "service": "droidrun-studio"}
 
 
+@app.get("/director/policies")
+async def director_policies():
+    """Budget policies and the recorded cost / latency of each"""
+    return {"policies": POLICIES, "runs": policy_summary()}
+
+
 @app.get("/sessions")
 async def list_sessions():
     """List active sessions (for debugging)"""
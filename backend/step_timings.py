@@ -0,0 +1,260 @@
+"""
+Step Timings - per-tool timing history, watchdog deadlines and plan estimates
+Every InShot tool call (and every select / agent phase) is appended to
+executions/step_timings.jsonl, keyed by tool, argument shape and device.
+
+    - deadline_for(): watchdog deadline, p95 per unit of work x WATCHDOG_FACTOR,
+      falling back to DEFAULT_UNIT_DEADLINE_S until a tool has MIN_SAMPLES runs
+    - estimate_plan(): predicted wall time of a plan before it runs (median per unit,
+      most specific history first: same shape + device, same shape, any shape)
+"""
+
+import functools
+import json
+import os
+import subprocess
+import time
+
+from agent_worker import EXECUTIONS_DIR
+
+TIMINGS_PATH = os.path.join(EXECUTIONS_DIR, "step_timings.jsonl")
+
+MIN_SAMPLES = 5
+# The history file is compacted to its newest KEEP_ENTRIES lines once it outgrows MAX_FILE_BYTES
+MAX_FILE_BYTES = 2 * 1024 * 1024
+KEEP_ENTRIES = 5000
+# Only the most recent runs of a tool count (UI or device changes make old numbers stale)
+HISTORY_WINDOW = 200
+WATCHDOG_FACTOR = float(os.getenv("WATCHDOG_FACTOR", "3"))
+MIN_DEADLINE_S = 15
+MAX_DEADLINE_S = 600
+
+# Seconds per unit of work before any history exists (a unit is one clip / effect / animation)
+DEFAULT_UNIT_DEADLINE_S = {
+    "calibrate": 30,
+    "seek_timeline": 30,
+    "add_transition": 60,
+    "change_duration": 45,
+    "set_durations": 30,
+    "apply_effect": 90,
+    "apply_effects_batch": 60,
+    "apply_animation": 60,
+    "apply_animations_batch": 40,
+    "add_music_effects": 60,
+    "add_background_music": 90,
+}
+FALLBACK_UNIT_DEADLINE_S = 60
+
+# Typical seconds per unit before any history exists (also used for phases)
+DEFAULT_UNIT_S = {
+    **{tool: deadline / WATCHDOG_FACTOR for tool, deadline in DEFAULT_UNIT_DEADLINE_S.items()},
+    "phase:select": 90,
+    "phase:agent_overhead": 8,
+}
+# Import from scratch vs reopening a draft checkpoint (see draft_snapshots.py)
+DEFAULT_SELECT_S = {"none": 90, "checkpoint": 30, "resume": 20}
+
+# Batch tools do the work of several single calls; live progress is tracked per single tool
+CANONICAL_TOOL = {
+    "set_durations": "change_duration",
+    "apply_effects_batch": "apply_effect",
+    "apply_animations_batch": "apply_animation",
+}
+
+
+@functools.lru_cache(maxsize=1)
+def device_id() -> str:
+    """Serial of the connected device (ANDROID_SERIAL wins), "unknown" without one"""
+    serial = os.getenv("ANDROID_SERIAL")
+    if serial:
+        return serial
+    try:
+        result = subprocess.run(["adb", "get-serialno"], capture_output=True, text=True, timeout=5)
+        serial = result.stdout.strip()
+        return serial if result.returncode == 0 and serial else "unknown"
+    except Exception:
+        return "unknown"
+
+
+def work_units(tool: str, args: dict) -> int:
+    """How much work a call does, so batch tools get proportionally longer deadlines"""
+    if tool == "set_durations":
+        return max(1, len([d for d in args.get("durations", []) if d is not None]))
+    if tool == "apply_effects_batch":
+        return max(1, sum(len(v) for v in args.get("effects_map", {}).values()))
+    if tool == "apply_animations_batch":
+        return max(1, len(args.get("animations_list", [])))
+    if tool == "apply_effect":
+        return max(1, len(args.get("effects_list", [])))
+    if tool == "phase:agent_overhead":
+        return max(1, args.get("steps", 1))
+    return 1
+
+
+def arg_shape(tool: str, args: dict) -> str:
+    """Argument variants that change how long a call takes (besides its work units)"""
+    if tool == "add_transition":
+        return "all" if args.get("all_apply") else "one"
+    if tool == "set_durations":
+        durations = [d for d in args.get("durations", []) if d is not None]
+        return "uniform" if len(set(durations)) <= 1 else "per_clip"
+    if tool == "phase:select":
+        return args.get("draft", "none")
+    return ""
+
+
+def record(tool: str, args: dict, elapsed_ms: int, ok: bool):
+    """Append one finished tool call to the history"""
+    entry = {
+        "tool": tool,
+        "shape": arg_shape(tool, args),
+        "device": device_id(),
+        "units": work_units(tool, args),
+        "elapsed_ms": elapsed_ms,
+        "ok": ok,
+        "at": time.time(),
+    }
+    try:
+        os.makedirs(EXECUTIONS_DIR, exist_ok=True)
+        with open(TIMINGS_PATH, "a") as f:
+            f.write(json.dumps(entry) + "\n")
+        if os.path.getsize(TIMINGS_PATH) > MAX_FILE_BYTES:
+            _compact()
+    except OSError as e:
+        print(f"[TIMINGS] Could not record timing: {e}")
+
+
+def _compact():
+    """Keep only the newest KEEP_ENTRIES calls (older ones are outside every history window)"""
+    with open(TIMINGS_PATH, "r") as f:
+        lines = f.readlines()[-KEEP_ENTRIES:]
+    tmp_path = f"{TIMINGS_PATH}.tmp"
+    with open(tmp_path, "w") as f:
+        f.writelines(lines)
+    os.replace(tmp_path, TIMINGS_PATH)
+
+
+# Parsed history, extended with whatever was appended since the last read
+_cache = {"inode": None, "offset": 0, "entries": []}
+
+
+def load(tool: str = None) -> list[dict]:
+    """Recorded calls, oldest first (optionally for one tool)"""
+    try:
+        stat = os.stat(TIMINGS_PATH)
+    except OSError:
+        return []
+    if stat.st_ino != _cache["inode"] or stat.st_size < _cache["offset"]:
+        # New or compacted file: parse it from the start
+        _cache.update(inode=stat.st_ino, offset=0, entries=[])
+    if stat.st_size > _cache["offset"]:
+        with open(TIMINGS_PATH, "rb") as f:
+            f.seek(_cache["offset"])
+            data = f.read()
+        # A line still being written is picked up on the next read
+        complete = data[:data.rfind(b"\n") + 1]
+        for line in complete.splitlines():
+            try:
+                _cache["entries"].append(json.loads(line))
+            except json.JSONDecodeError:
+                continue
+        _cache["offset"] += len(complete)
+    entries = _cache["entries"]
+    return list(entries) if tool is None else [e for e in entries if e.get("tool") == tool]
+
+
+def same_work(tool_a: str, tool_b: str) -> bool:
+    """Batch tools and their single-call tool do the same work per unit (see CANONICAL_TOOL)"""
+    return CANONICAL_TOOL.get(tool_a, tool_a) == CANONICAL_TOOL.get(tool_b, tool_b)
+
+
+def history_tool(tool: str, entries: list) -> str:
+    """
+    Tool whose history times `tool`: its own as soon as it has a successful call. A batch
+    spreads one panel visit over all its units, so its per-unit time understates a single
+    call (and the other way round); the batch / single twin only stands in while the tool
+    has no history at all.
+    """
+    if any(e.get("ok") and e.get("tool") == tool for e in entries):
+        return tool
+    for e in reversed(entries):
+        if e.get("ok") and e.get("tool") != tool and same_work(e.get("tool"), tool):
+            return e["tool"]
+    return tool
+
+
+def percentile(values: list[float], pct: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def unit_seconds(tool: str, shape: str = None, device: str = None, entries: list = None) -> list:
+    """Per-unit durations (seconds) of the recent successful calls of a tool (or its twin, see history_tool)"""
+    entries = load() if entries is None else entries
+    source = history_tool(tool, entries)
+    entries = [e for e in entries if e.get("tool") == source]
+    entries = [
+        e for e in entries
+        if e.get("ok")
+        and (shape is None or e.get("shape") == shape)
+        and (device is None or e.get("device") == device)
+    ][-HISTORY_WINDOW:]
+    return [e["elapsed_ms"] / 1000 / max(1, e.get("units", 1)) for e in entries]
+
+
+def typical_unit_seconds(tool: str, shape: str = "", device: str = None, entries: list = None) -> float:
+    """Median seconds per unit, from the most specific history that has enough samples"""
+    for key_shape, key_device in ((shape, device), (shape, None), (None, None)):
+        samples = unit_seconds(tool, key_shape, key_device, entries)
+        if len(samples) >= MIN_SAMPLES:
+            return percentile(samples, 50)
+    if tool == "phase:select":
+        return DEFAULT_SELECT_S.get(shape, DEFAULT_SELECT_S["none"])
+    return DEFAULT_UNIT_S.get(tool, FALLBACK_UNIT_DEADLINE_S / WATCHDOG_FACTOR)
+
+
+def estimate_plan(steps: list[dict], draft_mode: str = "none", device: str = None) -> dict:
+    """
+    Predict the wall time of an execution before it runs: the select phase (import or
+    draft reopen), calibration when no draft carries it, every plan step and the agent's
+    per-step overhead. Per-tool unit times are returned so progress can be re-estimated live.
+    """
+    device = device or device_id()
+    entries = load()
+
+    per_step = []
+    unit_s = {}
+    for step in steps:
+        tool = step.get("tool", "unknown")
+        args = step.get("args", {}) or {}
+        units = work_units(tool, args)
+        seconds = typical_unit_seconds(tool, arg_shape(tool, args), device, entries)
+        per_step.append({"tool": tool, "units": units, "est_s": round(seconds * units, 1)})
+        unit_s.setdefault(CANONICAL_TOOL.get(tool, tool), seconds)
+
+    select_s = typical_unit_seconds("phase:select", draft_mode, device, entries)
+    calibrate_s = 0 if draft_mode != "none" else typical_unit_seconds("calibrate", "", device, entries)
+    overhead_s = typical_unit_seconds("phase:agent_overhead", "", device, entries) * len(steps)
+    steps_s = sum(s["est_s"] for s in per_step)
+
+    return {
+        "device": device,
+        "draft_mode": draft_mode,
+        "setup_s": round(select_s + calibrate_s, 1),
+        "steps_s": round(steps_s, 1),
+        "overhead_s": round(overhead_s, 1),
+        "total_s": round(select_s + calibrate_s + steps_s + overhead_s, 1),
+        "per_step": per_step,
+        "unit_s": unit_s,
+    }
+
+
+def deadline_for(tool: str, args: dict) -> float:
+    """Watchdog deadline in seconds for one call of tool with args"""
+    units = work_units(tool, args)
+    samples = unit_seconds(tool)
+    if len(samples) >= MIN_SAMPLES:
+        per_unit = percentile(samples, 95) * WATCHDOG_FACTOR
+    else:
+        per_unit = DEFAULT_UNIT_DEADLINE_S.get(tool, FALLBACK_UNIT_DEADLINE_S)
+    return min(MAX_DEADLINE_S, max(MIN_DEADLINE_S, per_unit * units))
@@ -0,0 +1,101 @@
+import json
+
+from director import VISUAL_PLAN_SCHEMA, VideoDirector
+from json_stream import JsonStreamParser, repair_json
+
+STEPS = [
+    {"tool": "apply_effect", "args": {"image_idx": 1, "effects_list": ["Glitch", "Zoom"]}},
+    {"tool": "change_duration", "args": {"image_idx": 2, "duration": 3.0}},
+    {"tool": "add_transition", "args": {"image1_idx": 1, "image2_idx": 2, "transition_type": "fade", "all_apply": False}},
+]
+PLAN = {"thought_process": "Fast, punchy {cuts}, then calm", "music_thoughts": "upbeat, 120 bpm", "plan": STEPS}
+TEXT = json.dumps(PLAN)
+
+
+def test_complete_object_is_not_repaired():
+    assert repair_json(TEXT) == (PLAN, False)
+
+
+def test_fenced_json():
+    assert repair_json(f"```json\n{TEXT}\n```") == (PLAN, False)
+
+
+def test_prose_around_json():
+    value, repaired = repair_json(f"Here is the plan:\n{TEXT}\nLet me know if you want changes.")
+    assert value == PLAN
+    assert repaired
+
+
+def test_braces_and_commas_inside_strings():
+    # Separators and brackets inside strings are not cut points, even when truncated nearby
+    tricky = {"tool": "x", "args": {"note": "a, b } ] { [ \"quoted\", c\\"}}
+    text = json.dumps({"thought_process": "}{,", "plan": [tricky, tricky]})
+    value, repaired = repair_json(text[:-8])
+    assert repaired
+    assert value == {"thought_process": "}{,", "plan": [tricky]}
+
+
+def test_truncated_mid_element_drops_the_element():
+    # Cut inside the last step's args: the half-written step must not survive
+    cut = TEXT.index('"transition_type"')
+    value, repaired = repair_json(TEXT[:cut])
+    assert repaired
+    assert value["plan"] == STEPS[:2]
+    assert value["thought_process"] == PLAN["thought_process"]
+
+
+def test_truncated_inside_first_step_drops_the_plan():
+    # Nothing whole is left in the plan, so the field goes and the stage is re-run
+    cut = TEXT.index('"Zoom"') + 3
+    value, _ = repair_json(TEXT[:cut])
+    assert "plan" not in value
+    assert VideoDirector._conform(value, VISUAL_PLAN_SCHEMA) is None
+
+
+def test_every_truncation_keeps_only_whole_steps():
+    for end in range(1, len(TEXT)):
+        value, _ = repair_json(TEXT[:end])
+        if value is None:
+            continue
+        for step in value.get("plan", []):
+            assert step in STEPS
+        for field in ("thought_process", "music_thoughts"):
+            assert value.get(field, PLAN[field]) == PLAN[field]
+
+
+def test_truncated_string_is_never_closed():
+    assert repair_json('{"thought_process": "Fast, punchy') == (None, False)
+
+
+def test_no_object():
+    assert repair_json("Sorry, I can't help with that.") == (None, False)
+
+
+def test_conform_accepts_a_shortened_plan_without_retry():
+    # A cut-off trailing step is dropped and what is left counts as a usable plan
+    value, repaired = repair_json(TEXT[:TEXT.index('"transition_type"')])
+    conformed = VideoDirector._conform(value, VISUAL_PLAN_SCHEMA)
+    assert repaired
+    assert conformed is not None
+    assert conformed["plan"] == STEPS[:2]
+
+
+def test_conform_rejects_a_step_missing_tool_args():
+    plan = {**PLAN, "plan": [{"tool": "change_duration", "args": {"image_idx": 2}}]}
+    assert VideoDirector._conform(plan, VISUAL_PLAN_SCHEMA) is None
+
+
+def test_conform_rejects_a_missing_top_level_field():
+    value, _ = repair_json(TEXT[:TEXT.index('"plan"')])
+    assert VideoDirector._conform(value, VISUAL_PLAN_SCHEMA) is None
+
+
+def test_stream_parser_reports_fields_and_items():
+    parser = JsonStreamParser()
+    events = []
+    for i in range(0, len(TEXT), 7):
+        events += parser.feed(TEXT[i:i + 7])
+    fields = {e["field"]: e["value"] for e in events if e["kind"] == "field"}
+    items = [e["value"] for e in events if e["kind"] == "item"]
+    assert fields["thought_process"] == PLAN["thought_process"]
+    assert items == STEPS
@@ -0,0 +1,119 @@
+from plan_diff import applied_all, diff_plans
+
+BASE = [5.0, 5.0, 5.0, 5.0]
+
+
+def duration(idx, seconds):
+    return {"tool": "change_duration", "args": {"image_idx": idx, "duration": seconds}}
+
+
+def transition(idx, kind="fade", all_apply=False):
+    return {"tool": "add_transition", "args": {"image1_idx": idx, "image2_idx": idx + 1, "transition_type": kind, "all_apply": all_apply}}
+
+
+def effect(idx, *names):
+    return {"tool": "apply_effect", "args": {"image_idx": idx, "effects_list": list(names)}}
+
+
+def animation(idx, name="Fade", kind="IN"):
+    return {"tool": "apply_animation", "args": {"image_idx": idx, "animation_name": name, "animation_type": kind}}
+
+
+def test_unchanged_plan_is_noop():
+    plan = [duration(1, 3.0), transition(2), effect(3, "Glitch")]
+    assert diff_plans(plan, list(plan), BASE)["mode"] == "noop"
+
+
+def test_batch_and_single_steps_are_the_same_plan():
+    old = [duration(1, 3.0), duration(2, 4.0), effect(3, "Glitch")]
+    new = [
+        {"tool": "set_durations", "args": {"durations": [3.0, 4.0]}},
+        {"tool": "apply_effects_batch", "args": {"effects_map": {"3": ["Glitch"]}}},
+    ]
+    assert diff_plans(old, new, BASE)["mode"] == "noop"
+
+
+def test_changed_duration_after_every_effect_is_incremental():
+    old = [effect(1, "Glitch"), duration(3, 3.0)]
+    new = [effect(1, "Glitch"), duration(3, 4.0)]
+    result = diff_plans(old, new, BASE)
+    assert result["mode"] == "incremental"
+    assert result["steps"] == [duration(3, 4.0)]
+
+
+def test_settable_slots_are_reapplied_in_order():
+    old = [animation(2)]
+    new = [animation(2, "Zoom In"), transition(1, "mix"), duration(4, 2.0)]
+    result = diff_plans(old, new, BASE)
+    assert result["mode"] == "incremental"
+    assert [step["tool"] for step in result["steps"]] == ["change_duration", "add_transition", "apply_animation"]
+
+
+def test_removed_duration_reverts_to_import_value():
+    result = diff_plans([duration(2, 3.0)], [], BASE)
+    assert result["mode"] == "incremental"
+    assert result["steps"] == [duration(2, 5.0)]
+
+
+def test_duration_change_before_an_effect_is_full():
+    old = [effect(3, "Glitch"), duration(1, 3.0)]
+    new = [effect(3, "Glitch"), duration(1, 4.0)]
+    result = diff_plans(old, new, BASE)
+    assert result["mode"] == "full"
+    assert ["effect", 3] in result["invalidated"]
+
+
+def test_removed_effect_is_full():
+    assert diff_plans([effect(1, "Glitch")], [], BASE)["mode"] == "full"
+
+
+def test_added_transition_before_an_effect_is_full():
+    # A new transition overlaps clips 2 and 3 and moves the effect on clip 3
+    old = [effect(3, "Glitch")]
+    new = [effect(3, "Glitch"), transition(2)]
+    result = diff_plans(old, new, BASE)
+    assert result["mode"] == "full"
+    assert ["effect", 3] in result["invalidated"]
+
+
+def test_added_transition_after_every_effect_is_incremental():
+    old = [effect(1, "Glitch")]
+    new = [effect(1, "Glitch"), transition(3)]
+    result = diff_plans(old, new, BASE)
+    assert result["mode"] == "incremental"
+    assert result["steps"] == [transition(3)]
+
+
+def test_all_junction_transition_shifts_from_the_first_clip():
+    old = [effect(2, "Glitch")]
+    new = [effect(2, "Glitch"), transition(1, all_apply=True)]
+    assert diff_plans(old, new, BASE)["mode"] == "full"
+
+
+def test_transition_type_change_moves_nothing():
+    old = [effect(3, "Glitch"), transition(2, "fade")]
+    new = [effect(3, "Glitch"), transition(2, "mix")]
+    result = diff_plans(old, new, BASE)
+    assert result["mode"] == "incremental"
+    assert result["steps"] == [transition(2, "mix")]
+
+
+def test_unreadable_args_fall_back_to_full():
+    result = diff_plans([duration(1, 3.0)], [{"tool": "change_duration", "args": {"image_idx": "first"}}], BASE)
+    assert result["mode"] == "full"
+    assert result["steps"] == []
+
+
+def test_applied_all_counts_batch_calls():
+    plan = [effect(1, "Glitch"), duration(2, 3.0)]
+    done = [
+        {"tool": "apply_effects_batch", "args": {"effects_map": {"1": ["Glitch"]}}},
+        {"tool": "set_durations", "args": {"durations": [None, 3.0]}},
+    ]
+    assert applied_all(done, plan)
+
+
+def test_applied_all_rejects_a_skipped_or_different_step():
+    plan = [effect(1, "Glitch"), duration(2, 3.0)]
+    assert not applied_all([effect(1, "Glitch")], plan)
+    assert not applied_all([effect(1, "Glitch"), duration(2, 4.0)], plan)
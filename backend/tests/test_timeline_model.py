@@ -0,0 +1,67 @@
+import random
+
+from timeline_model import FenwickTree, TimelineModel
+
+
+def test_prefix_sums_match_the_list():
+    values = [5.0, 3.5, 2.0, 4.25, 1.5, 6.0, 0.5]
+    tree = FenwickTree(values)
+    for count in range(len(values) + 1):
+        assert tree.prefix(count) == sum(values[:count])
+
+
+def test_updates_keep_prefix_sums_exact():
+    rng = random.Random(7)
+    values = [float(rng.randint(1, 10)) for _ in range(13)]
+    tree = FenwickTree(values)
+    for _ in range(200):
+        index = rng.randrange(len(values))
+        if rng.random() < 0.5:
+            delta = float(rng.randint(-3, 3))
+            tree.add(index, delta)
+            values[index] += delta
+        else:
+            value = float(rng.randint(1, 10))
+            tree.set(index, value)
+            values[index] = value
+        assert tree.values == values
+        for count in range(len(values) + 1):
+            assert tree.prefix(count) == sum(values[:count])
+
+
+def test_empty_tree():
+    assert FenwickTree([]).prefix(0) == 0.0
+
+
+def test_clip_queries():
+    model = TimelineModel(durations=[5.0, 3.0, 4.0])
+    assert model.clip_start(2) == 5.0
+    assert model.clip_range(3) == (8.0, 12.0)
+    assert model.midpoint(2) == 6.5
+    assert model.junction(1) == 5.0
+    assert model.total() == 12.0
+    assert model.clip_range(4) == (None, None)
+
+    model.set_duration(1, 2.0)
+    model.adjust_duration(3, -1.0)
+    assert model.durations() == [2.0, 3.0, 3.0]
+    assert model.junction(2) == 5.0
+
+
+def test_has_transition():
+    model = TimelineModel(durations=[5.0, 5.0, 5.0])
+    assert not model.has_transition(1)
+    model.add_transition(1, "fade")
+    assert model.has_transition(1) and not model.has_transition(2)
+    model.add_transition("all", "mix")
+    assert model.has_transition(2) and model.has_transition("all")
+
+
+def test_state_round_trip():
+    model = TimelineModel(durations=[5.0, 3.0], px_per_sec=120.0, center=[540, 1200], y_width=80)
+    model.add_transition(1, "fade")
+    model.add_effects(2, ["Glitch"])
+    model.set_animation(1, "in", "Fade")
+    restored = TimelineModel.from_state(model.to_state())
+    assert restored.to_state() == model.to_state()
+    assert restored.is_calibrated()
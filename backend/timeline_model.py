@@ -0,0 +1,193 @@
+"""
+Timeline Model - in-memory model of the open InShot project
+Holds clip durations, the calibration geometry and what was placed on the timeline
+(transitions, effects, animations) for the execution running in this process.
+
+Clip durations sit in a Fenwick tree, so clip start / midpoint / range / junction
+queries and duration updates are O(log n) instead of re-summing the list prefix.
+The model is read from the state store once per session and written back only at
+checkpoints (calibration, rollback, draft checkpoints and the end of an edit job).
+"""
+
+from redis_state import global_state
+
+
+class FenwickTree:
+    """Prefix sums over a list of floats with O(log n) point updates"""
+
+    def __init__(self, values):
+        self.size = len(values)
+        self.values = [float(v) for v in values]
+        self.tree = [0.0] * (self.size + 1)
+        for i, value in enumerate(self.values, start=1):
+            self.tree[i] += value
+            parent = i + (i & -i)
+            if parent <= self.size:
+                self.tree[parent] += self.tree[i]
+
+    def add(self, index: int, delta: float):
+        """values[index] += delta (0-based)"""
+        self.values[index] += delta
+        i = index + 1
+        while i <= self.size:
+            self.tree[i] += delta
+            i += i & -i
+
+    def set(self, index: int, value: float):
+        self.add(index, float(value) - self.values[index])
+
+    def prefix(self, count: int) -> float:
+        """Sum of the first `count` values"""
+        total = 0.0
+        i = count
+        while i > 0:
+            total += self.tree[i]
+            i -= i & -i
+        return total
+
+
+class TimelineModel:
+    # Keys written to the state store (and into draft checkpoints)
+    STATE_KEYS = ["timeline_map", "raw_image_duration", "px/sec", "timeline_center", "y_width", "timeline_items"]
+
+    def __init__(self, durations=None, raw_durations=None, px_per_sec=None, center=None, y_width=None, items=None):
+        self._clips = FenwickTree(durations or [])
+        self.raw_durations = list(raw_durations or durations or [])
+        self.px_per_sec = px_per_sec
+        self.center = list(center) if center else None
+        self.y_width = y_width
+
+        items = items or {}
+        # junction (1-based index of the clip before it, or "all") -> transition type
+        self.transitions = dict(items.get("transitions", {}))
+        # 1-based clip index (as str, JSON-safe) -> effects placed on it
+        self.effects = dict(items.get("effects", {}))
+        # "<clip>:<IN|OUT|COMBO>" -> animation name
+        self.animations = dict(items.get("animations", {}))
+
+    # --- Queries ---
+
+    @property
+    def num_clips(self) -> int:
+        return self._clips.size
+
+    def is_calibrated(self) -> bool:
+        return bool(self.num_clips and self.px_per_sec and self.center)
+
+    def in_bounds(self, image_idx: int) -> bool:
+        return 1 <= image_idx <= self.num_clips
+
+    def durations(self) -> list:
+        return list(self._clips.values)
+
+    def duration(self, image_idx: int) -> float:
+        return self._clips.values[image_idx - 1]
+
+    def clip_start(self, image_idx: int) -> float:
+        return self._clips.prefix(image_idx - 1)
+
+    def clip_range(self, image_idx: int):
+        """(start, end) of a 1-based clip, (None, None) when out of bounds"""
+        if not self.in_bounds(image_idx):
+            return None, None
+        start = self.clip_start(image_idx)
+        return start, start + self.duration(image_idx)
+
+    def midpoint(self, image_idx: int):
+        start, end = self.clip_range(image_idx)
+        if start is None:
+            return None
+        return (start + end) / 2.0
+
+    def junction(self, image_idx: int) -> float:
+        """Time of the cut between clip image_idx and the next one"""
+        return self._clips.prefix(image_idx)
+
+    def total(self) -> float:
+        return self._clips.prefix(self.num_clips)
+
+    # --- Updates ---
+
+    def calibrate(self, num_images: int, default_duration: float):
+        """Fresh project: every clip at the import default, nothing placed yet"""
+        self._clips = FenwickTree([default_duration] * num_images)
+        self.raw_durations = [default_duration] * num_images
+        self.transitions, self.effects, self.animations = {}, {}, {}
+
+    def set_geometry(self, px_per_sec: float, center, y_width):
+        self.px_per_sec = px_per_sec
+        self.center = list(center)
+        self.y_width = y_width
+
+    def set_duration(self, image_idx: int, duration: float):
+        self._clips.set(image_idx - 1, duration)
+
+    def adjust_duration(self, image_idx: int, delta: float):
+        self._clips.add(image_idx - 1, delta)
+
+    def add_transition(self, image_idx, transition_type: str):
+        self.transitions[str(image_idx)] = transition_type
+
+    def has_transition(self, image_idx) -> bool:
+        """Whether a junction (or every junction, for "all") already carries a transition"""
+        return "all" in self.transitions or (image_idx != "all" and str(image_idx) in self.transitions)
+
+    def add_effects(self, image_idx: int, effects: list):
+        self.effects.setdefault(str(image_idx), []).extend(effects)
+
+    def set_animation(self, image_idx: int, animation_type: str, animation_name: str):
+        self.animations[f"{image_idx}:{animation_type.upper()}"] = animation_name
+
+    # --- Snapshots ---
+
+    def to_state(self) -> dict:
+        return {
+            "timeline_map": self.durations(),
+            "raw_image_duration": list(self.raw_durations),
+            "px/sec": self.px_per_sec,
+            "timeline_center": self.center,
+            "y_width": self.y_width,
+            "timeline_items": {
+                "transitions": dict(self.transitions),
+                "effects": {k: list(v) for k, v in self.effects.items()},
+                "animations": dict(self.animations),
+            },
+        }
+
+    @classmethod
+    def from_state(cls, state: dict):
+        state = state or {}
+        return cls(
+            durations=state.get("timeline_map"),
+            raw_durations=state.get("raw_image_duration"),
+            px_per_sec=state.get("px/sec"),
+            center=state.get("timeline_center"),
+            y_width=state.get("y_width"),
+            items=state.get("timeline_items"),
+        )
+
+    def restore(self, state: dict):
+        """Replace this model's contents in place (callers keep their reference)"""
+        self.__dict__.update(TimelineModel.from_state(state).__dict__)
+
+    def save(self):
+        """Checkpoint to the state store"""
+        for key, value in self.to_state().items():
+            if value is not None:
+                global_state.set(key, value)
+
+    @classmethod
+    def load(cls):
+        return cls.from_state({key: global_state.get(key) for key in cls.STATE_KEYS})
+
+
+# One model per process, reloaded when the worker moves to another session
+_current = {"session_id": None, "model": None}
+
+
+def timeline() -> TimelineModel:
+    """The timeline model of the execution running in this process"""
+    if _current["model"] is None or _current["session_id"] != global_state.session_id:
+        _current["model"] = TimelineModel.load()
+        _current["session_id"] = global_state.session_id
+    return _current["model"]
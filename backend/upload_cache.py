@@ -0,0 +1,156 @@
+"""
+Upload Cache - concurrent, deduplicated Gemini file uploads
+Files are keyed by a hash of their contents. The remote handle of every upload is
+kept in executions/gemini_files.json until shortly before the Files API expires it
+(48 hours after upload), so a re-plan on the same photos, or a track another session
+already downloaded, reuses the remote file instead of uploading it again.
+
+    parts = await upload_files(client, paths, display_names, slots)
+
+Uploads use the SDK's async client; `slots` (an asyncio.Semaphore) bounds how many
+Gemini requests are in flight.
+
+Files belong to the API key's project, so entries are keyed by a fingerprint of the
+client's credentials plus the content hash. A handle is checked with files.get before
+it is reused; one that is gone (deleted, or no longer visible to these credentials) is
+dropped and the file uploaded again.
+
+Cache entries: {"<account>:<sha256>": {"name", "uri", "mime_type", "expires_at", "uploaded_at"}}
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+import threading
+import time
+
+from agent_worker import EXECUTIONS_DIR
+
+CACHE_PATH = os.path.join(EXECUTIONS_DIR, "gemini_files.json")
+
+# Remote files expire 48h after upload; don't hand out a handle that could expire mid-session
+DEFAULT_TTL_S = 48 * 3600
+EXPIRY_MARGIN_S = 2 * 3600
+
+_lock = threading.Lock()
+
+
+def file_hash(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _load() -> dict:
+    try:
+        with open(CACHE_PATH, "r") as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return {}
+
+
+def _save(entries: dict):
+    os.makedirs(EXECUTIONS_DIR, exist_ok=True)
+    tmp_path = f"{CACHE_PATH}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(entries, f, indent=4)
+    os.replace(tmp_path, CACHE_PATH)
+
+
+def _account(client) -> str:
+    """Fingerprint of the credentials (API key, or Vertex project) the client uploads with"""
+    api = client._api_client
+    if api.vertexai:
+        identity = f"vertex:{api.project}:{api.location}"
+    else:
+        identity = f"key:{api.api_key}"
+    return hashlib.sha256(identity.encode()).hexdigest()[:12]
+
+
+def _usable_entries(now: float) -> dict:
+    with _lock:
+        return {k: v for k, v in _load().items() if v.get("expires_at", 0) - EXPIRY_MARGIN_S > now}
+
+
+def _store(uploaded: dict, now: float, dropped=()):
+    with _lock:
+        # Merge with whatever other sessions stored meanwhile
+        stored = _load()
+        for key in dropped:
+            stored.pop(key, None)
+        stored.update(uploaded)
+        _save({k: v for k, v in stored.items() if v.get("expires_at", 0) > now})
+
+
+def _part(entry: dict):
+    """Content part referencing an already uploaded file"""
+    from google.genai import types
+
+    return types.Part.from_uri(file_uri=entry["uri"], mime_type=entry["mime_type"])
+
+
+async def _alive(client, entry: dict, slots: asyncio.Semaphore) -> bool:
+    """Whether a cached handle still points at an active remote file"""
+    try:
+        async with slots:
+            remote = await client.aio.files.get(name=entry["name"])
+    except Exception as e:
+        print(f"[UPLOAD] Cached file {entry['name']} is unavailable ({e}), uploading it again")
+        return False
+    state = getattr(remote.state, "name", remote.state)
+    return state in (None, "ACTIVE")
+
+
+async def _upload(client, path: str, display_name: str, slots: asyncio.Semaphore) -> dict:
+    async with slots:
+        uploaded = await client.aio.files.upload(file=path, config={"display_name": display_name})
+    now = time.time()
+    expires_at = uploaded.expiration_time.timestamp() if uploaded.expiration_time else now + DEFAULT_TTL_S
+    return {
+        "name": uploaded.name,
+        "uri": uploaded.uri,
+        "mime_type": uploaded.mime_type,
+        "expires_at": expires_at,
+        "uploaded_at": now,
+    }
+
+
+async def upload_files(client, paths: list[str], display_names: list[str], slots: asyncio.Semaphore) -> list:
+    """
+    Upload files (concurrently, each distinct content once) and return one content part per
+    path, in order. Files whose content was uploaded before (with these credentials), hasn't
+    expired and is still there are not sent.
+    """
+    account = _account(client)
+    hashes = await asyncio.to_thread(lambda: [f"{account}:{file_hash(path)}" for path in paths])
+    now = time.time()
+
+    # Cache file I/O (and its lock) runs in a thread, never on the event loop
+    entries = await asyncio.to_thread(_usable_entries, now)
+    candidates = {digest: entries[digest] for digest in set(hashes) if digest in entries}
+    alive = await asyncio.gather(*(_alive(client, entry, slots) for entry in candidates.values()))
+    dropped = [digest for digest, ok in zip(candidates, alive) if not ok]
+    entries = {digest: entry for digest, entry in candidates.items() if digest not in dropped}
+
+    # First path of each content hash that has no usable remote copy
+    missing = {}
+    for path, name, digest in zip(paths, display_names, hashes):
+        if digest not in entries and digest not in missing:
+            missing[digest] = (path, name)
+
+    if missing:
+        started = time.perf_counter()
+        results = await asyncio.gather(*(_upload(client, path, name, slots) for path, name in missing.values()))
+        uploaded = dict(zip(missing.keys(), results))
+        print(f"[UPLOAD] {len(uploaded)} file(s) uploaded in {time.perf_counter() - started:.1f}s")
+
+        await asyncio.to_thread(_store, uploaded, now, dropped)
+        entries.update(uploaded)
+
+    reused = len(paths) - len(missing)
+    if reused:
+        print(f"[UPLOAD] {reused} file(s) reused from the upload cache")
+    return [_part(entries[digest]) for digest in hashes]